@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+"""
+Micro-benchmark of rendering single items, with the context of the import
+resolved once per run, as imports do, or again for every item::
+
+    python -m benchmarks.micro
+    python -m benchmarks.micro --posts 20000 --repeat 5
+"""
+
+import json
+import os
+import tempfile
+import time
+from typing import Callable, Dict, List, Tuple
+
+import click
+from box import Box
+from benchmarks.synthetic import generate_facebook_export, generate_instagram_export
+from treasurechest.engine.albums import discover_albums, load_album
+from treasurechest.engine.context import import_context
+from treasurechest.engine.manifest import Manifest
+from treasurechest.engine.render import render_item
+from treasurechest.source.imports import PostRenderer
+
+
+def _best_per_item(render: Callable, items: List[Tuple[int, object]], repeat: int):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for n, item in items:
+            render(n, item)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best / len(items)
+
+
+def micro_benchmark(
+    work_dir: str, posts: int, albums: int, repeat: int
+) -> Dict[str, Dict[str, float]]:
+    """
+    Time the rendering of each kind of item in microseconds per item, with a
+    context shared by the run and with a context per item
+    """
+    fb_dir = os.path.join(work_dir, "facebook")
+    ig_dir = os.path.join(work_dir, "instagram")
+    generate_facebook_export(fb_dir, posts, albums, 5, media_size=1)
+    generate_instagram_export(ig_dir, posts // 2, media_size=1)
+    site_dir = os.path.join(work_dir, "site")
+    os.makedirs(site_dir, exist_ok=True)
+    config = Box(
+        author="Jane Doe",
+        site_dir=site_dir,
+        facebook_export_dir=fb_dir,
+        instagram_export_dir=ig_dir,
+    )
+    with open(os.path.join(fb_dir, "posts", "your_posts_1.json")) as f:
+        fb_posts = json.load(f)
+    with open(os.path.join(ig_dir, "content", "posts_1.json")) as f:
+        ig_posts = json.load(f)
+    album_dir = os.path.join(fb_dir, "posts", "album")
+    items = {
+        "facebook_post": fb_posts,
+        "facebook_album": [load_album(path) for path in discover_albums(album_dir)],
+        "instagram_post": ig_posts,
+    }
+    manifest = Manifest(site_dir)
+    renderer = PostRenderer(import_context(config))
+    results = {}
+    for kind, kind_items in items.items():
+        numbered = list(enumerate(kind_items, 1))
+        shared = _best_per_item(
+            lambda n, item: render_item(
+                config, kind, n, item, manifest, renderer=renderer
+            ),
+            numbered,
+            repeat,
+        )
+        per_item = _best_per_item(
+            lambda n, item: render_item(config, kind, n, item, manifest),
+            numbered,
+            repeat,
+        )
+        results[kind] = {
+            "items": len(numbered),
+            "per_item_us": round(per_item * 1e6, 1),
+            "shared_us": round(shared * 1e6, 1),
+            "saved_us": round((per_item - shared) * 1e6, 1),
+        }
+    return results
+
+
+@click.command()
+@click.option("--posts", default=5000, help="Facebook posts in the export")
+@click.option("--albums", default=200, help="Facebook albums in the export")
+@click.option("--repeat", default=3, help="Runs of each measurement, the best is kept")
+def main(posts: int, albums: int, repeat: int):
+    """Time the rendering of single posts and albums"""
+    with tempfile.TemporaryDirectory() as work_dir:
+        results = micro_benchmark(work_dir, posts, albums, repeat)
+    click.echo(
+        f"{'kind':<16}{'items':>8}{'context per item':>18}{'shared':>9}{'saved':>9}"
+    )
+    for kind, r in results.items():
+        click.echo(
+            f"{kind:<16}{r['items']:>8}{r['per_item_us']:>15} us"
+            f"{r['shared_us']:>6} us{r['saved_us']:>6} us"
+        )
+
+
+if __name__ == "__main__":
+    main()
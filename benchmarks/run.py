@@ -0,0 +1,201 @@
+# -*- coding: utf-8 -*-
+"""
+Throughput benchmark of the import engine on synthetic exports.
+
+Every import runs in a fresh process so that its peak RSS is its own::
+
+    python -m benchmarks.run
+    python -m benchmarks.run --workers 4 --option media_mode=hardlink
+    python -m benchmarks.run --save-baseline
+"""
+
+import json
+import multiprocessing
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List
+
+import click
+import yaml
+from box import Box
+from benchmarks.synthetic import generate_facebook_export, generate_instagram_export
+from treasurechest.engine.engine import Engine
+
+BASELINE = os.path.join(os.path.dirname(__file__), "baseline.json")
+STAGES = {
+    "facebook_posts": "import_facebook_posts",
+    "facebook_albums": "import_facebook_albums",
+    "instagram_posts": "import_instagram_posts",
+}
+# metrics compared with the baseline and whether higher values are better
+METRICS = {"items_per_sec": True, "media_mb_per_sec": True, "peak_rss_mb": False}
+
+
+def _peak_rss_mb() -> float:
+    scale = 1 if sys.platform == "darwin" else 1024  # ru_maxrss is in KiB on Linux
+    peak = max(
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+    )
+    return peak * scale / 1e6
+
+
+def run_stage(config: dict, stage: str, workers: int) -> Dict[str, float]:
+    """
+    Run one import and measure it, called in a process of its own
+    """
+    engine = Engine(Box(config), workers)
+    start = time.perf_counter()
+    counts = getattr(engine, STAGES[stage])()
+    elapsed = time.perf_counter() - start
+    items = counts["imported"] + counts["skipped"] + counts["unchanged"]
+    return {
+        "seconds": round(elapsed, 3),
+        "items": items,
+        "items_per_sec": round(items / elapsed, 1),
+        "media_mb_per_sec": round(counts["media_bytes_written"] / 1e6 / elapsed, 2),
+        "peak_rss_mb": round(_peak_rss_mb(), 1),
+    }
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> List[str]:
+    """
+    List the metrics that are worse than the baseline by more than ``tolerance``
+    """
+    regressions = []
+    for stage, metrics in results.items():
+        for metric, higher_is_better in METRICS.items():
+            expected = baseline.get(stage, {}).get(metric)
+            if not expected:
+                continue
+            change = (metrics[metric] - expected) / expected
+            if (-change if higher_is_better else change) > tolerance:
+                regressions.append(
+                    f"{stage} {metric}: {metrics[metric]} vs {expected} ({change:+.0%})"
+                )
+    return regressions
+
+
+def _prepare_export(work_dir: str, params: dict):
+    # exports are reused as long as they were generated with the same parameters
+    params_file = os.path.join(work_dir, "params.json")
+    if os.path.isfile(params_file):
+        with open(params_file) as f:
+            if json.load(f) == params:
+                return
+    shutil.rmtree(work_dir, ignore_errors=True)
+    click.echo(f"Generating synthetic exports in {work_dir}")
+    generate_facebook_export(
+        os.path.join(work_dir, "facebook"),
+        params["posts"],
+        params["albums"],
+        params["photos_per_album"],
+        params["media_size"],
+    )
+    generate_instagram_export(
+        os.path.join(work_dir, "instagram"),
+        params["instagram_posts"],
+        params["media_size"],
+    )
+    with open(params_file, "w") as f:
+        json.dump(params, f)
+
+
+@click.command()
+@click.option("--posts", default=4000, help="Facebook posts in the export")
+@click.option("--albums", default=40, help="Facebook albums in the export")
+@click.option("--photos-per-album", default=10)
+@click.option("--instagram-posts", default=2000, help="Instagram posts in the export")
+@click.option("--media-size", default=20000, help="Bytes of each media file")
+@click.option("--workers", default=1, help="Processes used to render posts")
+@click.option("--repeat", default=3, help="Runs of each import, the best is kept")
+@click.option("--option", multiple=True, help="Extra config setting, as key=value")
+@click.option("--work-dir", default=None, help="Directory for exports and site")
+@click.option("--baseline", default=BASELINE, help="Baseline JSON to compare with")
+@click.option("--tolerance", default=0.25, help="Allowed relative regression")
+@click.option("--save-baseline", is_flag=True, help="Store the results as baseline")
+def main(
+    posts: int,
+    albums: int,
+    photos_per_album: int,
+    instagram_posts: int,
+    media_size: int,
+    workers: int,
+    repeat: int,
+    option: List[str],
+    work_dir: str,
+    baseline: str,
+    tolerance: float,
+    save_baseline: bool,
+):
+    """Benchmark the Facebook and Instagram imports on synthetic exports"""
+    params = {
+        "posts": posts,
+        "albums": albums,
+        "photos_per_album": photos_per_album,
+        "instagram_posts": instagram_posts,
+        "media_size": media_size,
+        "workers": workers,
+        "options": sorted(option),
+    }
+    work_dir = work_dir or os.path.join(tempfile.gettempdir(), "treasurechest-bench")
+    export_params = {k: v for k, v in params.items() if k not in ("workers", "options")}
+    _prepare_export(work_dir, export_params)
+    site_dir = os.path.join(work_dir, "site")
+    config = {
+        "author": "Jane Doe",
+        "site_dir": site_dir,
+        "facebook_export_dir": os.path.join(work_dir, "facebook"),
+        "instagram_export_dir": os.path.join(work_dir, "instagram"),
+    }
+    for setting in option:
+        key, _, value = setting.partition("=")
+        config[key] = yaml.safe_load(value)
+
+    results = {}
+    context = multiprocessing.get_context("spawn")
+    for _ in range(repeat):
+        shutil.rmtree(site_dir, ignore_errors=True)
+        os.makedirs(site_dir)
+        for stage in STAGES:
+            with ProcessPoolExecutor(1, mp_context=context) as pool:
+                result = pool.submit(run_stage, config, stage, workers).result()
+            best = results.get(stage)
+            if best is None or result["seconds"] < best["seconds"]:
+                results[stage] = result
+
+    click.echo(f"{'stage':<18}{'items':>8}{'items/s':>10}{'MB/s':>8}{'RSS MB':>8}")
+    for stage, r in results.items():
+        click.echo(
+            f"{stage:<18}{r['items']:>8}{r['items_per_sec']:>10}"
+            f"{r['media_mb_per_sec']:>8}{r['peak_rss_mb']:>8}"
+        )
+
+    if save_baseline:
+        with open(baseline, "w") as f:
+            json.dump({"params": params, "results": results}, f, indent=2)
+            f.write("\n")
+        click.echo(f"Saved baseline to {baseline}")
+        return
+    if not os.path.isfile(baseline):
+        return
+    with open(baseline) as f:
+        stored = json.load(f)
+    if stored["params"] != params:
+        click.echo("Baseline was recorded with other parameters, not comparing")
+        return
+    regressions = compare(results, stored["results"], tolerance)
+    for regression in regressions:
+        click.echo(f"Regression: {regression}")
+    if regressions:
+        sys.exit(1)
+    click.echo(f"No regressions against {baseline}")
+
+
+if __name__ == "__main__":
+    main()
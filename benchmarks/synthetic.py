@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+"""
+Generator of synthetic Facebook and Instagram exports used by the benchmarks
+"""
+
+import json
+import os
+import random
+
+WORDS = (
+    "hola qué tal día playa montaña cumpleaños niño café canción "
+    "with friends today great trip summer ñandú José María"
+).split()
+
+
+def mojibake(text: str) -> str:
+    """
+    Encode text the way the exports do, one ``\\u00xx`` escape per UTF-8 byte
+    """
+    return text.encode("utf-8").decode("latin-1")
+
+
+def _sentence(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(words))
+
+
+def _media_file(rng: random.Random, path: str, size: int):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(rng.getrandbits(size * 8).to_bytes(size, "little"))
+
+
+def generate_facebook_export(
+    export_dir: str,
+    posts: int = 1000,
+    albums: int = 50,
+    photos_per_album: int = 10,
+    media_size: int = 20000,
+    seed: int = 1,
+):
+    """
+    Write a Facebook export with status updates, photo and link attachments,
+    check-ins and albums under ``posts/album/<n>.json``
+
+    Args:
+        export_dir: Directory the export is written to.
+        posts: Number of posts in ``posts/your_posts_1.json``.
+        albums: Number of albums.
+        photos_per_album: Number of photos in each album.
+        media_size: Size in bytes of each dummy media file.
+        seed: Seed of the random generator, the same seed gives the same export.
+    """
+    rng = random.Random(seed)
+    posts_dir = os.path.join(export_dir, "posts")
+    items = []
+    for i in range(posts):
+        timestamp = 1262304000 + i * 3600 * 7
+        kind = i % 4
+        if kind == 0:
+            text = mojibake(_sentence(rng, rng.randint(3, 30)))
+            items.append(
+                {
+                    "timestamp": timestamp,
+                    "data": [{"post": text}],
+                    "tags": [{"name": mojibake(_sentence(rng, 2))}],
+                }
+            )
+        elif kind == 1:
+            uri = f"posts/media/photos{i % 20}/{i}.jpg"
+            _media_file(rng, os.path.join(export_dir, uri), media_size)
+            data = {"media": {"uri": uri}}
+            if i % 3 == 0:
+                coordinate = {"latitude": rng.uniform(-90, 90), "longitude": 2.17}
+                data["place"] = {"coordinate": coordinate}
+            items.append(
+                {
+                    "timestamp": timestamp,
+                    "data": [{"post": mojibake(_sentence(rng, 5))}],
+                    "attachments": [{"data": [data]}],
+                }
+            )
+        elif kind == 2:
+            external = {"url": f"https://example.com/{i}", "name": _sentence(rng, 4)}
+            items.append(
+                {
+                    "timestamp": timestamp,
+                    "attachments": [{"data": [{"external_context": external}]}],
+                }
+            )
+        else:
+            # no text, skipped by the import
+            items.append({"timestamp": timestamp, "title": "updated the status"})
+    os.makedirs(posts_dir, exist_ok=True)
+    with open(os.path.join(posts_dir, "your_posts_1.json"), "w") as f:
+        json.dump(items, f)
+
+    album_dir = os.path.join(posts_dir, "album")
+    os.makedirs(album_dir, exist_ok=True)
+    for a in range(albums):
+        photos = []
+        for p in range(photos_per_album):
+            uri = f"posts/media/album{a}/{p}.jpg"
+            _media_file(rng, os.path.join(export_dir, uri), media_size)
+            photo = {"uri": uri, "creation_timestamp": 1300000000 + a * 86400 + p}
+            if p % 2:
+                photo["description"] = mojibake(_sentence(rng, 6))
+            photos.append(photo)
+        album = {"name": mojibake(_sentence(rng, 3)), "photos": photos}
+        with open(os.path.join(album_dir, f"{a}.json"), "w") as f:
+            json.dump(album, f)
+
+
+def generate_instagram_export(
+    export_dir: str, posts: int = 1000, media_size: int = 20000, seed: int = 1
+):
+    """
+    Write an Instagram export with single and multi-photo posts,
+    hashtags, mentions and remote videos in ``content/posts_1.json``
+
+    Args:
+        export_dir: Directory the export is written to.
+        posts: Number of posts.
+        media_size: Size in bytes of each dummy media file.
+        seed: Seed of the random generator, the same seed gives the same export.
+    """
+    rng = random.Random(seed)
+    items = []
+    for i in range(posts):
+        timestamp = 1420070400 + i * 3600 * 11
+        title = mojibake(f"{_sentence(rng, rng.randint(1, 15))} #viaje @amigo")
+        media = []
+        for m in range(1 + i % 3):
+            uri = f"media/posts/{i // 100}/{i}_{m}.jpg"
+            _media_file(rng, os.path.join(export_dir, uri), media_size)
+            media.append({"uri": uri, "creation_timestamp": timestamp, "title": title})
+        if i % 10 == 0:
+            media.append(
+                {
+                    "uri": f"https://example.com/{i}.mp4",
+                    "creation_timestamp": timestamp,
+                    "title": mojibake(_sentence(rng, 4)),
+                }
+            )
+        if len(media) > 1:
+            items.append(
+                {"creation_timestamp": timestamp, "title": title, "media": media}
+            )
+        else:
+            items.append({"media": media})
+    content_dir = os.path.join(export_dir, "content")
+    os.makedirs(content_dir, exist_ok=True)
+    with open(os.path.join(content_dir, "posts_1.json"), "w") as f:
+        json.dump(items, f)
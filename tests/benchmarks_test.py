@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+from box import Box
+from benchmarks.micro import micro_benchmark
+from benchmarks.run import compare
+from benchmarks.synthetic import generate_facebook_export, generate_instagram_export
+from treasurechest.engine.engine import Engine
+
+
+def test_synthetic_exports_import(tmp_path):
+    generate_facebook_export(
+        str(tmp_path / "fb"), posts=20, albums=3, photos_per_album=2, media_size=10
+    )
+    generate_instagram_export(str(tmp_path / "ig"), posts=10, media_size=10)
+    site = tmp_path / "site"
+    site.mkdir()
+    config = Box(
+        author="Jane Doe",
+        site_dir=str(site),
+        facebook_export_dir=str(tmp_path / "fb"),
+        instagram_export_dir=str(tmp_path / "ig"),
+    )
+    engine = Engine(config)
+    posts = engine.import_facebook_posts()
+    assert (posts["imported"], posts["skipped"]) == (15, 5)
+    assert posts["media_copied"] == 5
+    assert engine.import_facebook_albums()["imported"] == 3
+    assert engine.import_instagram_posts()["imported"] == 10
+    titles = [p.read_text() for p in site.glob("content/posts/janedoe/*/*/*.md")]
+    assert any("ñ" in text for text in titles)
+    assert not any("Ã" in text for text in titles)
+
+
+def test_compare():
+    baseline = {"facebook_posts": {"items_per_sec": 100.0, "peak_rss_mb": 50.0}}
+    within = {"facebook_posts": {"items_per_sec": 90.0, "peak_rss_mb": 55.0}}
+    assert compare(within, baseline, 0.25) == []
+    slower = {"facebook_posts": {"items_per_sec": 70.0, "peak_rss_mb": 70.0}}
+    regressions = compare(slower, baseline, 0.25)
+    assert [r.split(":")[0] for r in regressions] == [
+        "facebook_posts items_per_sec",
+        "facebook_posts peak_rss_mb",
+    ]
+
+
+def test_micro_benchmark(tmp_path):
+    results = micro_benchmark(str(tmp_path), posts=20, albums=2, repeat=1)
+    assert [r["items"] for r in results.values()] == [20, 2, 10]
+    assert all(r["shared_us"] > 0 for r in results.values())
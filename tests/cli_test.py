@@ -1,5 +1,43 @@
 # -*- coding: utf-8 -*-
+import subprocess
+import sys
+
+# dependencies the CLI must not load to show its help or version
+HEAVY_MODULES = ("ftfy", "tqdm", "yaml", "box", "PIL", "treasurechest.engine")
+# cumulative import time of treasurechest.cli in microseconds, about 60 ms
+# on a laptop, most of it click
+STARTUP_BUDGET_US = 150000
+
+
+def import_times(*args) -> dict:
+    """
+    Cumulative import time of each module imported by a CLI run, from
+    ``python -X importtime``
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-m", "treasurechest", *args],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        if line.startswith("import time:") and "|" in line:
+            _, cumulative, name = line[len("import time:") :].split("|")
+            if cumulative.strip().isdigit():
+                times[name.strip()] = int(cumulative)
+    return times
 
 
 def test_sample():
     pass
+
+
+def test_startup_is_lazy():
+    for args in (["--help"], ["--version"], ["import-all", "--help"]):
+        times = import_times(*args)
+        loaded = [m for m in times if m.split(".")[0] in HEAVY_MODULES]
+        loaded += [m for m in times if m.startswith(HEAVY_MODULES)]
+        assert not loaded, f"{args} imports {sorted(set(loaded))}"
+    best = min(import_times("--help")["treasurechest.cli"] for _ in range(3))
+    assert best < STARTUP_BUDGET_US
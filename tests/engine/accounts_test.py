@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+import json
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest
+from box import Box
+from treasurechest.engine.accounts import (
+    group_accounts,
+    import_accounts,
+    init_account_worker,
+    load_accounts,
+)
+
+
+def facebook_export(path, name):
+    (path / "posts" / "album").mkdir(parents=True)
+    (path / "posts" / "photos").mkdir()
+    posts = []
+    for i in range(3):
+        (path / "posts" / "photos" / f"{i}.jpg").write_bytes(name.encode())
+        posts.append(
+            {
+                "timestamp": 1300000000 + i * 86400,
+                "data": [{"post": f"{name} post {i}"}],
+                "attachments": [
+                    {"data": [{"media": {"uri": f"posts/photos/{i}.jpg"}}]}
+                ],
+            }
+        )
+    (path / "posts" / "your_posts_1.json").write_text(json.dumps(posts))
+
+
+def instagram_export(path):
+    (path / "content").mkdir(parents=True)
+    (path / "media").mkdir()
+    posts = []
+    for i in range(2):
+        (path / "media" / f"{i}.jpg").write_bytes(b"ig")
+        media = {
+            "uri": f"media/{i}.jpg",
+            "creation_timestamp": 1400000000 + i * 86400,
+            "title": f"Instagram post {i}",
+        }
+        posts.append({"media": [media]})
+    (path / "content" / "posts_1.json").write_text(json.dumps(posts))
+
+
+def test_import_accounts(tmp_path):
+    facebook_export(tmp_path / "jane_fb", "Jane")
+    facebook_export(tmp_path / "john_fb", "John")
+    instagram_export(tmp_path / "jane_ig")
+    site = tmp_path / "site"
+    site.mkdir()
+    config = Box(
+        site_dir=str(site),
+        accounts=[
+            {
+                "author": "Jane Doe",
+                "source": "facebook",
+                "export_dir": str(tmp_path / "jane_fb"),
+            },
+            {
+                "author": "John Doe",
+                "source": "facebook",
+                "export_dir": str(tmp_path / "john_fb"),
+            },
+            {
+                "author": "Jane Doe",
+                "source": "instagram",
+                "export_dir": str(tmp_path / "jane_ig"),
+            },
+        ],
+    )
+    results = import_accounts(config, workers=2)
+    assert [(r.account.label, r.status) for r in results] == [
+        ("Jane Doe (facebook)", "done"),
+        ("John Doe (facebook)", "done"),
+        ("Jane Doe (instagram)", "done"),
+    ]
+    assert [r.counts["imported"] for r in results] == [3, 3, 2]
+    posts = site / "content/posts"
+    assert len(list(posts.glob("janedoe/*/*/fb-*.md"))) == 3
+    assert len(list(posts.glob("janedoe/*/*/insta-*.md"))) == 2
+    assert len(list(posts.glob("johndoe/*/*/fb-*.md"))) == 3
+    assert (site / "static/johndoe/facebook/posts/photos/0.jpg").read_bytes() == b"John"
+    states = site / ".treasurechest/accounts"
+    assert sorted(p.name for p in states.iterdir()) == ["janedoe", "johndoe"]
+
+    # each author's manifest only holds its posts, so nothing is pruned
+    results = import_accounts(config, workers=2)
+    assert [r.counts["unchanged"] for r in results] == [3, 3, 2]
+    assert sum(r.counts["removed"] for r in results) == 0
+    assert len(list(posts.rglob("*.md"))) == 8
+
+
+def test_accounts_writing_to_the_same_directories_are_rejected():
+    config = Box(
+        accounts=[
+            {"author": "Jane Doe", "source": "facebook", "export_dir": "a"},
+            {"author": "janedoe", "source": "facebook", "export_dir": "b"},
+        ]
+    )
+    with pytest.raises(ValueError, match="static/janedoe/facebook"):
+        group_accounts(load_accounts(config))
+    config.accounts[1].source = "instagram"
+    assert len(group_accounts(load_accounts(config))) == 1
+    config.accounts[1].source = "myspace"
+    with pytest.raises(ValueError, match="Unknown source"):
+        load_accounts(config)
+
+
+def test_spawned_account_workers_set_up_logging(tmp_path):
+    log_file = tmp_path / "import.log"
+    logging_config = {
+        "version": 1,
+        "handlers": {
+            "file": {"class": "logging.FileHandler", "filename": str(log_file)}
+        },
+        "root": {"level": "INFO", "handlers": ["file"]},
+    }
+    with ProcessPoolExecutor(
+        max_workers=1,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=init_account_worker,
+        initargs=(logging_config,),
+    ) as pool:
+        pool.submit(logging.getLogger("treasurechest").info, "from a worker").result()
+    assert log_file.read_text() == "from a worker\n"
@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+import pytest
+from box import Box
+from benchmarks.synthetic import generate_facebook_export
+from treasurechest.engine.albums import AlbumLoader, discover_albums
+from treasurechest.engine.engine import Engine
+
+
+def test_discover_albums_sorts_numerically(tmp_path):
+    for name in ("10.json", "2.json", "1.json", "notes.json", "3.json.bak"):
+        (tmp_path / name).write_text("{}")
+    (tmp_path / "4.json").mkdir()
+    paths = discover_albums(str(tmp_path))
+    assert paths == [str(tmp_path / f"{n}.json") for n in (1, 2, 10)]
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_broken_albums_are_reported_and_kept(tmp_path, workers):
+    fb = tmp_path / "fb"
+    generate_facebook_export(
+        str(fb), posts=0, albums=12, photos_per_album=1, media_size=10
+    )
+    site = tmp_path / "site"
+    site.mkdir()
+    config = Box(
+        author="Jane Doe",
+        site_dir=str(site),
+        facebook_export_dir=str(fb),
+        album_workers=workers,
+    )
+    counts = Engine(config, progress=False).import_facebook_albums()
+    assert counts["imported"] == 12
+    posts = site / "content/posts/janedoe"
+    names = sorted(p.name for p in posts.rglob("fb-album-*.md"))
+
+    album_dir = fb / "posts" / "album"
+    (album_dir / "4.json").write_text('{"name": "truncated", "pho')
+    (album_dir / "7.json").write_text('{"name": "no photos"}')
+    loader = AlbumLoader(discover_albums(str(album_dir)), workers)
+    assert [n for n, _ in loader] == [1, 2, 3, 4, 6, 7, 9, 10, 11, 12]
+    assert [path for path, _ in loader.failed] == [
+        str(album_dir / "4.json"),
+        str(album_dir / "7.json"),
+    ]
+
+    counts = Engine(config, progress=False).import_facebook_albums()
+    assert (counts["unchanged"], counts["failed"], counts["removed"]) == (10, 2, 0)
+    assert sorted(p.name for p in posts.rglob("fb-album-*.md")) == names
@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+import os
+import zipfile
+
+from box import Box
+from pytest import raises
+from benchmarks.synthetic import generate_facebook_export, generate_instagram_export
+from treasurechest.engine.archive import (
+    ExportArchive,
+    _archives,
+    open_source,
+    register_archives,
+    source_isdir,
+    source_listdir,
+    stat_source,
+)
+from treasurechest.engine.engine import Engine
+
+
+def zip_export(export_dir, archives):
+    # split the files of an export over several archives, like large exports
+    files = sorted(
+        os.path.relpath(os.path.join(d, f), export_dir)
+        for d, _, names in os.walk(export_dir)
+        for f in names
+    )
+    for i, path in enumerate(archives):
+        with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as z:
+            for name in files[i :: len(archives)]:
+                z.write(os.path.join(export_dir, name), name)
+
+
+def site_files(site):
+    return {
+        str(p.relative_to(site)): p.read_bytes()
+        for p in site.rglob("*")
+        if p.is_file() and ".treasurechest" not in p.parts
+    }
+
+
+def test_export_archive(tmp_path):
+    path = str(tmp_path / "export.zip")
+    with zipfile.ZipFile(path, "w") as z:
+        z.writestr("posts/your_posts_1.json", b"[]")
+        z.writestr("posts/media/a.jpg", b"abc")
+    register_archives(Box(facebook_export_dir=path))
+    assert source_isdir(os.path.join(path, "posts"))
+    assert source_listdir(os.path.join(path, "posts")) == ["media", "your_posts_1.json"]
+    with open_source(os.path.join(path, "posts/media/a.jpg")) as f:
+        assert f.read() == b"abc"
+    assert stat_source(os.path.join(path, "posts/media/a.jpg")).st_size == 3
+    with raises(FileNotFoundError):
+        ExportArchive([path]).open(os.path.join(path, "posts/missing.jpg"))
+
+
+def test_import_from_split_archives(tmp_path):
+    generate_facebook_export(str(tmp_path / "fb"), posts=40, albums=0, media_size=50)
+    generate_instagram_export(str(tmp_path / "ig"), posts=20, media_size=50)
+    fb_zip = str(tmp_path / "fb.zip")
+    ig_zips = [str(tmp_path / f"ig-{i}.zip") for i in range(3)]
+    zip_export(str(tmp_path / "fb"), [fb_zip])
+    zip_export(str(tmp_path / "ig"), ig_zips)
+    sites = []
+    for name, fb, ig in [
+        ("site", str(tmp_path / "fb"), str(tmp_path / "ig")),
+        ("zip-site", fb_zip, ig_zips),
+    ]:
+        site = tmp_path / name
+        site.mkdir()
+        config = Box(
+            author="Jane Doe",
+            site_dir=str(site),
+            facebook_export_dir=fb,
+            instagram_export_dir=ig,
+            stream_json=True,
+        )
+        engine = Engine(config)
+        engine.import_facebook_posts()
+        counts = engine.import_instagram_posts()
+        assert counts["media_copied"] == 39
+        assert engine.import_instagram_posts()["unchanged"] == 20
+        # the archives read are closed once each import is done
+        assert not any(archive._files for archive in _archives.values())
+        sites.append(site_files(site))
+    assert sites[0] and sites[0] == sites[1]
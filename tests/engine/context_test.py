@@ -0,0 +1,28 @@
+# -*- coding: utf-8 -*-
+from box import Box
+from pytest import raises
+from treasurechest.engine.context import import_context
+
+
+def test_import_context(tmp_path):
+    config = Box(
+        author="Jane Doe",
+        site_dir=str(tmp_path),
+        facebook_export_dir=[str(tmp_path / "fb-1.zip"), str(tmp_path / "fb-2.zip")],
+        text_fixer={"instagram": "ftfy"},
+    )
+    context = import_context(config)
+    assert context.posts_dir == str(tmp_path / "content/posts/janedoe") + "/"
+    assert context.static_dir == str(tmp_path / "static/janedoe")
+    assert context.url_prefix == "/janedoe/"
+    assert context.export_dirs == {
+        "facebook": str(tmp_path / "fb-1.zip"),
+        "instagram": "",
+    }
+    assert context.text_fixers == {"facebook": "fast", "instagram": "ftfy"}
+    with raises(AttributeError):
+        context.author = "John Doe"
+    with raises(ValueError):
+        import_context(Box(config, text_fixer={"facebook": "other"}))
+    with raises(NotADirectoryError):
+        import_context(Box(config, site_dir=str(tmp_path / "missing")))
@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+import json
+
+import pytest
+from box import Box
+from treasurechest.engine.context import import_context
+from treasurechest.engine.engine import Engine
+from treasurechest.engine.dates import normalize_dates
+
+
+def test_normalize_dates_in_timezone():
+    pytest.importorskip("zoneinfo")
+    # before and after the switch to summer time in Madrid, 2021-03-28 01:00 UTC
+    timestamps = [1616893199, 1616893200, 1616893200, 1609459199]
+    dates = normalize_dates(timestamps, "Europe/Madrid")
+    assert list(dates.timestamps) == timestamps
+    assert dates.dates == [
+        "2021-03-28 01:59:59",
+        "2021-03-28 03:00:00",
+        "2021-03-28 03:00:00",
+        "2021-01-01 00:59:59",
+    ]
+    assert dates.buckets == ["2021/03", "2021/03", "2021/03", "2021/01"]
+    assert normalize_dates(timestamps[3:], "UTC").buckets == ["2020/12"]
+
+
+def test_unknown_timezone_is_rejected(tmp_path):
+    config = Box(author="Jane Doe", site_dir=str(tmp_path), timezone="Mars/Olympus")
+    with pytest.raises(ValueError, match="timezone"):
+        import_context(config)
+
+
+def test_changing_timezone_imports_posts_again(tmp_path):
+    pytest.importorskip("zoneinfo")
+    export = tmp_path / "fb" / "posts"
+    export.mkdir(parents=True)
+    # 2011-04-01 00:00 UTC, still March in New York
+    posts = [{"timestamp": 1301616000, "data": [{"post": "April fools"}]}]
+    (export / "your_posts_1.json").write_text(json.dumps(posts))
+    site = tmp_path / "site"
+    site.mkdir()
+    config = Box(
+        author="Jane Doe",
+        site_dir=str(site),
+        facebook_export_dir=str(export.parent),
+        timezone="UTC",
+    )
+    assert Engine(config, progress=False).import_facebook_posts()["imported"] == 1
+    assert Engine(config, progress=False).import_facebook_posts()["unchanged"] == 1
+    config.timezone = "America/New_York"
+    counts = Engine(config, progress=False).import_facebook_posts()
+    assert (counts["imported"], counts["unchanged"]) == (1, 0)
+    [post] = site.rglob("fb-*.md")
+    assert post.parent.relative_to(site).as_posix() == "content/posts/janedoe/2011/03"
+    assert "2011-03-31 20:00:00" in post.read_text()
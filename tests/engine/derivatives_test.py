@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+import json
+
+import pytest
+from box import Box
+from treasurechest.engine import derivatives
+from treasurechest.engine.derivatives import (
+    derivative_path,
+    derivative_settings,
+    make_derivatives,
+)
+from treasurechest.engine.engine import Engine
+from treasurechest.engine.manifest import Manifest
+from treasurechest.engine.render import import_items
+
+
+def test_derivative_settings(monkeypatch):
+    config = Box(image_derivatives={"thumbnail": 320}, derivative_format="WebP")
+    settings = derivative_settings(config)
+    if settings:  # Pillow is installed
+        assert settings.ext == ".webp"
+        assert (
+            derivative_path("janedoe/facebook/a/b.jpg", "thumbnail", settings)
+            == "janedoe/derivatives/thumbnail/facebook/a/b.webp"
+        )
+        with pytest.raises(ValueError):
+            derivative_settings(Box(config, derivative_format="tiff"))
+    monkeypatch.setattr(derivatives, "pillow_available", lambda: False)
+    assert derivative_settings(config) is None
+
+
+def test_import_with_derivatives(tmp_path):
+    Image = pytest.importorskip("PIL.Image")
+    photos = tmp_path / "fb" / "photos"
+    photos.mkdir(parents=True)
+    Image.new("RGB", (200, 100), "red").save(photos / "0.jpg")
+    (photos / "1.jpg").write_bytes((photos / "0.jpg").read_bytes())
+    Image.new("RGBA", (50, 80)).save(photos / "2.png")
+    (photos / "3.jpg").write_bytes(b"not an image")
+    (photos / "4.mp4").write_bytes(b"video")
+    posts = [
+        {
+            "timestamp": 1300000000 + i * 86400,
+            "data": [{"post": f"Post number {i}"}],
+            "attachments": [{"data": [{"media": {"uri": f"photos/{name}"}}]}],
+        }
+        for i, name in enumerate(["0.jpg", "1.jpg", "2.png", "3.jpg", "4.mp4"])
+    ]
+    site = tmp_path / "site"
+    site.mkdir()
+    config = Box(
+        author="Jane Doe",
+        site_dir=str(site),
+        facebook_export_dir=str(tmp_path / "fb"),
+        image_derivatives={"thumbnail": 20, "medium": 64},
+        derivative_format="webp",
+        derivative_workers=1,
+    )
+    manifest = Manifest(str(site))
+    import_items(config, "facebook_post", enumerate(posts, 1), manifest)
+    stats = make_derivatives(config, manifest)
+    assert stats["derivatives_made"] == 4  # 0.jpg and 1.jpg are the same image
+    assert stats["derivative_images_failed"] == 1
+    assert stats["derivatives_linked"] == 8
+
+    post = (site / "content/posts/janedoe/2011/03/fb-1-post-number-0.md").read_text()
+    assert (
+        "featured_image: '/janedoe/derivatives/thumbnail/facebook/photos/0.webp'"
+        in post
+    )
+    assert (
+        "[![img](/janedoe/derivatives/medium/facebook/photos/0.webp)]"
+        "(/janedoe/facebook/photos/0.jpg)" in post
+    )
+    derived = site / "static/janedoe/derivatives"
+    with Image.open(derived / "medium/facebook/photos/0.webp") as image:
+        assert (image.format, image.size) == ("WEBP", (64, 32))
+    with Image.open(derived / "thumbnail/facebook/photos/2.webp") as image:
+        assert image.size == (12, 20)
+    assert (derived / "medium/facebook/photos/3.webp").read_bytes() == b"not an image"
+    video = (site / "content/posts/janedoe/2011/03/fb-5-post-number-4.md").read_text()
+    assert "![img](/janedoe/facebook/photos/4.mp4)" in video
+    assert manifest.entries[next(iter(manifest.entries))]["derivatives"]
+
+    # a rebuild finds the variants in the cache
+    manifest = Manifest(str(site))
+    import_items(config, "facebook_post", enumerate(posts, 1), manifest)
+    stats = make_derivatives(config, manifest)
+    assert stats["derivatives_made"] == stats["derivatives_linked"] == 0
+
+
+def test_enabling_derivatives_on_an_existing_site(tmp_path):
+    Image = pytest.importorskip("PIL.Image")
+    export = tmp_path / "fb"
+    (export / "posts").mkdir(parents=True)
+    Image.new("RGB", (200, 100), "red").save(export / "posts" / "0.jpg")
+    posts = [
+        {
+            "timestamp": 1300000000,
+            "data": [{"post": "Post number 0"}],
+            "attachments": [{"data": [{"media": {"uri": "posts/0.jpg"}}]}],
+        }
+    ]
+    (export / "posts" / "your_posts_1.json").write_text(json.dumps(posts))
+    site = tmp_path / "site"
+    site.mkdir()
+    config = Box(author="Jane Doe", site_dir=str(site), facebook_export_dir=str(export))
+    assert Engine(config, progress=False).import_facebook_posts()["imported"] == 1
+    config.image_derivatives = {"thumbnail": 20}
+    counts = Engine(config, progress=False).import_facebook_posts()
+    assert (counts["imported"], counts["derivatives_made"]) == (1, 1)
+    [post] = site.rglob("fb-*.md")
+    assert "featured_image: '/janedoe/derivatives/thumbnail/" in post.read_text()
@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+import pytest
+from box import Box
+from treasurechest.engine import render
+from treasurechest.engine.journal import (
+    ImportInterrupted,
+    import_journal,
+    request_stop,
+    stop_on_signals,
+)
+from treasurechest.engine.manifest import Manifest
+from treasurechest.engine.render import import_items
+
+POSTS = [
+    {
+        "timestamp": 1300000000 + i * 86400,
+        "data": [{"post": f"Post number {i}"}],
+        "attachments": [{"data": [{"media": {"uri": f"photos/{i}.jpg"}}]}],
+    }
+    for i in range(10)
+]
+
+
+def import_posts(config, resume=False, stop=False):
+    manifest = Manifest(config.site_dir).load()
+    journal = import_journal(config, "facebook_post", resume=resume)
+    with stop_on_signals():
+        if stop:
+            request_stop()
+        counts = import_items(
+            config, "facebook_post", enumerate(POSTS, 1), manifest, journal=journal
+        )
+    manifest.prune("facebook_post")
+    manifest.save()
+    return counts
+
+
+@pytest.mark.parametrize("pipeline", [False, True])
+def test_interrupted_import_resumes(tmp_path, monkeypatch, pipeline):
+    monkeypatch.setattr(render, "WRITE_BATCH_SIZE", 4)
+    (tmp_path / "fb" / "photos").mkdir(parents=True)
+    for i in range(10):
+        (tmp_path / "fb" / "photos" / f"{i}.jpg").write_bytes(b"x" * i)
+    site = tmp_path / "site"
+    site.mkdir()
+    config = Box(
+        author="Jane Doe",
+        site_dir=str(site),
+        facebook_export_dir=str(tmp_path / "fb"),
+        checkpoint_items=1,
+        pipeline=pipeline,
+        pipeline_batch_size=4,
+    )
+    with pytest.raises(ImportInterrupted):
+        import_posts(config, stop=True)
+    posts_dir = site / "content/posts/janedoe"
+    assert len(list(posts_dir.rglob("*.md"))) == 4
+    journal = site / ".treasurechest/journal-facebook_post-1.jsonl"
+    assert journal.read_text().count("\n") == 1
+
+    # a media copy cut short and a journal line cut short by a crash
+    (site / "static/janedoe/facebook/photos/2.jpg").unlink()
+    with journal.open("a") as f:
+        f.write('{"done": 8, "entr')
+    counts = import_posts(config, resume=True)
+    assert counts["resumed"] == 4
+    assert counts["imported"] == 6
+    assert len(list(posts_dir.rglob("*.md"))) == 10
+    assert (site / "static/janedoe/facebook/photos/2.jpg").read_bytes() == b"xx"
+    assert not list(site.rglob("*.tmp"))
+    manifest = Manifest(str(site)).load()
+    assert len(manifest.entries) == 10
+
+    counts = import_posts(config)
+    assert counts["unchanged"] == 10
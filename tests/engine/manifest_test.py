@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+from treasurechest.engine.manifest import Manifest, content_key
+
+
+def test_content_key_ignores_key_order():
+    a = content_key("facebook_post", "Jane", {"timestamp": 1, "data": []})
+    b = content_key("facebook_post", "Jane", {"data": [], "timestamp": 1})
+    assert a == b
+    assert a != content_key("instagram_post", "Jane", {"data": [], "timestamp": 1})
+
+
+def test_manifest_round_trip_and_prune(tmp_path):
+    src = tmp_path / "photo.jpg"
+    src.write_bytes(b"jpeg")
+    dst = tmp_path / "site" / "static" / "photo.jpg"
+    dst.parent.mkdir(parents=True)
+    dst.write_bytes(b"jpeg")
+    post = tmp_path / "site" / "post.md"
+    post.write_text("post")
+
+    manifest = Manifest(str(tmp_path / "site"))
+    manifest.add("k1", "facebook_post", str(post), [(str(src), str(dst))])
+    manifest.set_checksums({str(dst): "abc"})
+    manifest.save()
+
+    manifest = Manifest(str(tmp_path / "site")).load()
+    assert manifest.is_current("k1")
+    assert manifest.entries["k1"]["media"][0]["sha1"] == "abc"
+    assert manifest.prune("facebook_post") == 1
+    assert not post.exists() and not dst.exists()
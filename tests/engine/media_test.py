@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+import os
+
+from box import Box
+from pytest import raises
+from treasurechest.engine.manifest import Manifest
+from treasurechest.engine.media import CopyIndex, MediaCopier, MediaCopyError
+from treasurechest.engine.render import import_items
+
+
+def test_media_copier_copies_files(tmp_path):
+    src = tmp_path / "src.jpg"
+    src.write_bytes(b"jpeg")
+    dst = tmp_path / "site" / "static" / "a" / "src.jpg"
+    with MediaCopier(workers=2) as copier:
+        copier.submit(str(src), str(dst))
+    assert dst.read_bytes() == b"jpeg"
+
+
+def test_media_copier_reports_failures_in_order(tmp_path):
+    missing = [str(tmp_path / f"missing_{i}.jpg") for i in range(5)]
+    copier = MediaCopier(workers=3)
+    for src in missing:
+        copier.submit(src, os.path.join(str(tmp_path), "out", os.path.basename(src)))
+    with raises(MediaCopyError) as err:
+        copier.join()
+    assert [src for src, _, _ in err.value.failures] == missing
+
+
+def test_media_copier_links_and_counts_bytes(tmp_path):
+    src = tmp_path / "src.jpg"
+    src.write_bytes(b"jpeg")
+    site = tmp_path / "site"
+    with MediaCopier(workers=1, mode="hardlink") as copier:
+        copier.submit(str(src), str(site / "linked.jpg"))
+    assert os.path.samefile(str(src), str(site / "linked.jpg"))
+    assert copier.stats == {"media_hardlinked": 1}
+
+    # switching back to copies must not truncate the linked source
+    with MediaCopier(workers=1) as copier:
+        copier.submit(str(src), str(site / "linked.jpg"))
+    assert not os.path.samefile(str(src), str(site / "linked.jpg"))
+    assert src.read_bytes() == (site / "linked.jpg").read_bytes() == b"jpeg"
+    assert copier.stats == {"media_copied": 1, "media_bytes_written": 4}
+
+
+def test_media_copier_falls_back_to_copy(tmp_path):
+    src = tmp_path / "src.jpg"
+    src.write_bytes(b"jpeg")
+    with MediaCopier(workers=1, mode="reflink") as copier:
+        copier.submit(str(src), str(tmp_path / "site" / "src.jpg"))
+    assert (tmp_path / "site" / "src.jpg").read_bytes() == b"jpeg"
+    assert sum(copier.stats[k] for k in ["media_copied", "media_reflinked"]) == 1
+
+
+def test_media_copier_skips_unchanged_copies(tmp_path):
+    src = tmp_path / "src.jpg"
+    src.write_bytes(b"jpeg")
+    dst = str(tmp_path / "site" / "src.jpg")
+    index = CopyIndex(str(tmp_path / "copy_index.json"))
+    with MediaCopier(workers=1, skip_unchanged=True, index=index) as copier:
+        copier.submit(str(src), dst)
+    assert copier.stats["media_copied"] == 1
+
+    with MediaCopier(workers=1, skip_unchanged=True, index=index) as copier:
+        copier.submit(str(src), dst)
+    assert copier.stats == {"media_skipped": 1, "media_bytes_saved": 4}
+
+    # a new export of the same file only changes its mtime
+    os.utime(str(src), ns=(0, 10**9))
+    with MediaCopier(workers=1, skip_unchanged=True, index=index) as copier:
+        copier.submit(str(src), dst)
+    assert copier.stats == {"media_skipped": 1, "media_bytes_saved": 4}
+
+    src.write_bytes(b"png!")
+    with MediaCopier(workers=1, skip_unchanged=True, index=index) as copier:
+        copier.submit(str(src), dst)
+    assert copier.stats["media_copied"] == 1
+    assert open(dst, "rb").read() == b"png!"
+
+
+def test_posts_sharing_a_media_file(tmp_path):
+    export = tmp_path / "ig"
+    (export / "media").mkdir(parents=True)
+    (export / "media" / "shared.jpg").write_bytes(os.urandom(4 * 1024 * 1024))
+    posts = [
+        {
+            "media": [
+                {
+                    "uri": "media/shared.jpg",
+                    "creation_timestamp": 1500000000 + i * 86400,
+                    "title": f"Post {i}",
+                }
+            ]
+        }
+        for i in range(6)
+    ]
+    site = tmp_path / "site"
+    site.mkdir()
+    config = Box(
+        author="Jane Doe",
+        site_dir=str(site),
+        instagram_export_dir=str(export),
+        media_workers=6,
+    )
+    manifest = Manifest(str(site))
+    counts = import_items(config, "instagram_post", enumerate(posts, 1), manifest)
+    assert (counts["imported"], counts["media_copied"]) == (6, 1)
+    assert counts["media_bytes_written"] == 4 * 1024 * 1024
+    copy = site / "static/janedoe/instagram/media/shared.jpg"
+    assert copy.read_bytes() == (export / "media" / "shared.jpg").read_bytes()
+    assert not list(copy.parent.glob("*.tmp"))
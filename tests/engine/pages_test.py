@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+import pytest
+from box import Box
+from treasurechest.engine.manifest import Manifest
+from treasurechest.engine.render import import_items
+
+POSTS = [
+    {
+        "timestamp": 1300000000 + i * 86400 * 10,
+        "data": [{"post": f"Post number {i}"}],
+        "tags": [{"name": "Joe"}] if i % 2 else [],
+        "attachments": (
+            [{"data": [{"media": {"uri": f"photos/{i}.jpg"}}]}] if i > 1 else []
+        ),
+    }
+    for i in range(6)
+]
+
+
+def import_posts(config, posts):
+    manifest = Manifest(config.site_dir).load()
+    counts = import_items(config, "facebook_post", enumerate(posts, 1), manifest)
+    manifest.prune("facebook_post")
+    manifest.save()
+    return counts
+
+
+def test_posts_grouped_by_month(tmp_path):
+    pytest.importorskip("zoneinfo")
+    (tmp_path / "fb" / "photos").mkdir(parents=True)
+    for i in range(6):
+        (tmp_path / "fb" / "photos" / f"{i}.jpg").write_bytes(b"x")
+    site = tmp_path / "site"
+    site.mkdir()
+    # page dates are checked in the time zone of the expected values
+    config = Box(
+        author="Jane Doe",
+        site_dir=str(site),
+        facebook_export_dir=str(tmp_path / "fb"),
+        timezone="Europe/Madrid",
+    )
+    import_posts(config, POSTS)
+    posts_dir = site / "content/posts/janedoe"
+    assert len(list(posts_dir.rglob("*.md"))) == 6
+
+    config.group_posts = "month"
+    counts = import_posts(config, POSTS)
+    assert counts["pages"] == 3
+    pages = sorted(p.relative_to(posts_dir).as_posix() for p in posts_dir.rglob("*"))
+    assert [p for p in pages if p.endswith(".md")] == [
+        "2011/03/fb-2011-03.md",
+        "2011/04/fb-2011-04.md",
+        "2011/05/fb-2011-05.md",
+    ]
+    april = (posts_dir / "2011/04/fb-2011-04.md").read_text()
+    assert april.startswith(
+        "---\n"
+        "title: 'Facebook posts - April 2011'\n"
+        "date: 2011-04-22 09:06:40\n"
+        "author: Jane Doe\n"
+        "featured_image: '/janedoe/facebook/photos/2.jpg'\n"
+        "categories: Jane Doe's Facebook Post\n"
+        "tags: \n- joe\n"
+        "---\n\n"
+        "## Post number 2\n\n*2011-04-02 09:06:40*\n\n"
+        "![img](/janedoe/facebook/photos/2.jpg)\n\n"
+    )
+    assert april.count("## Post number") == 3
+
+    counts = import_posts(config, POSTS[1:])
+    assert counts["imported"] == 5
+    march = (posts_dir / "2011/03/fb-2011-03.md").read_text()
+    assert march.count("## Post number") == 1
+    assert not list(posts_dir.rglob("*.part"))
+
+    config.group_posts = "year"
+    import_posts(config, POSTS)
+    assert [p.name for p in posts_dir.rglob("*.md")] == ["fb-2011.md"]
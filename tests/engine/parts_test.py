@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+import json
+import os
+
+from box import Box
+from pytest import mark, raises
+from benchmarks.synthetic import generate_facebook_export
+from treasurechest.engine.engine import Engine
+from treasurechest.engine.manifest import Manifest
+from treasurechest.engine.parts import FACEBOOK_PARTS, INSTAGRAM_PARTS, discover_parts
+
+
+def test_discover_parts_sorts_numerically(tmp_path):
+    for name in ["your_posts_10.json", "your_posts_2.json", "your_posts_1.json"]:
+        (tmp_path / name).write_text("[]")
+    (tmp_path / "your_posts_1.json.bak").write_text("[]")
+    parts = discover_parts(str(tmp_path), FACEBOOK_PARTS)
+    assert [os.path.basename(p) for p in parts] == [
+        "your_posts_1.json",
+        "your_posts_2.json",
+        "your_posts_10.json",
+    ]
+    assert discover_parts(str(tmp_path), INSTAGRAM_PARTS) == []
+    assert discover_parts(str(tmp_path / "missing"), INSTAGRAM_PARTS) == []
+
+
+def split_posts(fb, sizes):
+    posts_dir = fb / "posts"
+    posts = json.loads((posts_dir / "your_posts_1.json").read_text())
+    for n, size in enumerate(sizes, 1):
+        (posts_dir / f"your_posts_{n}.json").write_text(json.dumps(posts[:size]))
+        posts = posts[size:]
+
+
+def import_site(tmp_path, name, fb, **options):
+    site = tmp_path / name
+    site.mkdir()
+    config = Box(
+        author="Jane Doe", site_dir=str(site), facebook_export_dir=str(fb), **options
+    )
+    counts = Engine(config, progress=False).import_facebook_posts()
+    files = {
+        str(p.relative_to(site)): p.read_bytes()
+        for p in site.rglob("*.md")
+        if ".treasurechest" not in p.parts
+    }
+    return counts, files
+
+
+@mark.parametrize("stream_json", [False, True])
+def test_parts_are_numbered_in_order(tmp_path, stream_json):
+    fb = tmp_path / "fb"
+    generate_facebook_export(str(fb), posts=50, albums=0, media_size=10)
+    _, expected = import_site(tmp_path, "site", fb)
+    split_posts(fb, [7, 0, 30, 13])
+    counts, files = import_site(
+        tmp_path, "parts", fb, part_workers=2, stream_json=stream_json
+    )
+    assert counts["imported"] + counts["skipped"] == 50
+    assert files == expected
+
+
+def test_unreadable_part_fails_the_import(tmp_path):
+    fb = tmp_path / "fb"
+    generate_facebook_export(str(fb), posts=30, albums=0, media_size=10)
+    split_posts(fb, [10, 10, 10])
+    (fb / "posts" / "your_posts_2.json").write_text('[{"timestamp": 1')
+    with raises(ValueError):
+        import_site(tmp_path, "parts", fb, part_workers=2)
+
+
+def test_parts_do_not_claim_the_same_file(tmp_path):
+    export = tmp_path / "fb" / "posts"
+    export.mkdir(parents=True)
+    site = tmp_path / "site"
+    site.mkdir()
+    config = Box(
+        author="Jane Doe",
+        site_dir=str(site),
+        facebook_export_dir=str(export.parent),
+        part_workers=2,
+    )
+    # posts share a title, so new posts of both parts want the same files
+    posts = [
+        {"timestamp": 1300000000 + i * 60, "data": [{"post": "Post"}]}
+        for i in range(30)
+    ]
+    (export / "your_posts_1.json").write_text(json.dumps(posts[20:]))
+    assert Engine(config, progress=False).import_facebook_posts()["imported"] == 10
+    (export / "your_posts_1.json").write_text(json.dumps(posts[:10]))
+    (export / "your_posts_2.json").write_text(json.dumps(posts[10:]))
+    counts = Engine(config, progress=False).import_facebook_posts()
+    assert (counts["imported"], counts["unchanged"]) == (20, 10)
+    assert len(list(site.rglob("fb-*.md"))) == len(posts)
+    manifest = Manifest(str(site)).load()
+    assert len({entry["file"] for entry in manifest.entries.values()}) == len(posts)
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+import asyncio
+
+from box import Box
+from treasurechest.engine.manifest import Manifest
+from treasurechest.engine.pipeline import StageQueue
+from treasurechest.engine.render import import_items
+
+
+def make_export(export):
+    posts = []
+    for i in range(50):
+        post = {
+            "timestamp": 1300000000 + i * 86400 * 9,
+            "data": [{"post": f"Post {i}"}],
+        }
+        if i % 2:
+            uri = f"photos/{i}.jpg"
+            (export / "photos").mkdir(parents=True, exist_ok=True)
+            (export / uri).write_bytes(b"x" * i)
+            post["attachments"] = [{"data": [{"media": {"uri": uri}}]}]
+        posts.append(post)
+    return posts
+
+
+def test_pipeline_matches_serial_import(tmp_path):
+    posts = make_export(tmp_path / "fb")
+    outputs = []
+    for name, settings in [
+        ("serial", {}),
+        ("pipeline", dict(pipeline=True, pipeline_batch_size=3, pipeline_queue_size=1)),
+    ]:
+        site = tmp_path / name
+        site.mkdir()
+        config = Box(
+            author="Jane Doe",
+            site_dir=str(site),
+            facebook_export_dir=str(tmp_path / "fb"),
+            **settings,
+        )
+        counts = import_items(
+            config, "facebook_post", enumerate(posts, 1), Manifest(str(site))
+        )
+        files = {
+            str(p.relative_to(site)): p.read_bytes()
+            for p in site.rglob("*")
+            if p.is_file()
+        }
+        outputs.append((counts, files))
+    assert outputs[0][0]["imported"] == 50
+    assert outputs[0][0]["media_copied"] == 25
+    assert outputs[0] == outputs[1]
+
+
+def test_stage_queue_depth():
+    async def fill():
+        queue = StageQueue("render", 2)
+        await queue.put([1])
+        await queue.put([2])
+        task = asyncio.ensure_future(queue.put([3]))
+        await asyncio.sleep(0)
+        assert not task.done()  # blocked until the consumer takes a batch
+        assert await queue.get() == [1]
+        await task
+        assert await queue.get() == [2]
+        await queue.put(None)  # the end of the items is not counted
+        return queue
+
+    queue = asyncio.run(fill())
+    assert (queue.puts, queue.depth_max, queue.full) == (3, 2, 1)
@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+from box import Box
+from treasurechest.engine.manifest import Manifest
+from treasurechest.engine.plan import plan_items
+from treasurechest.engine.render import import_items
+
+POSTS = [
+    {
+        "timestamp": 1300000000 + i * 86400 * 20,
+        "data": [{"post": f"Post number {i}"}],
+        "attachments": [{"data": [{"media": {"uri": f"photos/{i}.jpg"}}]}],
+    }
+    for i in range(6)
+]
+
+
+def test_plan_does_not_touch_the_site(tmp_path):
+    (tmp_path / "fb" / "photos").mkdir(parents=True)
+    for i in range(5):  # the last photo is missing
+        (tmp_path / "fb" / "photos" / f"{i}.jpg").write_bytes(b"x" * 100)
+    site = tmp_path / "site"
+    (site / "content/posts/janedoe/2011/03").mkdir(parents=True)
+    (site / "content/posts/janedoe/2011/03/fb-1-post-number-0.md").write_text("mine")
+    config = Box(
+        author="Jane Doe", site_dir=str(site), facebook_export_dir=str(tmp_path / "fb")
+    )
+    before = sorted(site.rglob("*"))
+
+    report = plan_items(
+        config, "facebook_post", enumerate(POSTS, 1), Manifest(str(site))
+    ).report()
+    assert sorted(site.rglob("*")) == before
+    assert report["markdown_files"] == 6
+    assert report["files_per_month"] == {
+        "2011-03": 1,
+        "2011-04": 2,
+        "2011-05": 1,
+        "2011-06": 2,
+    }
+    assert report["media_files"] == 6
+    assert report["bytes_to_copy"] == report["media_bytes"] == 500
+    assert report["missing_media"] == [str(tmp_path / "fb/photos/5.jpg")]
+    assert [p.rsplit("/", 1)[1] for p in report["overwrites"]] == [
+        "fb-1-post-number-0.md"
+    ]
+
+    (tmp_path / "fb" / "photos" / "5.jpg").write_bytes(b"x" * 100)
+    import_items(config, "facebook_post", enumerate(POSTS, 1), Manifest(str(site)))
+    manifest = Manifest(str(site))
+    report = plan_items(config, "facebook_post", enumerate(POSTS, 1), manifest).report()
+    assert report["bytes_to_copy"] == 0
+
+
+def test_plan_claims_files_as_the_import_does(tmp_path):
+    # titles repeat, so posts added in front want the names of older posts
+    posts = [
+        {"timestamp": 1300000000 + i * 60, "data": [{"post": f"Post {i % 2}"}]}
+        for i in range(6)
+    ]
+    config = Box(author="Jane Doe", site_dir=str(tmp_path))
+    manifest = Manifest(str(tmp_path))
+    import_items(config, "facebook_post", enumerate(posts[2:], 1), manifest)
+    plan = plan_items(config, "facebook_post", enumerate(posts, 1), manifest)
+    report = plan.report()
+    assert report["items"] == {"imported": 2, "skipped": 0, "unchanged": 4}
+    assert report["collisions"] == report["overwrites"] == []
+    assert len(manifest.entries) == len(manifest.updated) == len(manifest.seen) == 4
+
+    before = set(map(str, tmp_path.rglob("*.md")))
+    import_items(config, "facebook_post", enumerate(posts, 1), manifest)
+    written = set(map(str, tmp_path.rglob("*.md"))) - before
+    assert sorted(plan.paths) == sorted(written)
+    assert [p.rsplit("/", 1)[1] for p in sorted(written)] == [
+        "fb-2-post-0.md",
+        "fb-3-post-1.md",
+    ]
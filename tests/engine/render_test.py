@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+import json
+import os
+
+from box import Box
+from pytest import mark
+from treasurechest.engine.engine import Engine
+from treasurechest.engine.manifest import Manifest
+from treasurechest.engine.render import RenderPool, import_items, render_item
+
+POSTS = [
+    {"timestamp": 1300000000 + i * 86400, "data": [{"post": f"Post number {i}"}]}
+    for i in range(10)
+] + [{"timestamp": 1300000000, "title": "no data, skipped"}]
+
+
+def test_render_pool_matches_serial_render(tmp_path):
+    config = Box(author="Jane Doe", site_dir=str(tmp_path))
+    manifest = Manifest(str(tmp_path))
+    items = list(enumerate(POSTS, 1))
+    serial = [render_item(config, "facebook_post", n, p, manifest) for n, p in items]
+    with RenderPool(config, manifest, workers=2, chunk_size=3) as pool:
+        pooled = list(pool.render("facebook_post", items))
+    assert pooled == serial
+    assert [r.status for r in serial].count("skipped") == 1
+    assert serial[0].path.endswith("fb-1-post-number-0.md")
+    assert not list(tmp_path.iterdir())
+
+
+@mark.parametrize("media_mode", ["copy", "hardlink", "symlink"])
+def test_import_items_creates_each_directory_once(tmp_path, monkeypatch, media_mode):
+    export = tmp_path / "fb"
+    for folder in ("a", "b"):
+        (export / "photos" / folder).mkdir(parents=True)
+    posts = []
+    for i in range(40):
+        uri = f"photos/{'ab'[i % 2]}/{i}.jpg"
+        (export / uri).write_bytes(b"x" * i)
+        posts.append(
+            {
+                "timestamp": 1300000000 + (i % 4) * 40 * 86400,
+                "data": [{"post": f"Post number {i}"}],
+                "attachments": [{"data": [{"media": {"uri": uri}}]}],
+            }
+        )
+    site = tmp_path / "site"
+    site.mkdir()
+    config = Box(
+        author="Jane Doe",
+        site_dir=str(site),
+        facebook_export_dir=str(export),
+        media_mode=media_mode,
+    )
+    calls = []
+    mkdir = os.mkdir
+    monkeypatch.setattr(
+        os, "mkdir", lambda path, *args: calls.append(path) or mkdir(path, *args)
+    )
+    items = enumerate(posts, 1)
+    counts = import_items(config, "facebook_post", items, Manifest(str(site)))
+    assert counts["imported"] == 40
+    if media_mode != "copy":
+        assert counts[f"media_{media_mode}ed"] == 40
+    # a single mkdir for each directory of the site, none for existing ones
+    assert sorted(calls) == sorted(str(p) for p in site.rglob("*") if p.is_dir())
+    assert len(list(site.glob("content/posts/janedoe/*/*/*.md"))) == 40
+    assert len(list(site.glob("static/janedoe/facebook/photos/*/*.jpg"))) == 40
+
+
+def test_prepended_posts_do_not_overwrite_imported_ones(tmp_path):
+    export = tmp_path / "fb" / "posts"
+    export.mkdir(parents=True)
+    site = tmp_path / "site"
+    site.mkdir()
+    config = Box(
+        author="Jane Doe", site_dir=str(site), facebook_export_dir=str(export.parent)
+    )
+    # titles repeat, so a post numbered like an older one gets its file name
+    posts = [
+        {"timestamp": 1300000000 + i * 60, "data": [{"post": f"Post {i % 2}"}]}
+        for i in range(30)
+    ]
+    (export / "your_posts_1.json").write_text(json.dumps(posts[10:]))
+    assert Engine(config).import_facebook_posts()["imported"] == 20
+    (export / "your_posts_1.json").write_text(json.dumps(posts))
+    counts = Engine(config).import_facebook_posts()
+    assert (counts["imported"], counts["unchanged"]) == (10, 20)
+    files = list(site.rglob("fb-*.md"))
+    assert len(files) == len(posts)
+    manifest = Manifest(str(site)).load()
+    assert len({entry["file"] for entry in manifest.entries.values()}) == len(posts)
+    assert all(manifest.is_current(key) for key in manifest.entries)
+
+    # a third run changes nothing
+    counts = Engine(config).import_facebook_posts()
+    assert (counts["unchanged"], counts["removed"]) == (30, 0)
+    assert sorted(site.rglob("fb-*.md")) == sorted(files)
@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+from box import Box
+from treasurechest.engine.context import import_context
+from treasurechest.engine.store import MediaStore
+from treasurechest.source.imports import FacebookPost, InstagramPost, PostRenderer
+
+
+def test_media_store_deduplicates_across_sources(tmp_path):
+    for export, uri in [("fb", "posts/media/a.jpg"), ("ig", "media/posts/b.JPG")]:
+        path = tmp_path / export / uri
+        path.parent.mkdir(parents=True)
+        path.write_bytes(b"same photo")
+    (tmp_path / "site").mkdir()
+    config = Box(
+        author="Jane Doe",
+        site_dir=str(tmp_path / "site"),
+        facebook_export_dir=str(tmp_path / "fb"),
+        instagram_export_dir=str(tmp_path / "ig"),
+    )
+    store = MediaStore(config.site_dir)
+    renderer = PostRenderer(import_context(config), store=store)
+    fb_url = FacebookPost(renderer).add_media(
+        config.facebook_export_dir, "facebook", "posts/media/a.jpg"
+    )
+    ig_url = InstagramPost(renderer).add_media(
+        config.instagram_export_dir, "instagram", "media/posts/b.JPG"
+    )
+    assert fb_url == ig_url
+    assert fb_url.startswith("/janedoe/media/") and fb_url.endswith(".jpg")
+    assert store.stats == {"media_hashed": 2, "media_deduplicated": 1}
+    store.save()
+
+    store = MediaStore(config.site_dir).load()
+    assert store.relative_path(str(tmp_path / "fb" / "posts/media/a.jpg"))
+    assert store.stats == {}
@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+import os
+
+import pytest
+from box import Box
+from treasurechest.engine.writer import PostWriter, post_writer
+
+
+@pytest.mark.parametrize("durability,syncs", [("none", 0), ("batch", 5), ("end", 5)])
+def test_post_writer_syncs_by_durability(tmp_path, monkeypatch, durability, syncs):
+    synced = []
+    fsync = os.fsync
+    monkeypatch.setattr(os, "fsync", lambda fd: synced.append(fd) or fsync(fd))
+    (tmp_path / "a").mkdir()
+    (tmp_path / "b").mkdir()
+    (tmp_path / "a" / "1.md").write_text("old")
+    writer = PostWriter(durability)
+    for name in ("a/1.md", "a/2.md", "b/3.md"):
+        writer.add(str(tmp_path / name), f"post {name}")
+    assert (tmp_path / "a" / "1.md").read_text() == "old"
+    writer.flush()
+    writer.close()
+    assert (tmp_path / "a" / "1.md").read_text() == "post a/1.md"
+    assert sorted(p.name for p in tmp_path.rglob("*.md")) == ["1.md", "2.md", "3.md"]
+    assert not list(tmp_path.rglob("*.tmp"))
+    # three posts and their two directories
+    assert len(synced) == syncs
+
+
+def test_post_writer_rejects_unknown_durability():
+    with pytest.raises(ValueError):
+        post_writer(Box(post_durability="always"))
+
+
+def test_batch_durability_syncs_the_batch_before_renaming(tmp_path, monkeypatch):
+    events = []
+    fsync, replace = os.fsync, os.replace
+    monkeypatch.setattr(os, "fsync", lambda fd: events.append("sync") or fsync(fd))
+    monkeypatch.setattr(
+        os, "replace", lambda *args: events.append("rename") or replace(*args)
+    )
+    writer = PostWriter("batch")
+    for n in range(3):
+        writer.add(str(tmp_path / f"{n}.md"), f"post {n}")
+    writer.flush()
+    # the three posts, their renames, then their directory
+    assert events == ["sync"] * 3 + ["rename"] * 3 + ["sync"]
@@ -0,0 +1,27 @@
+import io
+import json
+
+from pytest import mark, raises
+from treasurechest.utils.json_stream import iter_json_array
+
+POSTS = [
+    {"timestamp": 1, "data": [{"post": "cafÃ©"}]},
+    {"timestamp": 2, "title": "x", "tags": [{"name": "JosÃ©"}]},
+    12345,
+    1.5e10,
+]
+
+
+@mark.parametrize("chunk_size", [1, 3, 64, 1024])
+def test_iter_json_array(chunk_size: int):
+    raw = json.dumps(POSTS, indent=2).encode("utf-8")
+    read = []
+    items = list(iter_json_array(io.BytesIO(raw), chunk_size, read.append))
+    assert items == POSTS
+    assert sum(read) == len(raw)
+
+
+@mark.parametrize("raw", [b"", b"{}", b"[1,", b"[1 2]"])
+def test_iter_json_array_invalid(raw: bytes):
+    with raises(ValueError):
+        list(iter_json_array(io.BytesIO(raw)))
@@ -0,0 +1,38 @@
+import ftfy
+from pytest import mark, raises
+from treasurechest.utils.text import fix_text_fast, text_fixer
+
+
+def mojibake(text: str) -> str:
+    # how the exports write UTF-8 text
+    return text.encode("utf-8").decode("latin-1")
+
+
+CORPUS = [
+    "plain ascii status update",
+    mojibake("Cumpleaños de José en la montaña"),
+    mojibake("Qué día 😍🎉 #verano @maría"),
+    mojibake("“Curly quotes” and ‘single’ ones"),
+    mojibake("ﬁnal ﬂight"),
+    mojibake("ｆｕｌｌｗｉｄｔｈ text"),
+    mojibake("Línea uno\r\nLínea dos\n\nañadida"),
+    mojibake("first line\nsecond línea"),
+    mojibake("Fish &amp; chips en Cádiz"),
+    mojibake(mojibake("doble codificación")),
+    "Â¥ 100",
+    "café already fixed",
+    "niño\x07 with control",
+    "",
+]
+
+
+@mark.parametrize("text", CORPUS)
+def test_fix_text_fast_matches_ftfy(text: str):
+    assert fix_text_fast(text) == ftfy.fix_text(text)
+
+
+def test_text_fixer():
+    assert text_fixer("fast") is fix_text_fast
+    assert text_fixer("ftfy") is ftfy.fix_text
+    with raises(ValueError):
+        text_fixer("unknown")
@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+from treasurechest.utils.timing import (
+    disable_profiling,
+    enable_profiling,
+    get_profiler,
+    profile_iter,
+    span,
+    timing,
+)
+
+
+@timing
+def stage(items):
+    with span("render", items=len(items)) as s:
+        with span("fix_text"):
+            pass
+        s.add(bytes=10)
+    return list(profile_iter(items, "decode_json"))
+
+
+def test_spans_disabled():
+    assert get_profiler() is None
+    with span("render", items=1) as s:
+        s.add(bytes=1)
+    assert stage([1, 2]) == [1, 2]
+
+
+def test_spans_nest_and_count():
+    profiler = enable_profiling()
+    try:
+        stage([1, 2, 3])
+        stage([4])
+        profiler.merge({"render": {"calls": 2, "seconds": 1.0, "items": 5}})
+    finally:
+        disable_profiling()
+    spans = profiler.report()["spans"]
+    assert list(spans) == [
+        "render",
+        "stage",
+        "stage/decode_json",
+        "stage/render",
+        "stage/render/fix_text",
+    ]
+    assert spans["stage"]["calls"] == 2
+    assert spans["stage/render"]["items"] == 4
+    assert spans["stage/render"]["bytes"] == 20
+    assert spans["stage/decode_json"]["calls"] == 4
+    assert spans["stage/decode_json"]["items"] == 4
+    assert spans["render"]["items"] == 5
+
+
+def test_cprofile_stage():
+    profiler = enable_profiling(cprofile_stage="render")
+    try:
+        stage([1])
+    finally:
+        disable_profiling()
+    report = profiler.report()
+    assert report["cprofile"]["stage"] == "render"
+    assert any("(span)" in line for line in report["cprofile"]["stats"])
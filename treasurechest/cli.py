@@ -1,8 +1,109 @@
 # -*- coding: utf-8 -*-
-from logging.config import dictConfig
+"""
+Command line interface. The engine and its dependencies (ftfy, tqdm, yaml,
+box, ...) are imported by the commands that run, so that ``--help`` and
+``--version`` only load click.
+"""
+
+import json
+import logging
+import sys
+from contextlib import contextmanager
 import click
-from treasurechest.utils.config import Config
-from treasurechest.engine.engine import Engine
+
+
+def profile_options(command):
+    """
+    Options of the import commands that profile the stages of the import
+    """
+    options = [
+        click.option("--profile", is_flag=True, help="Log the time of each stage"),
+        click.option("--profile-out", default=None, help="Write the profile as JSON"),
+        click.option("--cprofile", default=None, help="Stage to run under cProfile"),
+        click.option(
+            "--tracemalloc", default=None, help="Stage to trace allocations of"
+        ),
+    ]
+    for option in reversed(options):
+        command = option(command)
+    return command
+
+
+def start_profiling(profile: bool, profile_out: str, cprofile: str, tracemalloc: str):
+    if profile or profile_out or cprofile or tracemalloc:
+        from treasurechest.utils.timing import enable_profiling
+
+        return enable_profiling(cprofile, tracemalloc)
+    return None
+
+
+def finish_profiling(profiler, profile_out: str):
+    if profiler:
+        from treasurechest.utils.timing import disable_profiling
+
+        profiler.log_report()
+        if profile_out:
+            profiler.save(profile_out)
+        disable_profiling()
+
+
+def plan_options(command):
+    """
+    Options of the import commands that plan the import without running it
+    """
+    command = click.option(
+        "--plan-out", default=None, help="Write the plan as JSON, implies --plan"
+    )(command)
+    return click.option(
+        "--plan", is_flag=True, help="Report what the import would write, only"
+    )(command)
+
+
+def resume_option(command):
+    """
+    Option of the import commands that continues an interrupted import
+    """
+    return click.option(
+        "--resume",
+        is_flag=True,
+        help="Continue an interrupted import where it stopped",
+    )(command)
+
+
+def read_config(path: str):
+    """
+    Read the config and set up logging from it
+    """
+    from logging.config import dictConfig
+    from treasurechest.utils.config import Config
+
+    # init the config from config/
+    config = Config(path).read()
+    # init logging package
+    dictConfig(config.logging)
+    return config
+
+
+@contextmanager
+def interruptible():
+    """
+    Stop the import run in the block cleanly on SIGINT or SIGTERM, and exit
+    with status 130 once its progress is saved
+    """
+    from treasurechest.engine.journal import ImportInterrupted, stop_on_signals
+
+    try:
+        with stop_on_signals():
+            yield
+    except ImportInterrupted as ex:
+        logging.getLogger(__name__).warning(str(ex))
+        sys.exit(130)
+
+
+def save_plan(reports: dict, plan_out: str):
+    if plan_out:
+        with open(plan_out, "w") as f:
+            json.dump(reports, f, indent=2)
 
 
 @click.group()
@@ -14,30 +115,90 @@ def main():
 @main.command()
 @click.option("--imports", default="posts albums")
 @click.option("--config", default="config/main.yml")
-def import_from_facebook(config: str, imports: str):
+@click.option("--workers", default=1, help="Processes used to render posts")
+@resume_option
+@plan_options
+@profile_options
+def import_from_facebook(
+    config: str,
+    imports: str,
+    workers: int,
+    resume: bool,
+    plan: bool,
+    plan_out: str,
+    profile: bool,
+    profile_out: str,
+    cprofile: str,
+    tracemalloc: str,
+):
     """Some help text for full pipeline run goes here"""
-    # init the config from config/
-    config = Config(config).read()
+    from treasurechest.engine.engine import Engine
+
+    config = read_config(config)
     imports = imports.split()
-    # init logging package
-    dictConfig(config.logging)
-    engine = Engine(config)
-    if "posts" in imports:
-        engine.import_facebook_posts()
-    if "albums" in imports:
-        engine.import_facebook_albums()
+    engine = Engine(config, workers, plan or bool(plan_out), resume)
+    profiler = start_profiling(profile, profile_out, cprofile, tracemalloc)
+    reports = {}
+    try:
+        with interruptible():
+            if "posts" in imports:
+                reports["facebook_posts"] = engine.import_facebook_posts()
+            if "albums" in imports:
+                reports["facebook_albums"] = engine.import_facebook_albums()
+    finally:
+        finish_profiling(profiler, profile_out)
+    save_plan(reports, plan_out)
 
 
 @main.command()
 @click.option("--config", default="config/main.yml")
-def import_from_instagram(config: str):
+@click.option("--workers", default=1, help="Processes used to render posts")
+@resume_option
+@plan_options
+@profile_options
+def import_from_instagram(
+    config: str,
+    workers: int,
+    resume: bool,
+    plan: bool,
+    plan_out: str,
+    profile: bool,
+    profile_out: str,
+    cprofile: str,
+    tracemalloc: str,
+):
     """Some help text for side analysis goes here"""
-    # init the config from config/
-    config = Config(config).read()
-    # init logging package
-    dictConfig(config.logging)
-    engine = Engine(config)
-    engine.import_instagram_posts()
+    from treasurechest.engine.engine import Engine
+
+    config = read_config(config)
+    engine = Engine(config, workers, plan or bool(plan_out), resume)
+    profiler = start_profiling(profile, profile_out, cprofile, tracemalloc)
+    try:
+        with interruptible():
+            report = engine.import_instagram_posts()
+    finally:
+        finish_profiling(profiler, profile_out)
+    save_plan({"instagram_posts": report}, plan_out)
+
+
+@main.command()
+@click.option("--config", default="config/main.yml")
+@click.option(
+    "--workers",
+    default=None,
+    type=int,
+    help="Processes importing accounts at once, defaults to account_workers",
+)
+@resume_option
+def import_all(config: str, workers: int, resume: bool):
+    """Import the exports of every account listed in the config"""
+    from treasurechest.engine.accounts import import_accounts
+
+    config = read_config(config)
+    with interruptible():
+        results = import_accounts(config, workers, resume)
+    if any(result.status == "failed" for result in results):
+        sys.exit(1)
 
 
 if __name__ == "__main__":
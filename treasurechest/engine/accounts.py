@@ -0,0 +1,258 @@
+# -*- coding: utf-8 -*-
+"""
+Import of the exports of several accounts into one site, the accounts of
+different authors running concurrently
+"""
+
+import logging
+import logging.config
+import os
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import List, NamedTuple, Optional, Tuple
+
+import tqdm
+from box import Box
+from treasurechest.engine.context import SOURCES, author_slug
+from treasurechest.engine.engine import Engine
+from treasurechest.engine.journal import ImportInterrupted, install_stop_handlers
+from treasurechest.engine.manifest import MANIFEST_DIR
+
+ACCOUNTS_DIR = "accounts"
+SOURCE_IMPORTS = {
+    "facebook": ("posts", "albums"),
+    "instagram": ("posts",),
+}
+ENGINE_IMPORTS = {
+    ("facebook", "posts"): Engine.import_facebook_posts,
+    ("facebook", "albums"): Engine.import_facebook_albums,
+    ("instagram", "posts"): Engine.import_instagram_posts,
+}
+
+
+class Account(NamedTuple):
+    author: str
+    source: str  # facebook or instagram
+    export_dir: str
+    imports: Tuple[str, ...]  # posts and/or albums
+
+    @property
+    def label(self) -> str:
+        return f"{self.author} ({self.source})"
+
+
+class AccountResult(NamedTuple):
+    account: Account
+    counts: Counter
+    status: str  # done, failed or interrupted
+    error: Optional[str] = None
+
+
+def load_accounts(config: Box) -> List[Account]:
+    """
+    Accounts listed in ``accounts``, each with an author, a source and an
+    export directory, and optionally the ``imports`` to run.
+
+    Raises:
+        ValueError: If there are no accounts or one of them is incomplete.
+    """
+    accounts = []
+    for n, entry in enumerate(config.get("accounts") or [], 1):
+        missing = [
+            key for key in ("author", "source", "export_dir") if not entry.get(key)
+        ]
+        if missing:
+            raise ValueError(f"Account {n} has no {', '.join(missing)}")
+        source = entry.source
+        if source not in SOURCE_IMPORTS:
+            raise ValueError(
+                f"Unknown source {source!r} of account {n}, "
+                f"expected one of {tuple(SOURCE_IMPORTS)}"
+            )
+        imports = entry.get("imports")
+        imports = tuple(imports.split()) if imports else SOURCE_IMPORTS[source]
+        unknown = set(imports) - set(SOURCE_IMPORTS[source])
+        if unknown:
+            raise ValueError(
+                f"Unknown imports {sorted(unknown)} of account {n}, "
+                f"expected some of {SOURCE_IMPORTS[source]}"
+            )
+        accounts.append(Account(entry.author, source, entry.export_dir, imports))
+    if not accounts:
+        raise ValueError("No accounts listed in the config")
+    return accounts
+
+
+def group_accounts(accounts: List[Account]) -> List[List[Account]]:
+    """
+    Group the accounts by the directories of their author in the site
+    (``static/<author>``, ``content/posts/<author>``), so that accounts
+    sharing them are imported one after the other, by the same process.
+
+    Raises:
+        ValueError: If two accounts of the same author have the same source,
+            as they would overwrite each other's posts and media.
+    """
+    groups = {}
+    for account in accounts:
+        slug = author_slug(account.author)
+        group = groups.setdefault(slug, [])
+        for other in group:
+            if other.source == account.source:
+                raise ValueError(
+                    f"Accounts {other.label} and {account.label} would both "
+                    f"write to static/{slug}/{account.source}"
+                )
+        group.append(account)
+    return list(groups.values())
+
+
+def account_config(config: Box, account: Account) -> Box:
+    """
+    Config of the import of one account: its author and export, and a state
+    directory of its author's own, so each author's manifest only lists
+    the posts of that author
+    """
+    cfg = Box(config)
+    cfg.author = account.author
+    for source in SOURCES:
+        cfg[f"{source}_export_dir"] = (
+            account.export_dir if source == account.source else None
+        )
+    cfg.state_dir = os.path.join(
+        config.site_dir, MANIFEST_DIR, ACCOUNTS_DIR, author_slug(account.author)
+    )
+    return cfg
+
+
+class AccountLogFilter(logging.Filter):
+    """
+    Prefixes the log messages of a worker with the account it is importing
+    """
+
+    label = ""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if self.label and not getattr(record, "account", None):
+            record.account = self.label
+            record.msg = f"[{self.label}] {record.msg}"
+        return True
+
+
+_log_filter = AccountLogFilter()
+
+
+def init_account_worker(logging_config: Optional[dict] = None):
+    """
+    Initializer of the processes importing accounts. Processes that did not
+    inherit the handlers of the main process, as with the ``spawn`` start
+    method, set up logging from ``logging_config`` first.
+    """
+    install_stop_handlers()
+    root = logging.getLogger()
+    if logging_config and not root.handlers:
+        logging.config.dictConfig(logging_config)
+    for handler in root.handlers:
+        handler.addFilter(_log_filter)
+
+
+def import_account_group(
+    config: Box, accounts: List[Account], resume: bool = False
+) -> List[AccountResult]:
+    """
+    Import the accounts of one author one after the other. An account that
+    fails does not stop the next one, a signal stops them all.
+    """
+    log = logging.getLogger(__name__)
+    results = []
+    for n, account in enumerate(accounts):
+        _log_filter.label = account.label
+        counts = Counter()
+        try:
+            log.info(
+                f"Importing {', '.join(account.imports)} from {account.export_dir}"
+            )
+            engine = Engine(
+                account_config(config, account), resume=resume, progress=False
+            )
+            for name in account.imports:
+                counts.update(ENGINE_IMPORTS[(account.source, name)](engine))
+        except ImportInterrupted as ex:
+            results.append(AccountResult(account, counts, "interrupted", str(ex)))
+            results.extend(
+                AccountResult(other, Counter(), "interrupted")
+                for other in accounts[n + 1 :]
+            )
+            break
+        except Exception as ex:
+            log.exception(f"Import of {account.label} failed")
+            results.append(AccountResult(account, counts, "failed", str(ex)))
+        else:
+            results.append(AccountResult(account, counts, "done"))
+        finally:
+            _log_filter.label = ""
+    return results
+
+
+def import_accounts(
+    config: Box, workers: int = None, resume: bool = False
+) -> List[AccountResult]:
+    """
+    Import every account listed in the config into the site, the accounts of
+    different authors concurrently on ``account_workers`` processes, and log
+    the summary of each account and of all of them.
+
+    Raises:
+        ImportInterrupted: If a signal stopped the import, once every
+            account stopped.
+    """
+    log = logging.getLogger(__name__)
+    accounts = load_accounts(config)
+    groups = group_accounts(accounts)
+    workers = min(
+        len(groups), workers or config.get("account_workers") or os.cpu_count() or 1
+    )
+    log.info(
+        f"Importing {len(accounts)} accounts of {len(groups)} authors "
+        f"with {workers} processes"
+    )
+    results = []
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=init_account_worker,
+        initargs=(config.get("logging"),),
+    ) as pool, tqdm.tqdm(total=len(accounts), unit="account") as bar:
+        futures = [
+            pool.submit(import_account_group, config, group, resume) for group in groups
+        ]
+        for future in as_completed(futures):
+            for result in future.result():
+                log_account(result)
+                bar.update()
+                results.append(result)
+    results.sort(key=lambda result: accounts.index(result.account))
+    total = Counter()
+    for result in results:
+        total.update(result.counts)
+    summary = ", ".join(f"{k}: {v}" for k, v in total.items())
+    statuses = Counter(result.status for result in results)
+    log.info(
+        f"Import summary for all accounts - "
+        f"{', '.join(f'{k}: {v}' for k, v in statuses.items())}; {summary}"
+    )
+    if statuses["interrupted"]:
+        raise ImportInterrupted(
+            "Import interrupted, run it again with --resume to continue"
+        )
+    return results
+
+
+def log_account(result: AccountResult):
+    log = logging.getLogger(__name__)
+    summary = ", ".join(f"{k}: {v}" for k, v in result.counts.items())
+    if result.status == "done":
+        log.info(f"Imported {result.account.label} - {summary}")
+    elif result.status == "failed":
+        log.error(f"Could not import {result.account.label}: {result.error}")
+    else:
+        log.warning(f"Import of {result.account.label} was interrupted")
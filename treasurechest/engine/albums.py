@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+"""
+Discovery and loading of the albums of a Facebook export, one JSON file per
+album under ``posts/album``
+"""
+
+import json
+import logging
+import os
+import re
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator, List, Optional, Tuple
+
+from box import Box
+from treasurechest.engine.archive import open_source, source_listfiles
+from treasurechest.utils.timing import continue_spans, current_spans, span
+
+ALBUM_FILE = re.compile(r"^([0-9]+)\.json$")
+ALBUM_WORKERS = 8
+
+
+def discover_albums(album_dir: str) -> List[str]:
+    """
+    Paths of the album files in a directory, in the order of their numbers,
+    so that ``10.json`` comes after ``9.json``
+    """
+    albums = []
+    for name in source_listfiles(album_dir):
+        match = ALBUM_FILE.match(name)
+        if match:
+            albums.append((int(match.group(1)), name))
+    return [os.path.join(album_dir, name) for _, name in sorted(albums)]
+
+
+def load_album(path: str) -> dict:
+    """
+    Read the JSON file of an album.
+
+    Raises:
+        ValueError: If the file is not valid JSON or not an album with photos.
+    """
+    with span("decode_json", items=1), open_source(path) as f:
+        album = json.load(f)
+    if not isinstance(album, dict) or "name" not in album:
+        raise ValueError("not an album")
+    photos = album.get("photos")
+    if not isinstance(photos, list) or not all(
+        isinstance(photo, dict) and "uri" in photo and "creation_timestamp" in photo
+        for photo in photos
+    ):
+        raise ValueError("album photos have no uri or creation_timestamp")
+    return album
+
+
+class AlbumLoader:
+    """
+    Reads the files of albums on ``workers`` threads, a few albums ahead of
+    the import, and yields the albums numbered in the order of their files.
+
+    An album that cannot be read is left out and added to ``failed`` with
+    the reason, the albums after it keeping their numbers, so that one bad
+    file neither stops the import nor renames the posts of the other albums.
+    """
+
+    def __init__(self, paths: List[str], workers: int = ALBUM_WORKERS):
+        self.paths = paths
+        self.workers = max(1, workers)
+        self.failed = []  # type: List[Tuple[str, str]]
+
+    def __len__(self) -> int:
+        return len(self.paths)
+
+    def __iter__(self) -> Iterator[Tuple[int, dict]]:
+        numbered = enumerate(self.paths, 1)
+        if self.workers == 1:
+            for n, path in numbered:
+                album = self._load(path, lambda: load_album(path))
+                if album is not None:
+                    yield n, album
+            return
+        with ThreadPoolExecutor(
+            max_workers=self.workers,
+            thread_name_prefix="album",
+            initializer=continue_spans,
+            initargs=(current_spans(),),
+        ) as executor:
+            pending = deque()
+            try:
+                for n, path in numbered:
+                    pending.append((n, path, executor.submit(load_album, path)))
+                    if len(pending) >= self.workers * 4:
+                        yield from self._next(pending)
+                while pending:
+                    yield from self._next(pending)
+            finally:
+                for _, _, future in pending:
+                    future.cancel()
+
+    def _next(self, pending: deque) -> Iterator[Tuple[int, dict]]:
+        n, path, future = pending.popleft()
+        album = self._load(path, future.result)
+        if album is not None:
+            yield n, album
+
+    def _load(self, path: str, load) -> Optional[dict]:
+        try:
+            return load()
+        except (OSError, ValueError) as ex:
+            logging.getLogger(__name__).error(f"Could not read album {path}: {ex}")
+            self.failed.append((path, str(ex)))
+            return None
+
+
+def album_loader(config: Box, paths: List[str]) -> AlbumLoader:
+    """
+    Create the loader of the albums of an import from ``album_workers``
+    """
+    return AlbumLoader(paths, config.get("album_workers") or ALBUM_WORKERS)
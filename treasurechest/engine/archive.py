@@ -0,0 +1,218 @@
+# -*- coding: utf-8 -*-
+"""
+Exports read straight from the ZIP archives Facebook and Instagram deliver.
+
+When ``facebook_export_dir`` or ``instagram_export_dir`` is the path of a
+``.zip`` file, or a list of the archives an export was split into, the paths
+of the files in the export are built under the path of the (first) archive,
+e.g. ``facebook.zip/posts/your_posts_1.json``. The helpers in this module
+open, stat and list such paths from the archives and fall back to the file
+system for every other path, so the rest of the engine does not need to know
+where an export comes from.
+"""
+
+import os
+import threading
+import time
+import zipfile
+from multiprocessing.util import Finalize
+from typing import Dict, List, NamedTuple, Optional, Tuple, Union  # noqa: F401
+
+from box import Box
+
+ARCHIVE_EXT = ".zip"
+EXPORT_DIRS = ("facebook_export_dir", "instagram_export_dir")
+
+
+class MemberStat(NamedTuple):
+    st_size: int
+    st_mtime_ns: int
+    st_atime_ns: int
+
+
+class ExportArchive:
+    """
+    One export spread over one or more ZIP archives.
+
+    Archives are opened lazily in each process that reads them, as the open
+    files cannot be shared with forked or spawned workers, and reopened
+    when read again after ``close``. When a member is in several archives
+    the first one wins.
+    """
+
+    def __init__(self, paths: List[str]):
+        self.paths = list(paths)
+        self.root = self.paths[0]
+        self._pid = None
+        self._lock = threading.Lock()
+        self._files = []  # type: List[zipfile.ZipFile]
+        self._members = {}  # type: Dict[str, Tuple[zipfile.ZipFile, zipfile.ZipInfo]]
+        self._dirs = {}  # type: Dict[str, set]
+
+    def __getstate__(self):
+        return {"paths": self.paths}
+
+    def __setstate__(self, state):
+        self.__init__(state["paths"])
+
+    def _index(self):
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            # a forked worker closes its copies of the files of its parent
+            self._close()
+            self._members, self._dirs = {}, {"": set()}
+            for path in self.paths:
+                archive = zipfile.ZipFile(path)
+                self._files.append(archive)
+                for info in archive.infolist():
+                    name = info.filename.rstrip("/")
+                    parts = name.split("/")
+                    for i in range(len(parts)):
+                        parent = "/".join(parts[:i])
+                        self._dirs.setdefault(parent, set()).add(parts[i])
+                    if not info.is_dir():
+                        self._members.setdefault(name, (archive, info))
+            self._pid = os.getpid()
+
+    def close(self):
+        """
+        Close the archive files opened by this process
+        """
+        with self._lock:
+            self._close()
+            self._members, self._dirs = {}, {}
+            self._pid = None
+
+    def _close(self):
+        for archive in self._files:
+            archive.close()
+        self._files = []
+
+    def name(self, path: str) -> str:
+        """
+        Name of the member a path under the root of the archive refers to
+        """
+        name = os.path.relpath(path, self.root)
+        return "" if name == "." else name.replace(os.sep, "/")
+
+    def member(self, path: str) -> Tuple[zipfile.ZipFile, zipfile.ZipInfo]:
+        self._index()
+        try:
+            return self._members[self.name(path)]
+        except KeyError:
+            raise FileNotFoundError(f"No file {path} in {self.paths}") from None
+
+    def open(self, path: str):
+        archive, info = self.member(path)
+        return archive.open(info)
+
+    def stat(self, path: str) -> MemberStat:
+        _, info = self.member(path)
+        # ZIP timestamps are local time with a 2 second resolution
+        mtime_ns = int(time.mktime(info.date_time + (0, 0, -1))) * 10**9
+        return MemberStat(info.file_size, mtime_ns, mtime_ns)
+
+    def isdir(self, path: str) -> bool:
+        self._index()
+        return self.name(path) in self._dirs
+
+    def listdir(self, path: str) -> List[str]:
+        self._index()
+        return sorted(self._dirs.get(self.name(path), ()))
+
+    def listfiles(self, path: str) -> List[str]:
+        self._index()
+        name = self.name(path)
+        prefix = name + "/" if name else ""
+        return [n for n in self.listdir(path) if prefix + n in self._members]
+
+
+_archives = {}  # type: Dict[str, ExportArchive]
+_finalizer = None
+
+
+def is_archive(export: Union[str, List[str], None]) -> bool:
+    if isinstance(export, str):
+        return export.lower().endswith(ARCHIVE_EXT)
+    return bool(export) and all(str(p).lower().endswith(ARCHIVE_EXT) for p in export)
+
+
+def export_root(export: Union[str, List[str]]) -> str:
+    """
+    Path the files of an export are found under, for a directory or archives
+    """
+    if isinstance(export, str):
+        return export
+    return str(export[0])
+
+
+def register_archives(config: Box):
+    """
+    Make the archives of the exports in the config readable in this process
+    """
+    for key in EXPORT_DIRS:
+        export = config.get(key)
+        if export and is_archive(export):
+            paths = [export] if isinstance(export, str) else [str(p) for p in export]
+            if paths[0] not in _archives:
+                _archives[paths[0]] = ExportArchive(paths)
+    global _finalizer
+    if _archives and _finalizer is None:
+        # unlike atexit handlers, finalizers also run when pool workers exit
+        _finalizer = Finalize(None, close_archives, exitpriority=0)
+
+
+def close_archives():
+    """
+    Close the archive files opened by this process. The archives stay
+    registered and are opened again when read.
+    """
+    for archive in _archives.values():
+        archive.close()
+
+
+def archive_for(path: str) -> Optional[ExportArchive]:
+    """
+    The archive a path is in, or None for a path on the file system
+    """
+    for root, archive in _archives.items():
+        if path == root or path.startswith(root + os.sep):
+            return archive
+    return None
+
+
+def open_source(path: str):
+    """
+    Open a file of an export for reading in binary mode
+    """
+    archive = archive_for(path)
+    return archive.open(path) if archive else open(path, "rb")
+
+
+def stat_source(path: str) -> Union[os.stat_result, MemberStat]:
+    archive = archive_for(path)
+    return archive.stat(path) if archive else os.stat(path)
+
+
+def source_isdir(path: str) -> bool:
+    archive = archive_for(path)
+    return archive.isdir(path) if archive else os.path.isdir(path)
+
+
+def source_listdir(path: str) -> List[str]:
+    archive = archive_for(path)
+    return archive.listdir(path) if archive else os.listdir(path)
+
+
+def source_listfiles(path: str) -> List[str]:
+    """
+    Names of the files in a directory of an export, leaving out directories.
+    Directories are scanned with ``os.scandir``, which tells files apart
+    without a ``stat`` of each entry.
+    """
+    archive = archive_for(path)
+    if archive:
+        return archive.listfiles(path)
+    with os.scandir(path) as entries:
+        return [entry.name for entry in entries if entry.is_file()]
@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+"""
+Settings of an import resolved from the config once per run
+"""
+
+import hashlib
+import json
+import os
+from typing import Dict, Iterable, NamedTuple, Optional, Tuple
+
+from box import Box
+from treasurechest.engine.archive import export_root
+from treasurechest.engine.dates import (
+    DATE_FORMAT,
+    DateColumns,
+    date_of,
+    load_timezone,
+    normalize_dates,
+)
+from treasurechest.engine.derivatives import DerivativeSettings, derivative_settings
+from treasurechest.utils.text import text_fixer
+
+SOURCES = ("facebook", "instagram")
+
+
+class ImportContext(NamedTuple):
+    """
+    Directories, URL prefixes and settings the posts of an import are rendered
+    with, checked and computed from the config before anything is imported.
+
+    It is immutable and small, so it is shared by every post of a run and
+    sent as it is to the processes rendering posts.
+    """
+
+    site_dir: str
+    author: str
+    author_slug: str
+    posts_dir: str  # content/posts/<author>/, where posts go by year and month
+    static_dir: str  # static/<author>, where media files go
+    url_prefix: str  # /<author>/, the URL of the static directory
+    export_dirs: Dict[str, str]  # root of the export of each source
+    text_fixers: Dict[str, str]  # text fixer of each source
+    derivatives: Optional[DerivativeSettings]
+    group_posts: Optional[str]
+    timezone: Optional[str] = None  # time zone of the dates, local time if None
+    date_format: str = DATE_FORMAT
+    settings: Optional[str] = None  # hash of the settings outputs depend on
+
+    def date_of(self, timestamp: int) -> Tuple[str, str]:
+        """
+        Date of a timestamp of the export and the ``<year>/<month>``
+        directory of its posts
+        """
+        return date_of(timestamp, self.timezone, self.date_format)
+
+    def normalize_dates(self, timestamps: Iterable[int]) -> DateColumns:
+        """
+        Dates and post directories of many timestamps converted at once
+        """
+        return normalize_dates(timestamps, self.timezone, self.date_format)
+
+
+def author_slug(author: str) -> str:
+    """
+    Name of the directories of an author in the site
+    """
+    return author.lower().replace(" ", "")
+
+
+def settings_key(config: Box, **resolved) -> str:
+    """
+    Hash of the settings the files of an imported item depend on, from their
+    values ``resolved`` by ``import_context`` and the placement of media, so
+    that changing any of them imports every item again
+    """
+    settings = dict(
+        resolved,
+        media_mode=config.get("media_mode", "copy"),
+        dedupe_media=bool(config.get("dedupe_media", False)),
+        group_posts=config.get("group_posts") or None,
+    )
+    payload = json.dumps(settings, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+def import_context(config: Box) -> ImportContext:
+    """
+    Resolve and check the settings of an import.
+
+    Raises:
+        NotADirectoryError: If the site directory does not exist.
+        ValueError: If a text fixer, the image derivatives or the time zone
+            are misconfigured.
+    """
+    if not os.path.isdir(config.site_dir):
+        raise NotADirectoryError(f"Could not find site directory at {config.site_dir}")
+    slug = author_slug(config.author)
+    export_dirs = {}
+    text_fixers = {}
+    for source in SOURCES:
+        export = config.get(f"{source}_export_dir")
+        export_dirs[source] = export_root(export) if export else ""
+        text_fixers[source] = config.get("text_fixer", {}).get(source, "fast")
+        text_fixer(text_fixers[source])  # raises for unknown fixers
+    timezone = config.get("timezone") or None
+    if timezone:
+        load_timezone(timezone)  # raises for unknown time zones
+    derivatives = derivative_settings(config)
+    settings = settings_key(
+        config, text_fixers=text_fixers, derivatives=derivatives, timezone=timezone
+    )
+    return ImportContext(
+        site_dir=config.site_dir,
+        author=config.author,
+        author_slug=slug,
+        posts_dir=os.path.join(config.site_dir, f"content/posts/{slug}/"),
+        static_dir=os.path.join(config.site_dir, "static", slug),
+        url_prefix=f"/{slug}/",
+        export_dirs=export_dirs,
+        text_fixers=text_fixers,
+        derivatives=derivatives,
+        group_posts=config.get("group_posts"),
+        timezone=timezone,
+        settings=settings,
+    )
@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+"""
+Dates of the posts of an import, in local time or in the time zone set by
+``timezone``
+"""
+
+import time
+from array import array
+from datetime import datetime, tzinfo
+from functools import lru_cache
+from typing import Iterable, List, NamedTuple, Optional, Tuple
+
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+class DateColumns(NamedTuple):
+    """
+    Timestamps converted together, row ``i`` of each column holding the
+    date of the ``i``-th timestamp and the ``<year>/<month>`` directory of
+    its posts
+    """
+
+    timestamps: array
+    dates: List[str]
+    buckets: List[str]
+
+
+@lru_cache(maxsize=None)
+def load_timezone(name: str) -> tzinfo:
+    """
+    Time zone of an IANA name such as ``Europe/Madrid``.
+
+    Raises:
+        ValueError: If the time zone is unknown or Python has no time zone
+            database (before Python 3.9).
+    """
+    try:
+        from zoneinfo import ZoneInfo
+    except ImportError:
+        raise ValueError(f"timezone {name!r} needs Python 3.9 or later") from None
+    try:
+        return ZoneInfo(name)
+    except (KeyError, ValueError):  # ZoneInfoNotFoundError is a KeyError
+        raise ValueError(f"Unknown timezone {name!r}") from None
+
+
+def date_of(
+    timestamp: int, timezone: Optional[str] = None, date_format: str = DATE_FORMAT
+) -> Tuple[str, str]:
+    """
+    Date of a timestamp and the ``<year>/<month>`` directory of its posts,
+    in the time zone given or in local time
+    """
+    if timezone:
+        date = datetime.fromtimestamp(timestamp, load_timezone(timezone))
+        return date.strftime(date_format), f"{date.year:04d}/{date.month:02d}"
+    date = time.localtime(timestamp)
+    return (
+        time.strftime(date_format, date),
+        f"{date.tm_year:04d}/{date.tm_mon:02d}",
+    )
+
+
+def normalize_dates(
+    timestamps: Iterable[int],
+    timezone: Optional[str] = None,
+    date_format: str = DATE_FORMAT,
+) -> DateColumns:
+    """
+    Convert timestamps in a single pass, each distinct timestamp once, as
+    the photos of an album uploaded together share theirs
+    """
+    columns = DateColumns(array("d"), [], [])
+    converted = {}
+    for timestamp in timestamps:
+        row = converted.get(timestamp)
+        if row is None:
+            row = converted[timestamp] = date_of(timestamp, timezone, date_format)
+        columns.timestamps.append(timestamp)
+        columns.dates.append(row[0])
+        columns.buckets.append(row[1])
+    return columns
@@ -0,0 +1,247 @@
+# -*- coding: utf-8 -*-
+"""
+Resized variants of the images copied to the site, cached by their content
+"""
+
+import importlib.util
+import logging
+import os
+import shutil
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from box import Box
+from treasurechest.engine.dirs import DirectoryPlan
+from treasurechest.engine.manifest import MANIFEST_DIR, Manifest, import_state_dir
+from treasurechest.engine.media import CopyIndex, file_checksum
+from treasurechest.utils.timing import span
+
+DERIVATIVES_DIR = "derivatives"
+DERIVATIVES_INDEX_FILE = "derivatives_index.json"
+# formats Pillow writes, by extension; other media such as videos and GIFs
+# are linked as they are
+IMAGE_FORMATS = {".jpg": "JPEG", ".jpeg": "JPEG", ".png": "PNG", ".webp": "WEBP"}
+QUALITY = 82
+
+
+class DerivativeSettings(NamedTuple):
+    variants: Tuple[Tuple[str, int], ...]  # name and largest side in pixels
+    ext: Optional[str]  # extension of the variants, or None to keep the original's
+
+
+def pillow_available() -> bool:
+    """
+    Check whether Pillow is installed without importing it, as only the
+    processes resizing images need it. Without it images are linked as they are.
+    """
+    return importlib.util.find_spec("PIL") is not None
+
+
+def derivative_settings(config: Box) -> Optional[DerivativeSettings]:
+    """
+    Variants to create from ``image_derivatives`` and ``derivative_format``,
+    or None if there are none or Pillow is not installed
+    """
+    variants = config.get("image_derivatives")
+    if not variants or not pillow_available():
+        return None
+    for name, size in variants.items():
+        if not isinstance(size, int) or size <= 0:
+            raise ValueError(
+                f"Size of image derivative {name!r} must be a number of pixels"
+            )
+    ext = config.get("derivative_format")
+    if ext:
+        ext = "." + ext.lower().lstrip(".")
+        if ext not in IMAGE_FORMATS:
+            raise ValueError(
+                f"Unknown derivative_format {config.derivative_format!r}, "
+                f"expected one of {tuple(e[1:] for e in IMAGE_FORMATS)}"
+            )
+    return DerivativeSettings(tuple(variants.items()), ext)
+
+
+def has_derivatives(path: str) -> bool:
+    """
+    Check whether a media file is an image variants are made of
+    """
+    return os.path.splitext(path)[1].lower() in IMAGE_FORMATS
+
+
+def derivative_path(path: str, variant: str, settings: DerivativeSettings) -> str:
+    """
+    Path of a variant of an image given the image's path under the static
+    directory of the site, starting with the author (``janedoe/facebook/...``)
+    """
+    author, path = path.split("/", 1)
+    base, ext = os.path.splitext(path)
+    return f"{author}/{DERIVATIVES_DIR}/{variant}/{base}{settings.ext or ext}"
+
+
+def render_variants(src: str, targets: List[Tuple[int, str]]) -> Optional[str]:
+    """
+    Write resized variants of an image, each to a path with the extension of
+    its format. Returns why the image could not be read, if it could not.
+    """
+    from PIL import Image, ImageOps
+
+    try:
+        with Image.open(src) as image:
+            image = ImageOps.exif_transpose(image)
+            for size, path in targets:
+                variant = image.copy()
+                variant.thumbnail((size, size))
+                fmt = IMAGE_FORMATS[os.path.splitext(path)[1]]
+                if fmt == "JPEG" and variant.mode not in ("RGB", "L"):
+                    variant = variant.convert("RGB")
+                # imports of other accounts may render the same cached variant
+                tmp = f"{path}.{os.getpid()}.tmp"
+                variant.save(tmp, fmt, quality=QUALITY)
+                os.replace(tmp, path)
+    except (OSError, ValueError, Image.DecompressionBombError) as ex:
+        return str(ex)
+    return None
+
+
+def _place(src: str, dst: str) -> bool:
+    # link a cached variant into the static directory, unless it already is
+    if os.path.lexists(dst):
+        if os.path.exists(dst) and os.path.samefile(src, dst):
+            return False
+        os.remove(dst)
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copyfile(src, dst)
+    return True
+
+
+class DerivativeBuilder:
+    """
+    Creates the variants of the images of an import after they were copied to
+    the site.
+
+    Variants are rendered once per image content and size into a cache in the
+    site's ``.treasurechest`` directory, named by the SHA-1 of the image, and
+    linked from there to ``static/<author>/derivatives/<variant>/``. The
+    checksum of each image is kept in an index with the size and mtime it was
+    computed for, so images already seen are not read again, and an image
+    found in several posts or sources is resized once. Images Pillow cannot
+    read are linked in place of their variants, so pages never point at
+    missing files.
+    """
+
+    def __init__(self, config: Box, settings: DerivativeSettings):
+        self.log = logging.getLogger(__name__)
+        self.settings = settings
+        self.workers = config.get("derivative_workers") or os.cpu_count() or 1
+        self.static_dir = os.path.join(config.site_dir, "static")
+        self.cache_dir = os.path.join(config.site_dir, MANIFEST_DIR, DERIVATIVES_DIR)
+        self.index = CopyIndex(
+            os.path.join(import_state_dir(config), DERIVATIVES_INDEX_FILE)
+        ).load()
+        self.stats = Counter()
+
+    def variants(self, image: str) -> List[Tuple[str, int, str]]:
+        """
+        Variant names, sizes and paths of an image in the static directory
+        """
+        path = os.path.relpath(image, self.static_dir).replace(os.sep, "/")
+        return [
+            (
+                name,
+                size,
+                os.path.join(
+                    self.static_dir, derivative_path(path, name, self.settings)
+                ),
+            )
+            for name, size in self.settings.variants
+        ]
+
+    def checksum(self, image: str, checksum: Optional[str]) -> str:
+        stat = os.stat(image)
+        recorded = self.index.checksum(image, stat)
+        if recorded is None:
+            if checksum is None:
+                checksum = file_checksum(image)
+                self.stats["derivative_images_hashed"] += 1
+            self.index.record(image, checksum)
+            recorded = checksum
+        return recorded
+
+    def cached(self, checksum: str, name: str, size: int, dst: str) -> str:
+        ext = os.path.splitext(dst)[1]
+        return os.path.join(
+            self.cache_dir, checksum[:2], f"{checksum}-{name}-{size}{ext}"
+        )
+
+    def build(self, manifest: Manifest):
+        """
+        Create the variants of the images of the items imported in this run and
+        record them in their manifest entries
+        """
+        jobs = {}  # type: Dict[str, Tuple[str, List[Tuple[int, str]]]]
+        links = []
+        plan = DirectoryPlan()
+        for entry in manifest.updated.values():
+            entry["derivatives"] = []
+            for media in entry["media"]:
+                image = media["dst"]
+                if not has_derivatives(image) or not os.path.exists(image):
+                    continue
+                checksum = self.checksum(image, media["sha1"])
+                for name, size, dst in self.variants(image):
+                    cached = self.cached(checksum, name, size, dst)
+                    if not os.path.isfile(cached):
+                        targets = jobs.setdefault(checksum, (image, []))[1]
+                        if (size, cached) not in targets:
+                            targets.append((size, cached))
+                            plan.add(cached)
+                    plan.add(dst)
+                    links.append((image, cached, dst))
+                    entry["derivatives"].append(dst)
+        plan.create()
+        with span("derivatives", items=len(jobs)):
+            errors = self._render(jobs)
+        for checksum, error in errors.items():
+            if error:
+                self.log.warning(
+                    f"Could not create variants of {jobs[checksum][0]}, "
+                    f"linking the image instead: {error}"
+                )
+                self.stats["derivative_images_failed"] += 1
+            else:
+                self.stats["derivatives_made"] += len(jobs[checksum][1])
+        for image, cached, dst in links:
+            if not os.path.isfile(cached):
+                cached = image
+            if _place(cached, dst):
+                self.stats["derivatives_linked"] += 1
+        self.index.save()
+
+    def _render(self, jobs: Dict[str, Tuple[str, List]]) -> Dict[str, Optional[str]]:
+        if self.workers > 1 and len(jobs) > 1:
+            with ProcessPoolExecutor(max_workers=self.workers) as pool:
+                futures = {
+                    checksum: pool.submit(render_variants, image, targets)
+                    for checksum, (image, targets) in jobs.items()
+                }
+                return {checksum: f.result() for checksum, f in futures.items()}
+        return {
+            checksum: render_variants(image, targets)
+            for checksum, (image, targets) in jobs.items()
+        }
+
+
+def make_derivatives(config: Box, manifest: Manifest) -> Counter:
+    """
+    Create the image variants of the items imported in this run, if
+    ``image_derivatives`` is set. Returns what was done.
+    """
+    settings = derivative_settings(config)
+    if settings is None:
+        return Counter()
+    builder = DerivativeBuilder(config, settings)
+    builder.build(manifest)
+    return builder.stats
@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+"""
+Plan of the directories an import writes posts and media files to
+"""
+
+import os
+from typing import Set  # noqa: F401
+
+
+class DirectoryPlan:
+    """
+    Collects the directories of the files about to be written and creates
+    each of them once per run.
+
+    Posts only go to a handful of year/month directories and media files to
+    a few directories per source, so creating them up front for a batch of
+    rendered items replaces one ``makedirs`` per file with one per directory,
+    which matters on network file systems.
+    """
+
+    def __init__(self):
+        self.created = set()  # type: Set[str]
+        self.pending = set()  # type: Set[str]
+
+    def add(self, path: str):
+        """
+        Plan the directory of a file that is going to be written
+        """
+        directory = os.path.dirname(path)
+        if directory not in self.created:
+            self.pending.add(directory)
+
+    def create(self):
+        """
+        Create every planned directory that was not created yet
+        """
+        for directory in sorted(self.pending):
+            os.makedirs(directory, exist_ok=True)
+        self.created.update(self.pending)
+        self.pending.clear()
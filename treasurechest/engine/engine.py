@@ -1,13 +1,40 @@
 # -*- coding: utf-8 -*-
 import logging
-import json
 import os
-import re
+from collections import Counter
+from itertools import chain
+from typing import Iterable, List, Optional, Tuple
 
 import tqdm
 from box import Box
-from treasurechest.utils.timing import timing
-from treasurechest.source.imports import FacebookPost, FacebookAlbum, InstagramPost
+from treasurechest.utils.timing import span, timing
+from treasurechest.engine.albums import AlbumLoader, album_loader, discover_albums
+from treasurechest.engine.archive import (
+    close_archives,
+    export_root,
+    register_archives,
+    source_isdir,
+)
+from treasurechest.engine.context import import_context
+from treasurechest.engine.derivatives import make_derivatives, pillow_available
+from treasurechest.engine.journal import (
+    ImportJournal,
+    import_journal,
+    remove_journals,
+)
+from treasurechest.engine.manifest import Manifest, import_state_dir
+from treasurechest.engine.pages import page_period
+from treasurechest.engine.media import CopyIndex, load_copy_index
+from treasurechest.engine.parts import (
+    FACEBOOK_PARTS,
+    INSTAGRAM_PARTS,
+    discover_parts,
+    import_part,
+    iter_posts,
+)
+from treasurechest.engine.plan import log_plan, plan_items
+from treasurechest.engine.render import import_items
+from treasurechest.engine.store import MediaStore
 
 
 class Engine:
@@ -15,66 +42,225 @@ class Engine:
     config = None  # type: Box
     log = None
 
-    def __init__(self, config: Box):
-        if not os.path.isdir(config.site_dir):
-            raise NotADirectoryError(
-                f"Could not find site directory at {config.site_dir}"
+    def __init__(
+        self,
+        config: Box,
+        workers: int = 1,
+        plan: bool = False,
+        resume: bool = False,
+        progress: bool = True,
+    ):
+        self.config = config
+        self.workers = workers
+        self.plan = plan
+        self.resume = resume
+        self.progress = progress
+        self.log = logging.getLogger(__name__)
+        self.context = import_context(config)
+        self.state_dir = import_state_dir(config)
+        if not plan and not resume and remove_journals(self.state_dir):
+            self.log.info(
+                "Discarded the progress of an interrupted import, "
+                "use --resume to continue it instead"
+            )
+        register_archives(config)
+        if config.get("image_derivatives") and not pillow_available():
+            self.log.warning(
+                "image_derivatives is set but Pillow is not installed, "
+                "linking the original images"
+            )
+
+    def load_manifest(self) -> Manifest:
+        """
+        Load the manifest of previous imports, or an empty one for a full rebuild
+        """
+        manifest = Manifest(self.config.site_dir, self.state_dir, self.context.settings)
+        if self.config.get("incremental", True):
+            manifest.load()
+        return manifest
+
+    def load_store(self) -> Optional[MediaStore]:
+        """
+        Load the content-addressed media store if media is deduplicated
+        """
+        if self.config.get("dedupe_media", False):
+            return MediaStore(self.config.site_dir, self.state_dir).load()
+        return None
+
+    def journal(self, kind: str, first: int = 1) -> Optional[ImportJournal]:
+        """
+        Checkpoint journal of an import, picking up the previous one on --resume
+        """
+        return import_journal(self.config, kind, first, self.resume)
+
+    def finish_import(
+        self,
+        manifest: Manifest,
+        kind: str,
+        counts: Counter,
+        store: MediaStore = None,
+        index: CopyIndex = None,
+        prune: bool = True,
+    ) -> Counter:
+        """
+        Create the image variants of a finished import, record its outputs and
+        remove those of deleted sources unless ``prune`` is False, then its
+        checkpoint journals, and close the archives it read. Returns the
+        counts of the import.
+        """
+        counts.update(make_derivatives(self.config, manifest))
+        with span("finish"):
+            counts["removed"] = manifest.prune(kind) if prune else 0
+            manifest.save()
+            if store:
+                store.save()
+            if index:
+                index.save()
+            remove_journals(self.state_dir, kind)
+            close_archives()
+        summary = ", ".join(f"{k}: {v}" for k, v in counts.items())
+        self.log.info(f"Import summary for {kind} - {summary}")
+        return counts
+
+    def log_failed_albums(self, loader: AlbumLoader):
+        if loader.failed:
+            self.log.error(
+                f"Could not import {len(loader.failed)} of {len(loader)} albums: "
+                + ", ".join(os.path.basename(path) for path, _ in loader.failed)
+            )
+
+    def plan_import(self, kind: str, items: Iterable[Tuple[int, object]]) -> dict:
+        """
+        Render the items of an import in memory and report what it would write
+        """
+        plan = plan_items(
+            self.config,
+            kind,
+            items,
+            self.load_manifest(),
+            self.workers,
+            self.context,
+        )
+        report = plan.report()
+        log_plan(report)
+        return report
+
+    def import_parts(self, kind: str, parts: List[str]) -> Counter:
+        """
+        Import all parts of a posts file, rendering their posts on a pool of
+        ``part_workers`` processes when there is more than one.
+
+        Posts are numbered across parts in part order. The parts are read in
+        order and their posts rendered on the pool, as they are with more than
+        one render worker or when posts are grouped in pages, and a single
+        writer claims their files and writes them, so that no two posts take
+        the same file.
+        """
+        cfg = self.config
+        if self.plan:
+            posts = chain.from_iterable(
+                iter_posts(cfg, path, self.progress) for path in parts
+            )
+            return self.plan_import(kind, enumerate(posts, 1))
+        manifest = self.load_manifest()
+        store = self.load_store()
+        index = load_copy_index(cfg)
+        if len(parts) == 1 and self.workers == 1 and not page_period(cfg):
+            counts = import_part(
+                cfg,
+                kind,
+                parts[0],
+                1,
+                manifest,
+                store,
+                index,
+                self.progress,
+                self.context,
+                self.journal(kind),
             )
         else:
-            self.config = config
-            self.log = logging.getLogger(__name__)
+            workers = self.workers
+            if len(parts) > 1 and workers == 1:
+                workers = cfg.get("part_workers") or os.cpu_count() or 1
+            if workers > 1:
+                self.log.info(f"Rendering posts with {workers} processes")
+            posts = chain.from_iterable(
+                iter_posts(cfg, path, self.progress) for path in parts
+            )
+            counts = import_items(
+                cfg,
+                kind,
+                enumerate(posts, 1),
+                manifest,
+                store,
+                index,
+                workers,
+                self.context,
+                self.journal(kind),
+            )
+        return self.finish_import(manifest, kind, counts, store, index)
 
     @timing
     def import_facebook_posts(self):
         cfg = self.config
         self.log.info(f"Starting import of Facebook data to site in {cfg.site_dir}")
-        fb_file = os.path.join(cfg.facebook_export_dir, "posts/your_posts_1.json")
-        if os.path.isfile(fb_file):
-            with open(fb_file) as f:
-                posts_dict = json.load(f)
-                total_posts = len(posts_dict)
-                self.log.info(
-                    f"Importing {total_posts} posts from Facebook file located in {cfg.facebook_export_dir}"
-                )
-                n = 1
-                skipped = 0
-                for p in tqdm.tqdm(posts_dict):
-                    obj = FacebookPost(cfg)
-                    obj.get_post(p)
-                    obj.get_tags(p)
-                    if obj.date:
-                        obj.update_site(n)
-                    else:
-                        skipped += 1
-                    n += 1
-                self.log.info(f"Total skipped: {skipped}")
+        fb_dir = os.path.join(export_root(cfg.facebook_export_dir), "posts")
+        parts = discover_parts(fb_dir, FACEBOOK_PARTS)
+        if parts:
+            self.log.info(
+                f"Importing {len(parts)} posts files from Facebook export located in {cfg.facebook_export_dir}"
+            )
+            return self.import_parts("facebook_post", parts)
         else:
+            fb_file = os.path.join(fb_dir, "your_posts_1.json")
             raise FileExistsError(f"Could not find Facebook posts file at {fb_file}")
 
     @timing
     def import_facebook_albums(self):
         cfg = self.config
-        album_dir = os.path.join(cfg.facebook_export_dir, "posts/album")
-        albums_exist = os.path.isdir(album_dir)
+        album_dir = os.path.join(export_root(cfg.facebook_export_dir), "posts/album")
+        albums_exist = source_isdir(album_dir)
         if albums_exist:
             self.log.info(
                 f"Starting import of Facebook albums to site in {cfg.site_dir}"
             )
-            album_pattern = re.compile("[0-9]+.json")
-            albums = [x for x in os.listdir(album_dir) if album_pattern.match(x)]
-            total_albums = len(albums)
+            paths = discover_albums(album_dir)
             self.log.info(
-                f"Importing {total_albums} albums from Facebook file located in {album_dir}"
+                f"Importing {len(paths)} albums from Facebook file located in {album_dir}"
+            )
+            loader = album_loader(cfg, paths)
+            albums = tqdm.tqdm(loader, total=len(paths), disable=not self.progress)
+            if self.plan:
+                report = self.plan_import("facebook_album", albums)
+                self.log_failed_albums(loader)
+                return report
+            manifest = self.load_manifest()
+            store = self.load_store()
+            index = load_copy_index(cfg)
+            counts = import_items(
+                cfg,
+                "facebook_album",
+                albums,
+                manifest,
+                store,
+                index,
+                self.workers,
+                self.context,
+                self.journal("facebook_album"),
+            )
+            if loader.failed:
+                counts["failed"] = len(loader.failed)
+            self.log_failed_albums(loader)
+            # the posts of albums that could not be read are kept until
+            # their files can be read again
+            return self.finish_import(
+                manifest,
+                "facebook_album",
+                counts,
+                store,
+                index,
+                prune=not loader.failed,
             )
-            n = 1
-            for a in tqdm.tqdm(albums):
-                with open(os.path.join(album_dir, a)) as f:
-                    album_dict = json.load(f)
-                    obj = FacebookAlbum(cfg)
-                    obj.get_post(album_dict)
-                    if len(obj.media) > 0:
-                        obj.update_site(n)
-                    n += 1
         else:
             raise NotADirectoryError(
                 f"Could not find Facebook album directory at {album_dir}"
@@ -86,19 +272,13 @@ class Engine:
         self.log.info(
             f"Starting import of Instagram data to site in {self.config.site_dir}"
         )
-        insta_file = os.path.join(cfg.instagram_export_dir, "content/posts_1.json")
-        if os.path.isfile(insta_file):
-            with open(insta_file) as f:
-                posts_dict = json.load(f)
-                total_posts = len(posts_dict)
-                self.log.info(
-                    f"Importing {total_posts} posts from Instagram file located in {self.config.instagram_export_dir}"
-                )
-                n = 1
-                for p in tqdm.tqdm(posts_dict):
-                    obj = InstagramPost(cfg)
-                    obj.get_post(p)
-                    obj.update_site(n)
-                    n += 1
+        insta_dir = os.path.join(export_root(cfg.instagram_export_dir), "content")
+        parts = discover_parts(insta_dir, INSTAGRAM_PARTS)
+        if parts:
+            self.log.info(
+                f"Importing {len(parts)} posts files from Instagram export located in {cfg.instagram_export_dir}"
+            )
+            return self.import_parts("instagram_post", parts)
         else:
+            insta_file = os.path.join(insta_dir, "posts_1.json")
             raise FileExistsError(f"Could not find Instagram file at {insta_file}")
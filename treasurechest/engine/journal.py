@@ -0,0 +1,244 @@
+# -*- coding: utf-8 -*-
+"""
+Checkpoint journal of the imports in progress, and the clean stop of an
+import on SIGINT or SIGTERM, so an interrupted import can be resumed
+"""
+
+import glob
+import json
+import logging
+import os
+import signal
+import threading
+from contextlib import contextmanager
+from typing import Iterable, Iterator, List, Optional, Tuple  # noqa: F401
+
+from box import Box
+from treasurechest.engine.manifest import Manifest, import_state_dir
+
+JOURNAL_PREFIX = "journal-"
+# items written between two flushes of the journal
+CHECKPOINT_ITEMS = 1000
+STOP_SIGNALS = (signal.SIGINT, signal.SIGTERM)
+
+_stop = threading.Event()
+
+
+class ImportInterrupted(Exception):
+    """Raised when an import stops early on a signal, once its progress is saved"""
+
+
+def request_stop(signum: int = None, frame=None):
+    """
+    Ask the running import to stop after the batch it is writing. A second
+    SIGINT stops it right away.
+    """
+    if _stop.is_set() and signum == signal.SIGINT:
+        raise KeyboardInterrupt
+    _stop.set()
+    if signum is not None:
+        logging.getLogger(__name__).warning(
+            f"Received {signal.Signals(signum).name}, stopping after the current batch"
+        )
+
+
+def stop_requested() -> bool:
+    return _stop.is_set()
+
+
+def install_stop_handlers():
+    """
+    Make SIGINT and SIGTERM request a stop, used by the processes importing parts
+    """
+    for signum in STOP_SIGNALS:
+        signal.signal(signum, request_stop)
+
+
+@contextmanager
+def stop_on_signals():
+    """
+    Turn SIGINT and SIGTERM into a request to stop while the block runs, so
+    imports finish the batch they are writing and save their progress
+    instead of dying halfway through a file
+    """
+    _stop.clear()
+    if threading.current_thread() is not threading.main_thread():
+        yield
+        return
+    previous = {signum: signal.getsignal(signum) for signum in STOP_SIGNALS}
+    install_stop_handlers()
+    try:
+        yield
+    finally:
+        for signum, handler in previous.items():
+            signal.signal(signum, handler)
+        _stop.clear()
+
+
+class ImportJournal:
+    """
+    Append-only JSON-lines file in the state directory of the import
+    (``.treasurechest`` in the site) recording the progress of an import of one kind of items.
+
+    Each line holds the number of the last item written and the manifest
+    entries of the items imported and the keys of those left unchanged since
+    the previous line. Lines are written every ``checkpoint_items`` items and
+    synced to disk, so at most that many items are written again after a
+    crash. A resumed import replays the journal into its manifest, skips the
+    items it lists and copies again the media files of those items that are
+    missing, as media is still being copied when a line is written.
+
+    Items are numbered across the parts of an export, and an import of a part
+    starting at item ``first`` keeps a journal of its own.
+    """
+
+    def __init__(
+        self,
+        state_dir: str,
+        kind: str,
+        first: int = 1,
+        resume: bool = False,
+        checkpoint_items: int = CHECKPOINT_ITEMS,
+    ):
+        self.path = os.path.join(state_dir, f"{JOURNAL_PREFIX}{kind}-{first}.jsonl")
+        self.resume = resume
+        self.checkpoint_items = checkpoint_items
+        self.done = first - 1
+        self.resumed = 0
+        self.pending = []  # type: List[Tuple[str, str]]
+        self._entries = []  # type: List[dict]
+        self._kept = []  # type: List[str]
+        self._items = 0
+        self._file = None
+
+    def open(self, manifest: Manifest) -> "ImportJournal":
+        """
+        Start the journal, after replaying a previous one into the manifest
+        when resuming
+        """
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        valid = self._replay(manifest) if self.resume else 0
+        if valid:
+            os.truncate(self.path, valid)  # drop a line cut short by a crash
+            self._file = open(self.path, "a")
+        else:
+            self._file = open(self.path, "w")
+        return self
+
+    def _replay(self, manifest: Manifest) -> int:
+        if not os.path.isfile(self.path):
+            return 0
+        valid = 0
+        with open(self.path, "rb") as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    batch = json.loads(line)
+                except ValueError:
+                    break
+                entries = {entry["key"]: entry for entry in batch["entries"]}
+                manifest.merge(entries, set(batch["kept"]).union(entries))
+                for entry in batch["entries"]:
+                    self.pending.extend(
+                        (media["src"], media["dst"])
+                        for media in entry["media"]
+                        if not os.path.isfile(media["dst"])
+                    )
+                self.done = batch["done"]
+                valid += len(line)
+        if valid:
+            logging.getLogger(__name__).info(
+                f"Resuming after item {self.done} from {self.path}"
+            )
+        return valid
+
+    def skip(self, items: Iterable[Tuple[int, object]]) -> Iterator[Tuple[int, object]]:
+        """
+        Leave out the items a resumed import already wrote
+        """
+        return self._skip(items, self.done)
+
+    def _skip(self, items: Iterable, done: int) -> Iterator[Tuple[int, object]]:
+        for n, item in items:
+            if n <= done:
+                self.resumed += 1
+                continue
+            yield n, item
+
+    def record(self, batch: list, manifest: Manifest):
+        """
+        Add a written batch of rendered items, flushing the journal every
+        ``checkpoint_items`` items
+        """
+        for rendered in batch:
+            if rendered.status == "imported":
+                self._entries.append(manifest.updated[rendered.key])
+            elif rendered.status == "unchanged":
+                self._kept.append(rendered.key)
+        self._items += len(batch)
+        self.done += len(batch)
+        if self._items >= self.checkpoint_items:
+            self.flush()
+
+    def flush(self):
+        """
+        Write the items recorded since the last flush and sync them to disk
+        """
+        if not self._items or self._file is None:
+            return
+        line = {"done": self.done, "entries": self._entries, "kept": self._kept}
+        self._file.write(json.dumps(line, separators=(",", ":")) + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._entries, self._kept, self._items = [], [], 0
+
+    def close(self):
+        if self._file is not None:
+            self.flush()
+            self._file.close()
+            self._file = None
+
+
+def import_journal(
+    config: Box, kind: str, first: int = 1, resume: bool = False
+) -> Optional[ImportJournal]:
+    """
+    Journal of an import from ``checkpoint_items``, or None if it is disabled.
+    Imports grouping posts in pages rewrite them whole and keep no journal.
+    """
+    checkpoint_items = config.get("checkpoint_items", CHECKPOINT_ITEMS)
+    if not checkpoint_items or config.get("group_posts"):
+        return None
+    return ImportJournal(
+        import_state_dir(config), kind, first, resume, checkpoint_items
+    )
+
+
+def remove_journals(state_dir: str, kind: str = "") -> int:
+    """
+    Remove the journals of imports of a kind, or of every kind, and return
+    how many there were
+    """
+    pattern = os.path.join(state_dir, f"{JOURNAL_PREFIX}{kind}*.jsonl")
+    paths = glob.glob(pattern)
+    for path in paths:
+        os.remove(path)
+    return len(paths)
+
+
+def checkpoint(batch: list, manifest: Manifest, journal: ImportJournal = None):
+    """
+    Record a written batch in the journal, and stop the import there if a
+    signal asked to, after saving the journal
+    """
+    if journal:
+        journal.record(batch, manifest)
+    if stop_requested():
+        if journal:
+            journal.flush()
+        raise ImportInterrupted(
+            "Import interrupted, run it again with --resume to continue"
+            if journal
+            else "Import interrupted"
+        )
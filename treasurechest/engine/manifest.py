@@ -0,0 +1,224 @@
+# -*- coding: utf-8 -*-
+"""
+Persistent manifest of imported items, used to re-import only what changed
+"""
+
+import hashlib
+import json
+import logging
+import os
+import re
+from typing import Dict, List, Optional, Set, Tuple
+
+from box import Box
+from treasurechest.engine.archive import stat_source
+
+MANIFEST_DIR = ".treasurechest"
+MANIFEST_FILE = "manifest.jsonl"
+
+
+def content_key(kind: str, author: str, item: dict) -> str:
+    """
+    Stable hash of a source post or album, independent of key order in the export
+    """
+    payload = json.dumps([kind, author, item], sort_keys=True, separators=(",", ":"))
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+def import_state_dir(config: Box) -> str:
+    """
+    Directory the manifest, indexes and journals of an import are kept in:
+    ``state_dir`` if set, else ``.treasurechest`` in the site directory
+    """
+    return config.get("state_dir") or os.path.join(config.site_dir, MANIFEST_DIR)
+
+
+def _split_numbered(path: str, prefix: str) -> Optional[Tuple[str, int, str]]:
+    # directory, number and rest of the name of <prefix>-<number>-<title>.md
+    directory, name = os.path.split(path)
+    match = re.match(rf"{re.escape(prefix)}-([0-9]+)(-.*)$", name)
+    if match is None:
+        return None
+    return directory, int(match.group(1)), match.group(2)
+
+
+def _signature(path: str) -> Tuple[int, int]:
+    stat = stat_source(path)
+    return stat.st_size, stat.st_mtime_ns
+
+
+class Manifest:
+    """
+    JSON-lines file in the site directory with one entry per imported item.
+
+    Each entry records the hash of the source item, the markdown file it
+    produced and, for every media file, its source, destination, source size
+    and mtime and the checksum of the copied bytes, plus the image variants
+    made of them and the hash of the settings it was imported with. An item
+    is current when its hash is known, it was imported with the ``settings``
+    of this run if given, its outputs still exist and its media sources have
+    not changed size or mtime since the last run.
+    """
+
+    def __init__(self, site_dir: str, state_dir: str = None, settings: str = None):
+        self.log = logging.getLogger(__name__)
+        state_dir = state_dir or os.path.join(site_dir, MANIFEST_DIR)
+        self.path = os.path.join(state_dir, MANIFEST_FILE)
+        self.entries = {}  # type: Dict[str, dict]
+        self.updated = {}  # type: Dict[str, dict]
+        self.seen = set()
+        self.replaced = []  # type: List[Tuple[str, str]]
+        self.owners = {}  # type: Dict[str, str]
+        self.settings = settings
+
+    def load(self) -> "Manifest":
+        if os.path.isfile(self.path):
+            with open(self.path) as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self.entries[entry["key"]] = entry
+                        self.owners[entry["file"]] = entry["key"]
+        return self
+
+    def is_current(self, key: str) -> bool:
+        """
+        Check whether the item was imported before and its outputs are intact
+        """
+        entry = self.entries.get(key)
+        if entry is None or self.owners.get(entry["file"]) != key:
+            return False
+        if self.settings and entry.get("settings") != self.settings:
+            return False
+        if not os.path.isfile(entry["file"]):
+            return False
+        for media in entry["media"]:
+            if not os.path.isfile(media["dst"]):
+                return False
+            try:
+                if list(_signature(media["src"])) != [media["size"], media["mtime"]]:
+                    return False
+            except OSError:
+                return False
+        return all(os.path.isfile(path) for path in entry.get("derivatives", []))
+
+    def claim_file(self, key: str, path: str, prefix: str) -> str:
+        """
+        Markdown file an imported item is written to, given the one it was
+        rendered to, named ``<prefix>-<number>-<title>.md`` after its place
+        in the export.
+
+        An item imported before keeps its file while only its number would
+        change, so posts added in front of an export do not rename the rest.
+        A file another item owns is never taken: the item gets the next free
+        number instead.
+        """
+        parts = _split_numbered(path, prefix)
+        if parts is None:
+            return path
+        directory, number, rest = parts
+        entry = self.entries.get(key)
+        if entry and self.owners.get(entry["file"]) == key:
+            previous = _split_numbered(entry["file"], prefix)
+            if previous and (previous[0], previous[2]) == (directory, rest):
+                return entry["file"]
+        while self.owners.get(path, key) != key:
+            number += 1
+            path = os.path.join(directory, f"{prefix}-{number}{rest}")
+        return path
+
+    def keep(self, key: str):
+        """
+        Mark an unchanged item as still present in the export
+        """
+        self.seen.add(key)
+
+    def add(self, key: str, kind: str, file: str, media: List[Tuple[str, str]]):
+        """
+        Record the outputs of an item imported in this run
+        """
+        records = []
+        for src, dst in media:
+            size, mtime = _signature(src)
+            records.append(
+                {"src": src, "dst": dst, "size": size, "mtime": mtime, "sha1": None}
+            )
+        entry = {"key": key, "kind": kind, "file": file, "media": records}
+        if self.settings:
+            entry["settings"] = self.settings
+        self._replace(entry)
+        self.entries[key] = self.updated[key] = entry
+        self.seen.add(key)
+
+    def _replace(self, entry: dict):
+        # an item written to another file than before, after posts were
+        # renumbered or grouped in pages, leaves its previous file behind
+        previous = self.entries.get(entry["key"])
+        if previous and previous["file"] != entry["file"]:
+            self.replaced.append((previous["file"], entry["file"]))
+            if self.owners.get(previous["file"]) == entry["key"]:
+                del self.owners[previous["file"]]
+        self.owners[entry["file"]] = entry["key"]
+
+    def merge(self, entries: Dict[str, dict], seen: Set[str]):
+        """
+        Merge the entries recorded by an import running in another process
+        """
+        for entry in entries.values():
+            self._replace(entry)
+        self.entries.update(entries)
+        self.updated.update(entries)
+        self.seen.update(seen)
+
+    def set_checksums(self, checksums: Dict[str, str]):
+        """
+        Fill in the checksums of media copied in this run, keyed by destination
+        """
+        for entry in self.updated.values():
+            for media in entry["media"]:
+                if media["dst"] in checksums:
+                    media["sha1"] = checksums[media["dst"]]
+
+    def prune(self, kind: str) -> int:
+        """
+        Remove the outputs of items of one kind whose source is no longer in the
+        export, and the files of items now written to another file
+        """
+        stale = [
+            k
+            for k, e in self.entries.items()
+            if e["kind"] == kind and k not in self.seen
+        ]
+        stale_entries = [self.entries.pop(k) for k in stale]
+        for key, entry in zip(stale, stale_entries):
+            if self.owners.get(entry["file"]) == key:
+                del self.owners[entry["file"]]
+        live_files = set()
+        for entry in self.entries.values():
+            live_files.add(entry["file"])
+            live_files.update(m["dst"] for m in entry["media"])
+            live_files.update(entry.get("derivatives", []))
+        for entry in stale_entries:
+            paths = [entry["file"]] + [m["dst"] for m in entry["media"]]
+            paths += entry.get("derivatives", [])
+            for path in paths:
+                if path not in live_files and os.path.isfile(path):
+                    self.log.info(f"Removing {path}, its source is no longer exported")
+                    os.remove(path)
+        for path, file in self.replaced:
+            if path not in live_files and os.path.isfile(path):
+                self.log.info(f"Removing {path}, replaced by {file}")
+                os.remove(path)
+        self.replaced.clear()
+        return len(stale_entries)
+
+    def save(self):
+        """
+        Atomically rewrite the manifest file
+        """
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp = self.path + ".tmp"
+        with open(tmp, "w") as f:
+            for entry in self.entries.values():
+                f.write(json.dumps(entry, separators=(",", ":")) + "\n")
+        os.replace(tmp, self.path)
@@ -0,0 +1,381 @@
+# -*- coding: utf-8 -*-
+"""
+Bounded thread pool used by the post classes to place media files in the site
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from box import Box
+from treasurechest.engine.archive import archive_for, open_source, stat_source
+from treasurechest.engine.journal import ImportInterrupted
+from treasurechest.engine.manifest import import_state_dir
+from treasurechest.utils.timing import continue_spans, current_spans, span
+
+COPY_BUFFER_SIZE = 1024 * 1024
+COPY_INDEX_FILE = "copy_index.json"
+MEDIA_MODES = ("copy", "hardlink", "reflink", "symlink")
+# Linux ioctl sharing the extents of one file with another (btrfs, xfs, ...)
+FICLONE = 0x40049409
+
+
+class MediaCopyError(RuntimeError):
+    """Raised when one or more media files could not be copied to the site"""
+
+    def __init__(self, failures: List[Tuple[str, str, Exception]]):
+        self.failures = failures
+        super().__init__(f"Failed to copy {len(failures)} media file(s)")
+
+
+def _unlink_shared(dst: str):
+    # a link left by a previous run may point back into the export, which
+    # must not be truncated when the destination is rewritten
+    if os.path.islink(dst) or (os.path.exists(dst) and os.stat(dst).st_nlink > 1):
+        os.remove(dst)
+
+
+def copy_media_file(src: str, dst: str, make_dirs: bool = True) -> str:
+    """
+    Copy a single media file, creating the destination directory if needed.
+    The bytes go to a temporary file renamed over the destination, so an
+    interrupted copy never leaves a truncated file behind. Returns the SHA-1
+    checksum of the copied bytes.
+    """
+    if make_dirs:
+        os.makedirs(os.path.dirname(dst), exist_ok=True)
+    digest = hashlib.sha1()
+    # unique per process and thread, as posts of several threads or part
+    # workers may place the same media file at once
+    tmp = f"{dst}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open_source(src) as fsrc, open(tmp, "wb") as fdst:
+            for chunk in iter(lambda: fsrc.read(COPY_BUFFER_SIZE), b""):
+                digest.update(chunk)
+                fdst.write(chunk)
+        os.replace(tmp, dst)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    return digest.hexdigest()
+
+
+def file_checksum(path: str) -> str:
+    """
+    SHA-1 checksum of the contents of a file
+    """
+    digest = hashlib.sha1()
+    with open_source(path) as f:
+        for chunk in iter(lambda: f.read(COPY_BUFFER_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class CopyIndex:
+    """
+    On-disk record of the media files copied to the site.
+
+    For each destination it keeps the size and mtime the file had right after
+    it was written and the checksum of its bytes. When a source file is newer
+    than its copy but the copy was not touched since, comparing the source
+    checksum with the recorded one avoids rewriting identical files, which is
+    what happens when the same data is exported again.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.entries = {}  # type: Dict[str, List]
+        self.updated = {}  # type: Dict[str, List]
+
+    def load(self) -> "CopyIndex":
+        if os.path.isfile(self.path):
+            with open(self.path) as f:
+                self.entries = json.load(f)
+        return self
+
+    def checksum(self, dst: str, dst_stat: os.stat_result) -> Optional[str]:
+        """
+        Recorded checksum of a destination, if it was not modified since it was copied
+        """
+        entry = self.entries.get(dst)
+        if entry and entry[0] == dst_stat.st_size and entry[1] == dst_stat.st_mtime_ns:
+            return entry[2]
+        return None
+
+    def record(self, dst: str, checksum: str):
+        stat = os.stat(dst)
+        self.entries[dst] = self.updated[dst] = [
+            stat.st_size,
+            stat.st_mtime_ns,
+            checksum,
+        ]
+
+    def merge(self, updated: Dict[str, List]):
+        """
+        Merge the copies recorded by an import running in another process
+        """
+        self.entries.update(updated)
+        self.updated.update(updated)
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp = self.path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.entries, f, separators=(",", ":"))
+        os.replace(tmp, self.path)
+
+
+def link_media_file(src: str, dst: str, mode: str, make_dirs: bool = True):
+    """
+    Place a media file in the site without copying its bytes, creating the
+    destination directory if needed.
+
+    Raises:
+        OSError: If the file system does not support the requested link,
+            in which case the caller falls back to a copy.
+    """
+    if make_dirs:
+        os.makedirs(os.path.dirname(dst), exist_ok=True)
+    if mode == "reflink":
+        import fcntl
+
+        _unlink_shared(dst)
+        try:
+            with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+                fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+        except OSError:
+            os.remove(dst)
+            raise
+        return
+    if os.path.lexists(dst):
+        if mode == "hardlink" and os.path.samefile(src, dst):
+            return
+        os.remove(dst)
+    if mode == "hardlink":
+        os.link(src, dst)
+    else:
+        os.symlink(os.path.abspath(src), dst)
+
+
+def same_filesystem(path_a: str, path_b: str) -> bool:
+    """
+    Check whether two existing paths are on the same device
+    """
+    return os.stat(path_a).st_dev == os.stat(path_b).st_dev
+
+
+class MediaCopier:
+    """
+    Places media files in the site on a pool of worker threads.
+
+    Jobs are handed over with ``submit`` and the number of jobs waiting in the
+    pool is bounded so that memory stays flat on large exports. Each destination
+    is placed at most once, however many posts share it. ``join`` is the
+    barrier at the end of an import: it waits for every job and raises a
+    ``MediaCopyError`` listing the failures in the order they were submitted.
+    Checksums of the copied files are collected in ``checksums``, keyed by
+    destination path.
+
+    With a ``mode`` other than ``copy`` files are linked instead, falling back
+    to a copy for each file the link is not possible for. With
+    ``skip_unchanged`` a copy whose size and mtime match its source is left
+    alone, and with an ``index`` a copy whose source only got a new mtime is
+    recognised by checksum. ``stats`` counts how files were placed, how many
+    bytes were actually written and how many were saved by skipping.
+    Without ``make_dirs`` the destination directories must already exist.
+    """
+
+    def __init__(
+        self,
+        workers: int = 8,
+        max_pending: int = None,
+        mode: str = "copy",
+        skip_unchanged: bool = False,
+        index: CopyIndex = None,
+        make_dirs: bool = True,
+    ):
+        self.log = logging.getLogger(__name__)
+        self.workers = max(1, int(workers))
+        self.mode = mode
+        self.make_dirs = make_dirs
+        self.skip_unchanged = skip_unchanged
+        self.index = index
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.workers,
+            thread_name_prefix="media",
+            initializer=continue_spans,
+            initargs=(current_spans(),),
+        )
+        self._slots = threading.BoundedSemaphore(max_pending or self.workers * 4)
+        self._lock = threading.Lock()
+        self._failures = []
+        self._submitted = 0
+        self._destinations = set()
+        self._cancelled = False
+        self.checksums = {}
+        self.stats = Counter()
+
+    def submit(self, src: str, dst: str):
+        """
+        Queue the placement of ``src`` at ``dst``, blocking while the pool is
+        full. A destination already queued in this run is placed only once.
+        """
+        with self._lock:
+            if dst in self._destinations:
+                return
+            self._destinations.add(dst)
+        self._slots.acquire()
+        index = self._submitted
+        self._submitted += 1
+        try:
+            self._executor.submit(self._run, index, src, dst)
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def _place(self, src: str, dst: str):
+        if self.mode != "copy":
+            try:
+                link_media_file(src, dst, self.mode, self.make_dirs)
+                with self._lock:
+                    self.stats[f"media_{self.mode}ed"] += 1
+                return
+            except OSError as ex:
+                self.log.debug(f"Could not {self.mode} {src}, copying instead: {ex}")
+        if self.skip_unchanged and self._unchanged(src, dst):
+            return
+        checksum = copy_media_file(src, dst, self.make_dirs)
+        src_stat = stat_source(src)
+        os.utime(dst, ns=(src_stat.st_atime_ns, src_stat.st_mtime_ns))
+        self.checksums[dst] = checksum
+        with self._lock:
+            if self.index is not None:
+                self.index.record(dst, checksum)
+            self.stats["media_copied"] += 1
+            self.stats["media_bytes_written"] += src_stat.st_size
+
+    def _unchanged(self, src: str, dst: str) -> bool:
+        try:
+            dst_stat = os.lstat(dst)
+        except FileNotFoundError:
+            return False
+        src_stat = stat_source(src)
+        if os.path.islink(dst) or dst_stat.st_size != src_stat.st_size:
+            return False
+        checksum = None
+        if self.index is not None:
+            checksum = self.index.checksum(dst, dst_stat)
+        if dst_stat.st_mtime_ns != src_stat.st_mtime_ns:
+            if checksum is None or file_checksum(src) != checksum:
+                return False
+            os.utime(dst, ns=(src_stat.st_atime_ns, src_stat.st_mtime_ns))
+            with self._lock:
+                self.index.record(dst, checksum)
+        if checksum:
+            self.checksums[dst] = checksum
+        with self._lock:
+            self.stats["media_skipped"] += 1
+            self.stats["media_bytes_saved"] += src_stat.st_size
+        return True
+
+    def _run(self, index: int, src: str, dst: str):
+        try:
+            if not self._cancelled:
+                with span("place_media", items=1):
+                    self._place(src, dst)
+        except Exception as ex:  # reported by join
+            with self._lock:
+                self._failures.append((index, src, dst, ex))
+        finally:
+            self._slots.release()
+
+    def join(self):
+        """
+        Wait for all queued copies and raise if any of them failed
+        """
+        with span("wait_media"):
+            self._executor.shutdown(wait=True)
+        if self._failures:
+            failures = [(src, dst, ex) for _, src, dst, ex in sorted(self._failures)]
+            for src, dst, ex in failures:
+                self.log.error(f"Could not copy {src} to {dst}: {ex}")
+            raise MediaCopyError(failures)
+
+    def close(self):
+        """
+        Stop the pool without waiting for pending jobs, used when an import aborts
+        """
+        self._cancelled = True
+        self._executor.shutdown(wait=False)
+
+    def drain(self):
+        """
+        Wait for the jobs already queued without reporting failures, used when
+        an import stops on a signal: failed copies are made again on resume
+        """
+        with span("wait_media"):
+            self._executor.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is None:
+            self.join()
+        elif issubclass(exc_type, ImportInterrupted):
+            self.drain()
+        else:
+            self.close()
+        return False
+
+
+def load_copy_index(config: Box) -> Optional[CopyIndex]:
+    """
+    Load the index of copied media if copies are verified by checksum
+    """
+    if config.get("skip_unchanged_media", True) and config.get(
+        "media_checksums", False
+    ):
+        path = os.path.join(import_state_dir(config), COPY_INDEX_FILE)
+        return CopyIndex(path).load()
+    return None
+
+
+def media_copier(
+    config: Box, source_dir: str, index: CopyIndex = None, make_dirs: bool = True
+) -> MediaCopier:
+    """
+    Create the media pool of an import from ``media_workers``, ``media_mode``
+    and ``skip_unchanged_media``.
+
+    Hard links and reflinks only work within one file system, so when the
+    export and the site are on different devices every file is copied.
+    """
+    log = logging.getLogger(__name__)
+    mode = config.get("media_mode", "copy")
+    if mode not in MEDIA_MODES:
+        raise ValueError(f"Unknown media_mode {mode!r}, expected one of {MEDIA_MODES}")
+    if mode != "copy" and archive_for(source_dir):
+        log.info(f"Media is read from {source_dir}, copying instead of using {mode}")
+        mode = "copy"
+    elif mode in ("hardlink", "reflink") and not same_filesystem(
+        source_dir, config.site_dir
+    ):
+        log.warning(
+            f"{source_dir} and {config.site_dir} are on different file systems, "
+            f"copying media instead of using {mode}"
+        )
+        mode = "copy"
+    return MediaCopier(
+        config.get("media_workers", 8),
+        mode=mode,
+        skip_unchanged=config.get("skip_unchanged_media", True),
+        index=index,
+        make_dirs=make_dirs,
+    )
@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+"""
+Pages grouping the posts of a month or a year in a single markdown file
+"""
+
+import calendar
+import os
+import shutil
+from collections import Counter
+from typing import Dict, List, Optional  # noqa: F401
+
+from box import Box
+from treasurechest.source.imports import format_header
+
+PAGE_PERIODS = ("month", "year")
+PAGE_PREFIXES = {
+    "facebook_post": "fb",
+    "facebook_album": "fb-album",
+    "instagram_post": "insta",
+}
+PAGE_TITLES = {
+    "facebook_post": "Facebook posts",
+    "facebook_album": "Facebook albums",
+    "instagram_post": "Instagram posts",
+}
+# entries are kept in memory up to this size before they are appended to
+# the pages they belong to
+FLUSH_BYTES = 1024 * 1024
+# most frequent tags of the posts of a page that go in its front matter
+MAX_PAGE_TAGS = 20
+
+
+def page_period(config: Box) -> Optional[str]:
+    """
+    Period the posts are grouped by from ``group_posts``, or None for a file per post
+    """
+    period = config.get("group_posts")
+    if period and period not in PAGE_PERIODS:
+        raise ValueError(
+            f"Unknown group_posts {period!r}, expected one of {PAGE_PERIODS}"
+        )
+    return period or None
+
+
+def page_path(posts_dir: str, kind: str, date: str, period: str) -> str:
+    """
+    Path of the page holding the posts of a kind written in the period of a
+    date, under the posts directory of the author
+    """
+    year, month = date[0:4], date[5:7]
+    prefix = PAGE_PREFIXES[kind]
+    if period == "year":
+        name = f"{year}/{prefix}-{year}.md"
+    else:
+        name = f"{year}/{month}/{prefix}-{year}-{month}.md"
+    return os.path.join(posts_dir, name)
+
+
+class Page:
+    """
+    Front matter of a page merged from the posts written to it
+    """
+
+    def __init__(self, kind: str, period: str):
+        self.kind = kind
+        self.period = period
+        self.posts = 0
+        self.date = ""
+        self.featured_image = ""
+        self.categories = ""
+        self.tags = Counter()
+
+    def add(self, meta: dict):
+        self.posts += 1
+        self.date = max(self.date, meta["date"])
+        self.featured_image = self.featured_image or meta["featured_image"]
+        self.categories = self.categories or meta["categories"]
+        self.tags.update(meta["tags"])
+
+    def header(self, author: str) -> str:
+        year, month = self.date[0:4], int(self.date[5:7])
+        if self.period == "year":
+            period = year
+        else:
+            period = f"{calendar.month_name[month]} {year}"
+        categories = f"{author}'s {self.categories}" if self.categories else ""
+        return format_header(
+            f"{PAGE_TITLES[self.kind]} - {period}",
+            self.date,
+            author,
+            self.featured_image,
+            categories,
+            [tag for tag, _ in self.tags.most_common(MAX_PAGE_TAGS)],
+        )
+
+
+class PageWriter:
+    """
+    Writes rendered posts as sections of the page of their month or year.
+
+    Sections are collected per page and appended to a ``.part`` file next to
+    it whenever more than ``FLUSH_BYTES`` are waiting, so memory stays flat
+    whatever the size of the export. ``close`` writes each page with the front
+    matter merged from its posts: the date of the latest one, the first
+    featured image and the most frequent tags.
+    """
+
+    def __init__(self, config: Box, kind: str, period: str):
+        self.author = config.author
+        self.kind = kind
+        self.period = period
+        self.pages = {}  # type: Dict[str, Page]
+        self.pending = {}  # type: Dict[str, List[str]]
+        self.pending_bytes = 0
+
+    def add(self, path: str, text: str, meta: dict):
+        """
+        Add the section of a post to its page
+        """
+        page = self.pages.get(path)
+        if page is None:
+            page = self.pages[path] = Page(self.kind, self.period)
+            if os.path.exists(path + ".part"):  # left by an aborted run
+                os.remove(path + ".part")
+        page.add(meta)
+        self.pending.setdefault(path, []).append(text + "\n\n")
+        self.pending_bytes += len(text)
+        if self.pending_bytes > FLUSH_BYTES:
+            self.flush()
+
+    def flush(self):
+        """
+        Append the sections waiting in memory to the pages they belong to
+        """
+        for path, texts in self.pending.items():
+            with open(path + ".part", "a") as part:
+                part.writelines(texts)
+        self.pending.clear()
+        self.pending_bytes = 0
+
+    def close(self) -> int:
+        """
+        Write every page and return how many were written
+        """
+        self.flush()
+        for path, page in self.pages.items():
+            tmp = path + ".tmp"
+            with open(tmp, "w") as f, open(path + ".part") as part:
+                f.write(page.header(self.author) + "\n\n")
+                shutil.copyfileobj(part, f)
+            os.replace(tmp, path)
+            os.remove(path + ".part")
+        return len(self.pages)
+
+
+def page_writer(config: Box, kind: str) -> Optional[PageWriter]:
+    """
+    Writer of the pages of an import if ``group_posts`` is set
+    """
+    period = page_period(config)
+    return PageWriter(config, kind, period) if period else None
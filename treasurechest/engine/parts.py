@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+"""
+Discovery and import of the numbered posts files of an export
+(``your_posts_1.json``, ``your_posts_2.json``, ...)
+"""
+
+import json
+import logging
+import os
+import re
+from collections import Counter
+from typing import Iterator, List, Pattern
+
+import tqdm
+from box import Box
+from treasurechest.engine.archive import (
+    open_source,
+    source_isdir,
+    source_listdir,
+    stat_source,
+)
+from treasurechest.engine.context import ImportContext
+from treasurechest.engine.journal import ImportJournal
+from treasurechest.engine.manifest import Manifest
+from treasurechest.engine.media import CopyIndex
+from treasurechest.engine.store import MediaStore
+from treasurechest.engine.render import import_items
+from treasurechest.utils.json_stream import iter_json_array
+from treasurechest.utils.timing import profile_iter, span
+
+FACEBOOK_PARTS = re.compile(r"^your_posts_([0-9]+)\.json$")
+INSTAGRAM_PARTS = re.compile(r"^posts_([0-9]+)\.json$")
+
+
+def discover_parts(directory: str, pattern: Pattern) -> List[str]:
+    """
+    List the numbered parts of a posts file, sorted by part number
+    """
+    if not source_isdir(directory):
+        return []
+    parts = []
+    for name in source_listdir(directory):
+        match = pattern.match(name)
+        if match:
+            parts.append((int(match.group(1)), os.path.join(directory, name)))
+    return [path for _, path in sorted(parts)]
+
+
+def iter_posts(config: Box, path: str, progress: bool = True) -> Iterator[dict]:
+    """
+    Yield the posts of an export file, streaming them one at a time if configured
+    """
+    with open_source(path) as f:
+        if config.get("stream_json", False):
+            size = stat_source(path).st_size
+            with tqdm.tqdm(
+                total=size, unit="B", unit_scale=True, disable=not progress
+            ) as bar:
+                posts = iter_json_array(f, on_progress=bar.update)
+                yield from profile_iter(posts, "decode_json")
+        else:
+            with span("decode_json", bytes=stat_source(path).st_size) as s:
+                posts = json.load(f)
+                s.add(items=len(posts))
+            yield from tqdm.tqdm(posts, disable=not progress)
+
+
+def import_part(
+    config: Box,
+    kind: str,
+    path: str,
+    start: int,
+    manifest: Manifest,
+    store: MediaStore = None,
+    index: CopyIndex = None,
+    progress: bool = True,
+    context: ImportContext = None,
+    journal: ImportJournal = None,
+) -> Counter:
+    """
+    Import every post of one part, numbering them from ``start``
+    """
+    log = logging.getLogger(__name__)
+    log.info(f"Importing posts from {path}")
+    posts = enumerate(iter_posts(config, path, progress), start)
+    return import_items(
+        config, kind, posts, manifest, store, index, context=context, journal=journal
+    )
@@ -0,0 +1,202 @@
+# -*- coding: utf-8 -*-
+"""
+Import of posts and albums as an asyncio pipeline of parse, render, media and
+write stages connected by bounded queues
+"""
+
+import asyncio
+import logging
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from typing import Callable, Iterable, Tuple
+
+from box import Box
+from treasurechest.engine.context import ImportContext, import_context
+from treasurechest.engine.dirs import DirectoryPlan
+from treasurechest.engine.journal import ImportJournal, checkpoint
+from treasurechest.engine.manifest import Manifest
+from treasurechest.engine.media import CopyIndex, media_copier
+from treasurechest.engine.pages import page_writer
+from treasurechest.engine.render import (
+    KIND_SOURCES,
+    create_dirs,
+    queue_media,
+    render_item,
+    resume_media,
+    write_post,
+)
+from treasurechest.engine.store import MediaStore
+from treasurechest.engine.writer import post_writer
+from treasurechest.source.imports import PostRenderer
+from treasurechest.utils.timing import continue_spans, current_spans
+
+STAGES = ("parse", "render", "media", "write")
+
+
+class StageQueue:
+    """
+    Bounded queue between two stages that keeps track of its depth.
+
+    Every ``put`` records how many batches were waiting and whether the
+    producer had to wait for room, which shows where the pipeline is held up.
+    """
+
+    def __init__(self, name: str, size: int):
+        self.name = name
+        self.size = size
+        self.queue = asyncio.Queue(size)
+        self.puts = 0
+        self.full = 0
+        self.depth_total = 0
+        self.depth_max = 0
+
+    async def put(self, batch):
+        if batch is None:  # end of the items
+            await self.queue.put(batch)
+            return
+        if self.queue.full():
+            self.full += 1
+        await self.queue.put(batch)
+        depth = self.queue.qsize()
+        self.puts += 1
+        self.depth_total += depth
+        self.depth_max = max(self.depth_max, depth)
+
+    async def get(self):
+        return await self.queue.get()
+
+    def summary(self) -> str:
+        mean = self.depth_total / self.puts if self.puts else 0
+        return (
+            f"Pipeline queue to {self.name} - batches: {self.puts}, "
+            f"max depth: {self.depth_max}/{self.size}, mean depth: {mean:.1f}, "
+            f"full: {self.full}"
+        )
+
+
+async def _run_pipeline(
+    config: Box,
+    kind: str,
+    items: Iterable[Tuple[int, object]],
+    manifest: Manifest,
+    store: MediaStore,
+    index: CopyIndex,
+    context: ImportContext,
+    journal: ImportJournal,
+) -> Counter:
+    loop = asyncio.get_running_loop()
+    batch_size = config.get("pipeline_batch_size", 32)
+    queue_size = config.get("pipeline_queue_size", 8)
+    queues = {name: StageQueue(name, queue_size) for name in STAGES[1:]}
+    # one thread per stage, so that reading, rendering and writing overlap
+    executors = {
+        name: ThreadPoolExecutor(
+            1,
+            thread_name_prefix=f"pipeline-{name}",
+            initializer=continue_spans,
+            initargs=(current_spans(),),
+        )
+        for name in STAGES
+    }
+    source_dir = context.export_dirs[KIND_SOURCES[kind]]
+    counts = Counter(imported=0, skipped=0, unchanged=0)
+    plan = DirectoryPlan()
+    pages = page_writer(config, kind)
+    writer = post_writer(config)
+    renderer = PostRenderer(context, store=store)
+    if journal:
+        items = journal.open(manifest).skip(items)
+    items = iter(items)
+
+    async def parse():
+        while True:
+            batch = await loop.run_in_executor(
+                executors["parse"], list, islice(items, batch_size)
+            )
+            await queues["render"].put(batch or None)
+            if not batch:
+                return
+
+    async def stage(name: str, work: Callable, target: str = None):
+        while True:
+            batch = await queues[name].get()
+            if batch is not None:
+                batch = await loop.run_in_executor(executors[name], work, batch)
+            if target:
+                await queues[target].put(batch)
+            if batch is None:
+                return
+
+    def render(batch):
+        return [
+            render_item(config, kind, n, item, manifest, store, renderer)
+            for n, item in batch
+        ]
+
+    def place_media(batch):
+        create_dirs(batch, plan)
+        for rendered in batch:
+            queue_media(rendered, copier, store)
+        return batch
+
+    def write(batch):
+        for rendered in batch:
+            write_post(rendered, kind, manifest, counts, writer, pages)
+        writer.flush()
+        checkpoint(batch, manifest, journal)
+        return batch
+
+    try:
+        with media_copier(config, source_dir, index, make_dirs=False) as copier:
+            if journal:
+                resume_media(journal, copier, plan)
+            await asyncio.gather(
+                parse(),
+                stage("render", render, "media"),
+                stage("media", place_media, "write"),
+                stage("write", write),
+            )
+            if pages:
+                counts["pages"] = pages.close()
+            writer.close()
+    finally:
+        for executor in executors.values():
+            executor.shutdown(wait=True)
+        if journal:
+            journal.close()
+    log = logging.getLogger(__name__)
+    for queue in queues.values():
+        log.info(queue.summary())
+    if journal and journal.resumed:
+        counts["resumed"] = journal.resumed
+    manifest.set_checksums(copier.checksums)
+    counts.update(copier.stats)
+    if store:
+        counts.update(store.stats)
+    return counts
+
+
+def import_items_pipelined(
+    config: Box,
+    kind: str,
+    items: Iterable[Tuple[int, object]],
+    manifest: Manifest,
+    store: MediaStore = None,
+    index: CopyIndex = None,
+    context: ImportContext = None,
+    journal: ImportJournal = None,
+) -> Counter:
+    """
+    Import numbered items through the parse, render, media and write stages
+    of a pipeline, each running in a thread of its own.
+
+    Batches of ``pipeline_batch_size`` items flow through queues holding up to
+    ``pipeline_queue_size`` batches, so a slow stage holds back the ones
+    before it and memory stays bounded. Items are written in order and the
+    site is the same as with ``import_items``.
+    """
+    context = context or import_context(config)
+    return asyncio.run(
+        _run_pipeline(config, kind, items, manifest, store, index, context, journal)
+    )
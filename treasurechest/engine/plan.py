@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+"""
+Dry run of an import, reporting what it would write without touching the site
+"""
+
+import copy
+import logging
+import os
+import time
+from collections import Counter
+from typing import Dict, Iterable, Tuple  # noqa: F401
+
+from box import Box
+from treasurechest.engine.archive import stat_source
+from treasurechest.engine.context import ImportContext, import_context
+from treasurechest.engine.manifest import Manifest
+from treasurechest.engine.pages import PAGE_PREFIXES, page_period
+from treasurechest.engine.render import Rendered, RenderPool, render_item
+from treasurechest.source.imports import PostRenderer
+
+# assumed speed of media copies, used to estimate how long an import takes
+DEFAULT_COPY_RATE = 100  # MB/s
+
+
+class ImportPlan:
+    """
+    Summary of the rendered items of an import: the markdown files per month,
+    the directories and media files it would create, the media that is missing
+    from the export and the files it would overwrite.
+
+    Only the file system is read. Posts are rendered in memory exactly as in
+    an import and claim their files from a copy of the manifest, so paths and
+    names are the ones the import would write.
+    """
+
+    def __init__(self, config: Box, kind: str, manifest: Manifest):
+        self.config = config
+        self.kind = kind
+        self.manifest = manifest
+        self.counts = Counter(imported=0, skipped=0, unchanged=0)
+        self.months = Counter()
+        self.dirs = set()
+        self.media = {}  # type: Dict[str, str]
+        self.paths = {}  # type: Dict[str, str]
+        self.collisions = []
+        self.overwrites = []
+        self.seconds = 0.0
+        # files claimed as the import claims them, leaving the manifest as it is
+        self._claims = copy.copy(manifest)
+        self._claims.entries = dict(manifest.entries)
+        self._claims.owners = dict(manifest.owners)
+        self._claims.updated, self._claims.seen, self._claims.replaced = {}, set(), []
+
+    def add(self, rendered: Rendered):
+        self.counts[rendered.status] += 1
+        if rendered.status != "imported":
+            return
+        path = rendered.path
+        if not rendered.meta:
+            path = self._claims.claim_file(rendered.key, path, PAGE_PREFIXES[self.kind])
+        if path not in self.paths:
+            # posts and pages of a month are written to <year>/<month>/ and
+            # pages of a year to <year>/
+            post_dir = os.path.dirname(path)
+            parent, name = os.path.split(post_dir)
+            if rendered.meta and page_period(self.config) == "year":
+                self.months[name] += 1
+            else:
+                self.months[f"{os.path.basename(parent)}-{name}"] += 1
+            self.dirs.add(post_dir)
+            owner = self._claims.owners.get(path)
+            if owner is None and os.path.exists(path):
+                self.overwrites.append(path)
+            elif owner not in (None, rendered.key) and not rendered.meta:
+                self.collisions.append(path)
+        elif self.paths[path] != rendered.key and not rendered.meta:
+            self.collisions.append(path)
+        self.paths[path] = rendered.key
+        if not rendered.meta:
+            self._claims.add(rendered.key, self.kind, path, [])
+        for src, dst in rendered.media:
+            self.dirs.add(os.path.dirname(dst))
+            self.media.setdefault(dst, src)
+
+    def report(self) -> dict:
+        skip_unchanged = self.config.get("skip_unchanged_media", True)
+        media_bytes = bytes_to_copy = 0
+        missing = []
+        for dst, src in self.media.items():
+            try:
+                src_stat = stat_source(src)
+            except OSError:
+                missing.append(src)
+                continue
+            media_bytes += src_stat.st_size
+            try:
+                dst_stat = os.stat(dst)
+                up_to_date = skip_unchanged and (
+                    dst_stat.st_size == src_stat.st_size
+                    and dst_stat.st_mtime_ns == src_stat.st_mtime_ns
+                )
+            except OSError:
+                up_to_date = False
+            if not up_to_date:
+                bytes_to_copy += src_stat.st_size
+        copy_rate = self.config.get("plan_copy_rate", DEFAULT_COPY_RATE)
+        return {
+            "kind": self.kind,
+            "items": dict(self.counts),
+            "markdown_files": len(self.paths),
+            "files_per_month": dict(sorted(self.months.items())),
+            "directories": len(self.dirs),
+            "new_directories": sum(1 for d in self.dirs if not os.path.isdir(d)),
+            "media_files": len(self.media),
+            "media_bytes": media_bytes,
+            "bytes_to_copy": bytes_to_copy,
+            "missing_media": missing,
+            "collisions": self.collisions,
+            "overwrites": self.overwrites,
+            "render_seconds": round(self.seconds, 3),
+            "estimated_seconds": round(
+                self.seconds + bytes_to_copy / (copy_rate * 1e6), 1
+            ),
+        }
+
+
+def plan_items(
+    config: Box,
+    kind: str,
+    items: Iterable[Tuple[int, object]],
+    manifest: Manifest,
+    workers: int = 1,
+    context: ImportContext = None,
+) -> ImportPlan:
+    """
+    Render numbered items as ``import_items`` would and collect them in a plan.
+
+    Media is planned under its export paths, as naming it by checksum when
+    ``dedupe_media`` is set would mean reading every file.
+    """
+    context = context or import_context(config)
+    plan = ImportPlan(config, kind, manifest)
+    start = time.perf_counter()
+    if workers > 1:
+        with RenderPool(config, manifest, workers, context=context) as pool:
+            for rendered in pool.render(kind, items):
+                plan.add(rendered)
+    else:
+        renderer = PostRenderer(context)
+        for n, item in items:
+            plan.add(render_item(config, kind, n, item, manifest, renderer=renderer))
+    plan.seconds = time.perf_counter() - start
+    return plan
+
+
+def log_plan(report: dict):
+    log = logging.getLogger(__name__)
+    items = ", ".join(f"{k}: {v}" for k, v in report["items"].items())
+    log.info(f"Plan for {report['kind']} - {items}")
+    years = {}
+    for month, files in report["files_per_month"].items():
+        years.setdefault(month[:4], []).append(f"{month[5:]}: {files}")
+    for year, months in years.items():
+        log.info(f"Plan for {report['kind']} - files in {year}: {', '.join(months)}")
+    log.info(
+        f"Plan for {report['kind']} - markdown files: {report['markdown_files']}, "
+        f"directories: {report['directories']} ({report['new_directories']} new), "
+        f"media files: {report['media_files']}, "
+        f"media bytes: {report['media_bytes']}, "
+        f"bytes to copy: {report['bytes_to_copy']}, "
+        f"estimated time: {report['estimated_seconds']} sec"
+    )
+    for src in report["missing_media"]:
+        log.warning(f"Plan for {report['kind']} - missing media file {src}")
+    for path in report["collisions"]:
+        log.warning(f"Plan for {report['kind']} - file name collision at {path}")
+    for path in report["overwrites"]:
+        log.warning(f"Plan for {report['kind']} - would overwrite {path}")
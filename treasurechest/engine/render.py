@@ -0,0 +1,395 @@
+# -*- coding: utf-8 -*-
+"""
+Rendering of posts and albums, serially or on a pool of worker processes,
+and the single writer that places their output in the site
+"""
+
+import signal
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from typing import Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+from box import Box
+from treasurechest.engine.archive import register_archives
+from treasurechest.engine.context import ImportContext, import_context
+from treasurechest.engine.dirs import DirectoryPlan
+from treasurechest.engine.journal import ImportJournal, checkpoint
+from treasurechest.engine.manifest import Manifest, content_key
+from treasurechest.engine.media import CopyIndex, MediaCopier, media_copier
+from treasurechest.engine.pages import (
+    PAGE_PREFIXES,
+    PageWriter,
+    page_path,
+    page_writer,
+)
+from treasurechest.engine.store import MediaStore
+from treasurechest.engine.writer import PostWriter, post_writer
+from treasurechest.source.imports import (
+    FacebookAlbum,
+    FacebookPost,
+    InstagramPost,
+    PostRenderer,
+)
+from treasurechest.utils.timing import (
+    get_profiler,
+    init_worker_profiler,
+    profiler_settings,
+    span,
+)
+
+WRITE_BATCH_SIZE = 256
+KIND_SOURCES = {
+    "facebook_post": "facebook",
+    "facebook_album": "facebook",
+    "instagram_post": "instagram",
+}
+
+
+class Rendered(NamedTuple):
+    key: str
+    status: str  # imported, skipped or unchanged
+    path: str
+    text: str
+    media: List[Tuple[str, str]]
+    meta: Optional[dict] = None  # front matter of a post written to a page
+
+
+def render_item(
+    config: Box,
+    kind: str,
+    number: int,
+    item,
+    manifest: Manifest,
+    store: MediaStore = None,
+    renderer: PostRenderer = None,
+) -> Rendered:
+    """
+    Render one post or album. Imports pass the renderer of their run, shared
+    by all of their items.
+
+    When posts are grouped in pages, the post is rendered as a section of the
+    page of its period and rendered again on every run, as the page is
+    rewritten from all of its posts.
+    """
+    if renderer is None:
+        renderer = PostRenderer(import_context(config), store=store)
+    key = content_key(kind, renderer.context.author, item)
+    period = renderer.context.group_posts
+    if not period and manifest.is_current(key):
+        return Rendered(key, "unchanged", "", "", [])
+    with span("render", items=1):
+        if kind == "facebook_post":
+            obj = FacebookPost(renderer)
+            obj.get_post(item)
+            obj.get_tags(item)
+            ready = bool(obj.date)
+        elif kind == "facebook_album":
+            obj = FacebookAlbum(renderer)
+            obj.get_post(item)
+            ready = len(obj.media) > 0
+        else:
+            obj = InstagramPost(renderer)
+            obj.get_post(item)
+            ready = bool(obj.date)
+        if not ready:
+            return Rendered(key, "skipped", "", "", [])
+        path, text, media = obj.render(number)
+        if period:
+            meta = dict(
+                date=obj.date,
+                featured_image=obj.featured_image,
+                categories=obj.categories,
+                tags=obj.header_tags(),
+            )
+            path = page_path(renderer.context.posts_dir, kind, obj.date, period)
+            return Rendered(key, "imported", path, obj.make_entry(), media, meta)
+    return Rendered(key, "imported", path, text, media)
+
+
+def queue_media(rendered: Rendered, copier: MediaCopier, store: MediaStore = None):
+    """
+    Hand the media of a rendered item to the media pool, once per destination
+    """
+    if rendered.status == "imported":
+        with span("queue_media", items=len(rendered.media)):
+            for src, dst in rendered.media:
+                if store is None or store.claim(src, dst):
+                    copier.submit(src, dst)
+
+
+def write_post(
+    rendered: Rendered,
+    kind: str,
+    manifest: Manifest,
+    counts: Counter,
+    writer: PostWriter,
+    pages: PageWriter = None,
+):
+    """
+    Queue the markdown file of a rendered item in the writer, or add it to
+    its page, and record it in the manifest. Its directory must already exist.
+    Posts are written to the file the manifest gives them, which keeps the
+    names of posts imported before and never overwrites another post.
+    """
+    counts[rendered.status] += 1
+    if rendered.status == "unchanged":
+        manifest.keep(rendered.key)
+    elif rendered.status == "imported":
+        path = rendered.path
+        if pages:
+            with span("write_post", items=1, bytes=len(rendered.text)):
+                pages.add(path, rendered.text, rendered.meta)
+        else:
+            path = manifest.claim_file(rendered.key, path, PAGE_PREFIXES[kind])
+            writer.add(path, rendered.text)
+        manifest.add(rendered.key, kind, path, rendered.media)
+
+
+def create_dirs(batch: List[Rendered], plan: DirectoryPlan):
+    """
+    Create the directories the posts and media of a batch are written to
+    """
+    for rendered in batch:
+        if rendered.status == "imported":
+            plan.add(rendered.path)
+            for _, dst in rendered.media:
+                plan.add(dst)
+    with span("create_dirs"):
+        plan.create()
+
+
+def write_batch(
+    batch: List[Rendered],
+    kind: str,
+    copier: MediaCopier,
+    manifest: Manifest,
+    counts: Counter,
+    plan: DirectoryPlan,
+    writer: PostWriter,
+    store: MediaStore = None,
+    pages: PageWriter = None,
+):
+    """
+    Create the directories a batch of rendered items needs, then write them
+    """
+    create_dirs(batch, plan)
+    for rendered in batch:
+        queue_media(rendered, copier, store)
+        write_post(rendered, kind, manifest, counts, writer, pages)
+    writer.flush()
+
+
+def resume_media(journal: ImportJournal, copier: MediaCopier, plan: DirectoryPlan):
+    """
+    Copy again the media files of the items of a resumed import that were
+    still being copied when it stopped
+    """
+    for _, dst in journal.pending:
+        plan.add(dst)
+    plan.create()
+    for src, dst in journal.pending:
+        copier.submit(src, dst)
+
+
+def _batches(items: Iterable, size: int) -> Iterator[list]:
+    items = iter(items)
+    while True:
+        batch = list(islice(items, size))
+        if not batch:
+            return
+        yield batch
+
+
+_worker = {}
+
+
+def _init_worker(
+    config: Box,
+    manifest: Manifest,
+    store: MediaStore,
+    profiling,
+    context: ImportContext,
+):
+    # the main process decides how to stop on Ctrl-C
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    _worker.update(
+        config=config,
+        manifest=manifest,
+        store=store,
+        renderer=PostRenderer(context, store=store),
+    )
+    register_archives(config)
+    init_worker_profiler(profiling)
+
+
+def _render_chunk(kind: str, chunk: List[Tuple[int, object]]):
+    store = _worker["store"]
+    config, manifest, renderer = (
+        _worker["config"],
+        _worker["manifest"],
+        _worker["renderer"],
+    )
+    rendered = [
+        render_item(config, kind, n, item, manifest, store, renderer)
+        for n, item in chunk
+    ]
+    checksums, stats = {}, Counter()
+    if store:
+        checksums, store.updated = store.updated, {}
+        stats, store.stats = store.stats, Counter()
+    profiler = get_profiler()
+    return rendered, checksums, stats, profiler.drain() if profiler else {}
+
+
+class RenderPool:
+    """
+    Renders numbered items in chunks on a pool of worker processes.
+
+    Chunks are submitted a few at a time and their results are yielded in
+    submission order, so the writer sees exactly the sequence of a serial run
+    while only a bounded number of rendered posts are held in memory.
+    """
+
+    def __init__(
+        self,
+        config: Box,
+        manifest: Manifest,
+        workers: int,
+        store: MediaStore = None,
+        chunk_size: int = 64,
+        context: ImportContext = None,
+    ):
+        self.store = store
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self._pool = ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_worker,
+            initargs=(
+                config,
+                manifest,
+                store,
+                profiler_settings(),
+                context or import_context(config),
+            ),
+        )
+
+    def render(
+        self, kind: str, items: Iterable[Tuple[int, object]]
+    ) -> Iterator[Rendered]:
+        items = iter(items)
+        pending = deque()
+        while True:
+            while len(pending) < self.workers * 2:
+                chunk = list(islice(items, self.chunk_size))
+                if not chunk:
+                    break
+                pending.append(self._pool.submit(_render_chunk, kind, chunk))
+            if not pending:
+                return
+            rendered, checksums, stats, spans = pending.popleft().result()
+            if self.store:
+                self.store.merge(checksums)
+                self.store.stats.update(stats)
+            if spans:
+                get_profiler().merge(spans)
+            yield from rendered
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self._pool.shutdown(wait=True)
+        return False
+
+
+def import_items(
+    config: Box,
+    kind: str,
+    items: Iterable[Tuple[int, object]],
+    manifest: Manifest,
+    store: MediaStore = None,
+    index: CopyIndex = None,
+    workers: int = 1,
+    context: ImportContext = None,
+    journal: ImportJournal = None,
+) -> Counter:
+    """
+    Render numbered items, on a pool of ``workers`` processes if more than one,
+    and write them to the site in order. A single process runs the import as
+    a pipeline of stages when ``pipeline`` is set. The context of the import
+    is resolved from the config unless given.
+
+    With a ``journal`` the progress is recorded after each batch written and
+    the items a resumed import already wrote are skipped. The import stops
+    with ``ImportInterrupted`` after the batch it is writing when a signal
+    asks it to.
+    """
+    context = context or import_context(config)
+    if workers <= 1 and config.get("pipeline", False):
+        from treasurechest.engine.pipeline import import_items_pipelined
+
+        return import_items_pipelined(
+            config, kind, items, manifest, store, index, context, journal
+        )
+    source_dir = context.export_dirs[KIND_SOURCES[kind]]
+    counts = Counter(imported=0, skipped=0, unchanged=0)
+    plan = DirectoryPlan()
+    pages = page_writer(config, kind)
+    writer = post_writer(config)
+    if journal:
+        items = journal.open(manifest).skip(items)
+    try:
+        with media_copier(config, source_dir, index, make_dirs=False) as copier:
+            if journal:
+                resume_media(journal, copier, plan)
+            if workers > 1:
+                pool = RenderPool(config, manifest, workers, store, context=context)
+                with pool:
+                    rendered = pool.render(kind, items)
+                    for batch in _batches(rendered, WRITE_BATCH_SIZE):
+                        write_batch(
+                            batch,
+                            kind,
+                            copier,
+                            manifest,
+                            counts,
+                            plan,
+                            writer,
+                            store,
+                            pages,
+                        )
+                        checkpoint(batch, manifest, journal)
+            else:
+                renderer = PostRenderer(context, store=store)
+                rendered = (
+                    render_item(config, kind, n, item, manifest, store, renderer)
+                    for n, item in items
+                )
+                for batch in _batches(rendered, WRITE_BATCH_SIZE):
+                    write_batch(
+                        batch,
+                        kind,
+                        copier,
+                        manifest,
+                        counts,
+                        plan,
+                        writer,
+                        store,
+                        pages,
+                    )
+                    checkpoint(batch, manifest, journal)
+            if pages:
+                counts["pages"] = pages.close()
+            writer.close()
+    finally:
+        if journal:
+            journal.close()
+    if journal and journal.resumed:
+        counts["resumed"] = journal.resumed
+    manifest.set_checksums(copier.checksums)
+    counts.update(copier.stats)
+    if store:
+        counts.update(store.stats)
+    return counts
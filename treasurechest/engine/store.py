@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+"""
+Content-addressed media store shared by all sources of an author
+"""
+
+import json
+import os
+from collections import Counter
+from typing import Dict, List
+
+from treasurechest.engine.archive import stat_source
+from treasurechest.engine.manifest import MANIFEST_DIR
+from treasurechest.engine.media import file_checksum
+
+INDEX_FILE = "media_index.json"
+
+
+class MediaStore:
+    """
+    Stores each unique media file once, under ``media/<xx>/<sha1><ext>``.
+
+    The checksum of every source file is kept in an index in the site
+    directory together with the size and mtime it was computed for, so later
+    runs only hash files that are new or changed.
+    """
+
+    def __init__(self, site_dir: str, state_dir: str = None):
+        state_dir = state_dir or os.path.join(site_dir, MANIFEST_DIR)
+        self.path = os.path.join(state_dir, INDEX_FILE)
+        self.index = {}  # type: Dict[str, List]
+        self.updated = {}  # type: Dict[str, List]
+        self.stats = Counter()
+        self._claimed = set()
+
+    def load(self) -> "MediaStore":
+        if os.path.isfile(self.path):
+            with open(self.path) as f:
+                self.index = json.load(f)
+        return self
+
+    def checksum(self, src: str) -> str:
+        """
+        Checksum of a source file, read from the index when it has not changed
+        """
+        stat = stat_source(src)
+        entry = self.index.get(src)
+        if entry and entry[0] == stat.st_size and entry[1] == stat.st_mtime_ns:
+            return entry[2]
+        entry = [stat.st_size, stat.st_mtime_ns, file_checksum(src)]
+        self.index[src] = self.updated[src] = entry
+        self.stats["media_hashed"] += 1
+        return entry[2]
+
+    def relative_path(self, src: str) -> str:
+        """
+        Path of a source file in the store, relative to the author's static directory
+        """
+        checksum = self.checksum(src)
+        ext = os.path.splitext(src)[1].lower()
+        return f"media/{checksum[:2]}/{checksum}{ext}"
+
+    def claim(self, src: str, dst: str) -> bool:
+        """
+        Check whether ``dst`` still has to be written, the first time it is seen
+        """
+        if dst in self._claimed:
+            self.stats["media_deduplicated"] += 1
+            return False
+        self._claimed.add(dst)
+        if os.path.isfile(dst) and os.path.getsize(dst) == stat_source(src).st_size:
+            self.stats["media_deduplicated"] += 1
+            return False
+        return True
+
+    def merge(self, updated: Dict[str, List]):
+        """
+        Merge the checksums computed by an import running in another process
+        """
+        self.index.update(updated)
+        self.updated.update(updated)
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp = self.path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.index, f, separators=(",", ":"))
+        os.replace(tmp, self.path)
@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+"""
+Writer placing the markdown files of rendered posts in the site, through
+temporary files renamed in place
+"""
+
+import os
+from typing import Iterable, List, Tuple  # noqa: F401
+
+from box import Box
+from treasurechest.utils.timing import span
+
+# none leaves flushing to the OS, batch syncs the posts of each batch before
+# they are renamed in place, end syncs every post once the import is done
+DURABILITY_MODES = ("none", "batch", "end")
+WRITE_FLAGS = os.O_WRONLY | os.O_CREAT | os.O_TRUNC
+
+
+def write_temp_file(path: str, text: str, sync: bool = False) -> str:
+    """
+    Write a text file to a temporary file next to it, synced to disk if
+    asked, and return the path of the temporary file
+    """
+    tmp = path + ".tmp"
+    # raw file descriptors skip the buffers of open(), which make up much of
+    # the cost of writing many small files
+    fd = os.open(tmp, WRITE_FLAGS, 0o666)
+    try:
+        data = memoryview(text.encode("utf-8"))
+        while data:
+            data = data[os.write(fd, data) :]
+        if sync:
+            os.fsync(fd)
+    finally:
+        os.close(fd)
+    return tmp
+
+
+def write_file_atomic(path: str, text: str, sync: bool = False):
+    """
+    Write a text file through a temporary file renamed over it, so readers
+    such as Hugo's file watcher never see it half-written
+    """
+    os.replace(write_temp_file(path, text, sync), path)
+
+
+def sync_paths(paths: Iterable[str]):
+    """
+    Sync files or directories to disk, directories making renames durable
+    """
+    for path in paths:
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+
+class PostWriter:
+    """
+    Collects the markdown files of a batch of rendered posts and writes them
+    together with ``flush``, each through a temporary file renamed in place.
+
+    ``durability`` decides what survives a power loss: with ``none`` the OS
+    writes the files when it sees fit, with ``batch`` the temporary files of
+    a batch are all synced before any is renamed and their directories once
+    after, and with ``end`` the files and directories written are synced
+    once by ``close``. A crash of the import leaves at most a ``.tmp`` file
+    next to a post, which the next import overwrites, but with ``none`` a
+    power loss may still leave a renamed post empty or truncated.
+    """
+
+    def __init__(self, durability: str = "none"):
+        self.durability = durability
+        self.pending = []  # type: List[Tuple[str, str]]
+        self.written = []  # type: List[str]
+
+    def add(self, path: str, text: str):
+        """
+        Queue the markdown file of a post, written by the next ``flush``
+        """
+        self.pending.append((path, text))
+
+    def flush(self):
+        """
+        Write the queued posts. Their directories must already exist.
+        """
+        if not self.pending:
+            return
+        sync = self.durability == "batch"
+        size = sum(len(text) for _, text in self.pending)
+        with span("write_post", items=len(self.pending), bytes=size):
+            tmps = [write_temp_file(path, text, sync) for path, text in self.pending]
+            paths = [path for path, _ in self.pending]
+            for tmp, path in zip(tmps, paths):
+                os.replace(tmp, path)
+            if sync:
+                sync_paths({os.path.dirname(path) for path in paths})
+            elif self.durability == "end":
+                self.written.extend(paths)
+        self.pending.clear()
+
+    def close(self):
+        """
+        Write the posts still queued and, with ``end``, sync every post written
+        """
+        self.flush()
+        if self.written:
+            with span("sync_posts", items=len(self.written)):
+                sync_paths(self.written)
+                sync_paths({os.path.dirname(path) for path in self.written})
+            self.written.clear()
+
+
+def post_writer(config: Box) -> PostWriter:
+    """
+    Create the post writer of an import from ``post_durability``
+    """
+    durability = config.get("post_durability") or "none"
+    if durability not in DURABILITY_MODES:
+        raise ValueError(
+            f"Unknown post_durability {durability!r}, expected one of {DURABILITY_MODES}"
+        )
+    return PostWriter(durability)
@@ -1,40 +1,144 @@
 import logging
 import os
 import re
-import shutil
-import ftfy
 from abc import ABC, abstractmethod
+from itertools import chain
+from typing import List, Tuple
 
-from box import Box
-from treasurechest.utils.helpers import get_date_from_timestamp
+from treasurechest.engine.context import ImportContext
+from treasurechest.engine.derivatives import derivative_path, has_derivatives
+from treasurechest.engine.media import MediaCopier, copy_media_file
+from treasurechest.engine.store import MediaStore
+from treasurechest.engine.writer import write_file_atomic
+from treasurechest.utils.text import text_fixer
+from treasurechest.utils.timing import profile_calls, profiled
 
+# characters left out of post file names
+FILE_NAME_JUNK = re.compile("[^a-z0-9\\-]+")
 
-class Post(ABC):
+
+def format_header(
+    title: str,
+    date: str,
+    author: str,
+    featured_image: str,
+    categories: str,
+    tags: List[str],
+) -> str:
+    """
+    Front matter of a page of the site
+    """
+    # Prepare title
+    title = title.replace(":", "...")  # colon in title causes yaml trouble
+    # title = re.sub('^[\'\"]', '', title)  # apostrophe at beginning of title causes yaml trouble
+    if "'" not in title:
+        title = f"'{title}'"
+    elif '"' not in title:
+        title = f'"{title}"'
+    # Prepare tags
+    if tags:
+        tags = "\n- " + "\n- ".join(tags)
+    else:
+        tags = ""
+    # Generate header
+    header = "\n".join(
+        [
+            "---",
+            f"title: {title}",
+            f"date: {date}",
+            f"author: {author}",
+            f"featured_image: '{featured_image}'",
+            f"categories: {categories}",
+            f"tags: {tags}",
+            "---",
+        ]
+    )
+    return header
+
+
+def write_post_file(path: str, text: str):
+    """
+    Write the markdown of a rendered post to the site
     """
-    Base class for site post
+    write_file_atomic(path, text)
+
+
+class PostRenderer:
+    """
+    What the posts of an import share: the context of the run, the media
+    copier and store, and the text fixer of each source.
     """
 
-    def __init__(self, config: Box):
-        self.config = config
+    def __init__(
+        self,
+        context: ImportContext,
+        copier: MediaCopier = None,
+        store: MediaStore = None,
+    ):
+        self.context = context
+        self.copier = copier
+        self.store = store
         self.log = logging.getLogger(__name__)
-        self.author = config.author
+        self.fixers = {
+            source: profile_calls(text_fixer(name), "fix_text")
+            for source, name in context.text_fixers.items()
+        }
+        derivatives = context.derivatives
+        self.variants = dict(derivatives.variants) if derivatives else {}
+
+
+class Post(ABC):
+    """
+    Base class for site post.
+
+    Posts only hold the data of one item and share everything else through
+    their renderer and the context of the import, as one is created for
+    every post of an export.
+    """
+
+    __slots__ = (
+        "renderer",
+        "context",
+        "fix_text",
+        "file_path",
+        "media_files",
+        "deferred",
+        "text",
+        "content",
+        "title",
+        "date",
+        "bucket",
+        "featured_image",
+        "tags",
+    )
+    source = ""
+    categories = ""
+
+    def __init__(self, renderer: PostRenderer):
+        self.renderer = renderer
+        self.context = renderer.context
+        self.fix_text = renderer.fixers[self.source]
+        self.file_path = ""
+        self.media_files = []
+        self.deferred = False
+        self.text = ""
+        self.content = ""
         self.title = ""
         self.date = ""
+        self.bucket = ""  # <year>/<month> of the date
         self.featured_image = ""
-        self.categories = ""
         self.tags = []
 
+    def set_date(self, timestamp: int):
+        self.date, self.bucket = self.context.date_of(timestamp)
+
     def mkdir_from_date(self) -> str:
         """
         Method to create the directory where the post will be saved based on its date
         """
-        year = self.date[0:4]
-        month = self.date[5:7]
-        author = self.author.lower().replace(" ", "")
-        file_dir = os.path.join(
-            self.config.site_dir, f"content/posts/{author}/{year}/{month}/"
-        )
-        os.makedirs(file_dir, exist_ok=True)
+        file_dir = f"{self.context.posts_dir}{self.bucket}/"
+        if not self.deferred:
+            os.makedirs(file_dir, exist_ok=True)
         return file_dir
 
     def make_file_name(self, prefix: str, number: int) -> str:
@@ -42,48 +146,85 @@ class Post(ABC):
         Method to create the post file name based on its title
         """
         file_name = f"{prefix}-{number}-{'-'.join(self.title.lower().split()[:5])}"
-        file_name = re.sub("[^a-z0-9\\-]+", "", file_name) + ".md"
+        file_name = FILE_NAME_JUNK.sub("", file_name) + ".md"
         return file_name
 
+    @profiled("render_header")
     def make_header(self) -> str:
         """
         Method to create post header including title, author, date, main image, categories, and tags
         """
-        # Prepare title
-        title = self.title
-        title = re.sub(":", "...", title)  # colon in title causes yaml trouble
-        # title = re.sub('^[\'\"]', '', title)  # apostrophe at beginning of title causes yaml trouble
-        if "'" not in title:
-            title = f"'{title}'"
-        elif '"' not in title:
-            title = f'"{title}"'
-        # Prepare tags
-        if self.tags:
-            tags = list(dict.fromkeys(self.tags))  # remove duplicate tags
-            tags = [
-                ftfy.fix_text(t).lower().replace("@", "").replace("#", "") for t in tags
-            ]
-            tags = "\n- " + "\n- ".join(tags)
-        else:
-            tags = ""
+        author = self.context.author
         if self.categories:
-            categories = f"{self.author}'s {self.categories}"
+            categories = f"{author}'s {self.categories}"
         else:
             categories = ""
-        # Generate header
-        header = "\n".join(
-            [
-                "---",
-                f"title: {title}",
-                f"date: {self.date}",
-                f"author: {self.author}",
-                f"featured_image: '{self.featured_image}'",
-                f"categories: {categories}",
-                f"tags: {tags}",
-                "---",
-            ]
+        return format_header(
+            self.title,
+            self.date,
+            author,
+            self.featured_image,
+            categories,
+            self.header_tags(),
         )
-        return header
+
+    def header_tags(self) -> List[str]:
+        """
+        Method to clean up the tags of the post for its header
+        """
+        tags = list(dict.fromkeys(self.tags))  # remove duplicate tags
+        return [
+            self.fix_text(t).lower().replace("@", "").replace("#", "") for t in tags
+        ]
+
+    def make_entry(self) -> str:
+        """
+        Method to create the section of the post in a page grouping the posts of a period
+        """
+        return f"## {self.title}\n\n*{self.date}*\n\n{self.content.strip()}".strip()
+
+    def copy_media(self, src: str, dst: str):
+        """
+        Method to copy a media file to the site, through the shared copier if there is one
+        """
+        self.media_files.append((src, dst))
+        store = self.renderer.store
+        if self.deferred or (store and not store.claim(src, dst)):
+            return
+        if self.renderer.copier:
+            self.renderer.copier.submit(src, dst)
+        else:
+            copy_media_file(src, dst)
+
+    def add_media(self, source_dir: str, source: str, uri: str) -> str:
+        """
+        Method to place a media file of the export in the site and return its URL
+        """
+        src = os.path.join(source_dir, uri)
+        if self.renderer.store:
+            path = self.renderer.store.relative_path(src)
+        else:
+            path = f"{source}/{uri}"
+        dst = os.path.join(self.context.static_dir, path)
+        self.copy_media(src, dst)
+        return f"{self.context.url_prefix}{path}"
+
+    def image_url(self, url: str, variant: str) -> str:
+        """
+        Method to get the URL of a variant of an image placed in the site, or of the image itself
+        """
+        if variant in self.renderer.variants and has_derivatives(url):
+            return "/" + derivative_path(url[1:], variant, self.context.derivatives)
+        return url
+
+    def image_link(self, url: str) -> str:
+        """
+        Method to create the markdown of an image, showing its medium variant linked to the original
+        """
+        medium = self.image_url(url, "medium")
+        if medium == url:
+            return f"![img]({url})"
+        return f"[![img]({medium})]({url})"
 
     @abstractmethod
     def get_post(self, post: dict):
@@ -99,6 +240,15 @@ class Post(ABC):
         """
         raise NotImplementedError("Child class must implement this method.")
 
+    def render(self, post_number: int) -> Tuple[str, str, List[Tuple[str, str]]]:
+        """
+        Method for rendering the post without touching the site. Returns the path
+        and text of the markdown file and the (source, destination) media jobs.
+        """
+        self.deferred = True
+        self.update_site(post_number)
+        return self.file_path, self.text, self.media_files
+
     def create_file(
         self,
         header: str,
@@ -111,18 +261,23 @@ class Post(ABC):
         Method for creating a Hugo post file out from a header and content
         """
         dst = os.path.join(file_dir, file_name)
+        self.file_path = dst
         if verbose:
-            self.log.info(f"Creating file {dst}")
-            self.log.info(header)
-        with open(dst, "w") as post:
-            post.write(header)
-            post.write("\n" + content)
+            self.renderer.log.info(f"Creating file {dst}")
+            self.renderer.log.info(header)
+        self.content = content
+        self.text = header + "\n" + content
+        if not self.deferred:
+            write_post_file(dst, self.text)
 
 
 class FacebookPost(Post):
-    def __init__(self, config: Box):
-        super().__init__(config)
-        self.categories = "Facebook Post"
+    __slots__ = ("data", "uri", "loc")
+    source = "facebook"
+    categories = "Facebook Post"
+
+    def __init__(self, renderer: PostRenderer):
+        super().__init__(renderer)
         self.data = ""
         self.uri = ""
         self.loc = ""
@@ -148,15 +303,11 @@ class FacebookPost(Post):
             self.title = default_text
             content = ""
         if self.uri:
-            author = self.author.lower().replace(" ", "")
-            src = os.path.join(self.config.facebook_export_dir, self.uri)
-            dst = os.path.join(
-                self.config.site_dir, "static", author, "facebook", self.uri
+            url = self.add_media(
+                self.context.export_dirs["facebook"], "facebook", self.uri
             )
-            os.makedirs(os.path.dirname(dst), exist_ok=True)
-            shutil.copyfile(src, dst)
-            content += f"\n![img](/{author}/facebook/{self.uri})"
-            self.featured_image = f"/{author}/facebook/{self.uri}"
+            content += f"\n{self.image_link(url)}"
+            self.featured_image = self.image_url(url, "thumbnail")
         file_dir = self.mkdir_from_date()
         file_name = self.make_file_name("fb", post_number)
         header = self.make_header()
@@ -189,7 +340,7 @@ class FacebookPost(Post):
             if self.data and not self.title:
                 self.title = "External content posted"
                 timestamp = post["timestamp"]
-                self.date = get_date_from_timestamp(timestamp)
+                self.set_date(timestamp)
             if "media" in data:
                 self.uri = data["media"]["uri"]
             if "place" in data:
@@ -197,7 +348,7 @@ class FacebookPost(Post):
 
     def get_title(self, post: dict):
         if "title" in post:
-            self.title = ftfy.fix_text(post["title"])
+            self.title = self.fix_text(post["title"])
 
     def get_location(self, data: dict):
         place = data["place"]
@@ -214,43 +365,43 @@ class FacebookPost(Post):
         timestamp = post["timestamp"]
         for d in data:
             if "post" in d:
-                self.date = get_date_from_timestamp(timestamp)
-                self.data = ftfy.fix_text(d["post"])
+                self.set_date(timestamp)
+                self.data = self.fix_text(d["post"])
 
 
 class FacebookAlbum(Post):
-    def __init__(self, config: Box):
-        super().__init__(config)
-        self.categories = "Facebook Album"
+    __slots__ = ("media",)
+    source = "facebook"
+    categories = "Facebook Album"
+
+    def __init__(self, renderer: PostRenderer):
+        super().__init__(renderer)
         self.media = []
         self.tags = ["album"]
 
     def update_site(self, album_number: int):
-        timestamp = 0
+        # row 0 is the epoch, the date of an album without dated photos
+        dates = self.context.normalize_dates(
+            chain((0,), (f["creation_timestamp"] for f in self.media))
+        )
+        latest = 0
         content = []
-        author = self.author.lower().replace(" ", "")
-        for f in self.media:
+        for row, f in enumerate(self.media, 1):
             media_uri = f["uri"]
-            if not self.featured_image:
-                self.featured_image = f"/{author}/facebook/{media_uri}"
             if "description" in f:
-                media_title = ftfy.fix_text(f["description"]) + " "
+                media_title = self.fix_text(f["description"]) + " "
             else:
                 media_title = ""
-            media_timestamp = f["creation_timestamp"]
-            if media_timestamp > timestamp:
-                timestamp = media_timestamp
-            media_date = get_date_from_timestamp(timestamp)
-            src = os.path.join(self.config.facebook_export_dir, media_uri)
-            dst = os.path.join(
-                self.config.site_dir, "static", author, "facebook", media_uri
+            if dates.timestamps[row] > dates.timestamps[latest]:
+                latest = row
+            media_date = dates.dates[latest]
+            url = self.add_media(
+                self.context.export_dirs["facebook"], "facebook", media_uri
             )
-            os.makedirs(os.path.dirname(dst), exist_ok=True)
-            shutil.copyfile(src, dst)
-            content.append(
-                f"{media_title}{media_date}\n![img](/{author}/facebook/{media_uri})"
-            )
-        self.date = get_date_from_timestamp(timestamp)
+            if not self.featured_image:
+                self.featured_image = self.image_url(url, "thumbnail")
+            content.append(f"{media_title}{media_date}\n{self.image_link(url)}")
+        self.date, self.bucket = dates.dates[latest], dates.buckets[latest]
         header = self.make_header()
         content = "\n\n".join(content)
         file_dir = self.mkdir_from_date()
@@ -258,14 +409,17 @@ class FacebookAlbum(Post):
         self.create_file(header, content, file_dir, file_name)
 
     def get_post(self, album: dict):
-        self.title = ftfy.fix_text(album["name"])
+        self.title = self.fix_text(album["name"])
         self.media = album["photos"]
 
 
 class InstagramPost(Post):
-    def __init__(self, config: Box):
-        super().__init__(config)
-        self.categories = "Instagram post"
+    __slots__ = ("media",)
+    source = "instagram"
+    categories = "Instagram post"
+
+    def __init__(self, renderer: PostRenderer):
+        super().__init__(renderer)
         self.media = []
 
     def update_site(self, post_number: int):
@@ -283,20 +437,18 @@ class InstagramPost(Post):
 
         file_dir = self.mkdir_from_date()
         file_name = self.make_file_name("insta", post_number)
-        author = self.author.lower().replace(" ", "")
         for m in self.media:
             media_uri = m["uri"]
-            media_title = ftfy.fix_text(m["title"])
+            media_title = self.fix_text(m["title"])
             if "http" not in media_uri:
-                src = os.path.join(self.config.instagram_export_dir, media_uri)
-                dst = os.path.join(
-                    self.config.site_dir, "static", author, "instagram", media_uri
+                url = self.add_media(
+                    self.context.export_dirs["instagram"],
+                    "instagram",
+                    media_uri,
                 )
-                os.makedirs(os.path.dirname(dst), exist_ok=True)
-                shutil.copyfile(src, dst)
-                content.append(f"\n![img](/{author}/instagram/{media_uri})")
+                content.append(f"\n{self.image_link(url)}")
                 if not self.featured_image:
-                    self.featured_image = f"/{author}/instagram/{media_uri}"
+                    self.featured_image = self.image_url(url, "thumbnail")
             else:
                 content.append(f"\n![img]({media_uri})")
             if media_title != self.title:
@@ -313,8 +465,8 @@ class InstagramPost(Post):
         self.media = post["media"]
         if "creation_timestamp" in post:
             timestamp = post["creation_timestamp"]
-            self.title = ftfy.fix_text(post["title"])
+            self.title = self.fix_text(post["title"])
         else:
             timestamp = self.media[0]["creation_timestamp"]
-            self.title = ftfy.fix_text(self.media[0]["title"])
-        self.date = get_date_from_timestamp(timestamp)
+            self.title = self.fix_text(self.media[0]["title"])
+        self.set_date(timestamp)
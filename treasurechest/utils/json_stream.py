@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+"""
+Incremental reader for files holding one large JSON array
+"""
+
+import codecs
+import json
+from typing import BinaryIO, Callable, Iterator
+
+_WHITESPACE = " \t\r\n"
+_DELIMITERS = _WHITESPACE + ",]"
+
+
+def iter_json_array(
+    f: BinaryIO,
+    chunk_size: int = 1024 * 1024,
+    on_progress: Callable[[int], None] = None,
+) -> Iterator:
+    """Yield the elements of a top-level JSON array one at a time.
+
+    Only the element being decoded and one read buffer are held in memory, so
+    memory use does not grow with the size of the file.
+
+    Args:
+        f: File opened in binary mode.
+        chunk_size: Number of bytes read at a time.
+        on_progress: Called with the number of bytes read after every read.
+
+    Raises:
+        ValueError: If the file does not hold a JSON array.
+    """
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder("utf-8")()
+    buf = ""
+    idx = 0
+    eof = False
+    started = False
+    expect_item = True
+    count = 0
+
+    def fill():
+        nonlocal buf, idx, eof
+        chunk = f.read(chunk_size)
+        if on_progress and chunk:
+            on_progress(len(chunk))
+        eof = not chunk
+        buf = buf[idx:] + utf8.decode(chunk, final=eof)
+        idx = 0
+
+    while True:
+        while idx < len(buf) and buf[idx] in _WHITESPACE:
+            idx += 1
+        if idx == len(buf) or (not eof and len(buf) - idx < 2):
+            if eof:
+                if idx == len(buf):
+                    raise ValueError("Unexpected end of JSON array")
+            else:
+                fill()
+                continue
+        char = buf[idx]
+        if not started:
+            if char != "[":
+                raise ValueError(f"Expected a JSON array, found {char!r}")
+            started = True
+            idx += 1
+        elif char == "]" and (not expect_item or not count):
+            return
+        elif not expect_item:
+            if char != ",":
+                raise ValueError(f"Expected ',' or ']' in JSON array, found {char!r}")
+            expect_item = True
+            idx += 1
+        else:
+            try:
+                item, end = decoder.raw_decode(buf, idx)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                fill()
+                continue
+            if not eof and (end == len(buf) or buf[end] not in _DELIMITERS):
+                # a number may continue in the next chunk
+                fill()
+                continue
+            yield item
+            idx = end
+            count += 1
+            expect_item = False
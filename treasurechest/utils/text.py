@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+"""
+Text normalization for strings found in social media exports
+"""
+
+import re
+import unicodedata
+from functools import lru_cache
+from typing import Callable
+
+import ftfy
+from ftfy import fixes
+from ftfy.badness import is_bad
+
+# ASCII text that none of the ftfy fixes would change
+_PLAIN_ASCII = re.compile(r"[\t\n\x20-\x25\x27-\x7e]*")
+# characters that make ftfy do more than re-decode and clean up the text
+_NEEDS_FTFY = re.compile(r"[&\x00-\x08\x0b\x0c\x0e-\x1f\x7f]")
+
+TEXT_FIXERS = ("fast", "ftfy")
+
+
+@lru_cache(maxsize=65536)
+def fix_text_fast(text: str) -> str:
+    """Fix the mojibake of a string from a Facebook or Instagram export.
+
+    The exports write every UTF-8 byte as a ``\\u00xx`` escape, so text that
+    looks like mojibake is usually restored by encoding it as latin-1 and
+    decoding it as UTF-8, followed by the clean-up steps ftfy applies
+    (ligatures, character width, curly quotes, line breaks, control
+    characters, NFC). Strings this does not apply to cleanly are handed to
+    ``ftfy.fix_text``. Results are memoized, as tags and place names repeat.
+
+    Args:
+        text: The string to fix.
+
+    Returns:
+        The same text as ``ftfy.fix_text`` returns for it.
+    """
+    if _PLAIN_ASCII.fullmatch(text):
+        return text
+    if _NEEDS_FTFY.search(text):
+        return ftfy.fix_text(text)
+    if "\n" in text:
+        # like ftfy, decide line by line whether the text is mojibake
+        lines = text.split("\n")
+        lines = [line + "\n" for line in lines[:-1]] + lines[-1:]
+        return "".join(_fix_line(line) for line in lines)
+    return _fix_line(text)
+
+
+def _fix_line(text: str) -> str:
+    if _PLAIN_ASCII.fullmatch(text):
+        return text
+    if not is_bad(text):
+        return ftfy.fix_text(text)
+    try:
+        fixed = text.encode("latin-1").decode("utf-8")
+    except UnicodeError:
+        return ftfy.fix_text(text)
+    if is_bad(fixed):
+        return ftfy.fix_text(text)
+    fixed = fixes.fix_latin_ligatures(fixed)
+    fixed = fixes.fix_character_width(fixed)
+    fixed = fixes.uncurl_quotes(fixed)
+    fixed = fixes.fix_line_breaks(fixed)
+    fixed = fixes.remove_control_chars(fixed)
+    return unicodedata.normalize("NFC", fixed)
+
+
+def text_fixer(name: str) -> Callable[[str], str]:
+    """
+    Get the text fixer configured for a source, ``fast`` or ``ftfy``
+    """
+    if name == "fast":
+        return fix_text_fast
+    if name == "ftfy":
+        return ftfy.fix_text
+    raise ValueError(f"Unknown text fixer {name!r}, expected one of {TEXT_FIXERS}")
@@ -1,13 +1,22 @@
 # -*- coding: utf-8 -*-
 """
 Allows you to use the decorator `timing` to display the time of execution
-of a function/method
+of a function/method, and to profile the stages of an import with nested
+spans when profiling is enabled
 """
 
+import cProfile
+import io
+import json
 import logging
+import pstats
+import threading
 import time
+import tracemalloc
 from functools import wraps
-from typing import Callable
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+_profiler = None  # type: Optional[Profiler]
 
 
 def _func_full_name(func: Callable):
@@ -36,7 +45,8 @@ def timing(func: Callable) -> Callable:
     @wraps(func)
     def wrapper(*args, **kwargs):
         t1 = time.time()
-        result = func(*args, **kwargs)
+        with span(func.__name__):
+            result = func(*args, **kwargs)
         elapsed = time.time() - t1
         log = logging.getLogger(__name__)
         log.info(
@@ -47,3 +57,296 @@ def timing(func: Callable) -> Callable:
         return result
 
     return wrapper
+
+
+class Span:
+    """
+    A timed section of code, nested in the spans open in the same thread.
+    Counters such as ``items`` or ``bytes`` can be added while it is open.
+    """
+
+    __slots__ = ("profiler", "name", "counters", "path", "start")
+
+    def __init__(self, profiler: "Profiler", name: str, counters: Dict[str, int]):
+        self.profiler = profiler
+        self.name = name
+        self.counters = counters
+        self.path = ""
+        self.start = 0.0
+
+    def add(self, **counters: int):
+        for key, value in counters.items():
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def __enter__(self) -> "Span":
+        stack = self.profiler.stack()
+        stack.append(self.name)
+        self.path = "/".join(stack)
+        self.profiler.enter_stage(self.name)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        elapsed = time.perf_counter() - self.start
+        self.profiler.exit_stage(self.name)
+        self.profiler.stack().pop()
+        self.profiler.record(self.path, elapsed, self.counters)
+        return False
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def add(self, **counters: int):
+        pass
+
+    def __enter__(self) -> "_NullSpan":
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Profiler:
+    """
+    Aggregates the spans of a run by path (``import_facebook_posts/render``),
+    counting calls, seconds and any counters added to the spans.
+
+    A stage can also be run under cProfile or traced with tracemalloc, in
+    which case the functions taking the most time, or the lines holding the
+    most memory when the stage used the most, are attached to the report.
+    """
+
+    def __init__(self, cprofile_stage: str = None, tracemalloc_stage: str = None):
+        self.spans = {}  # type: Dict[str, Dict[str, float]]
+        self.cprofile_stage = cprofile_stage
+        self.tracemalloc_stage = tracemalloc_stage
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._cprofile = None  # type: Optional[cProfile.Profile]
+        self._tracemalloc_top = []
+        self._tracemalloc_max = 0
+
+    def settings(self) -> Tuple[Optional[str], Optional[str]]:
+        return self.cprofile_stage, self.tracemalloc_stage
+
+    def stack(self) -> list:
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def record(self, path: str, seconds: float, counters: Dict[str, int] = None):
+        with self._lock:
+            entry = self.spans.get(path)
+            if entry is None:
+                entry = self.spans[path] = {"calls": 0, "seconds": 0.0}
+            entry["calls"] += 1
+            entry["seconds"] += seconds
+            for key, value in (counters or {}).items():
+                entry[key] = entry.get(key, 0) + value
+
+    def _depth(self, name: str, step: int) -> int:
+        depths = getattr(self._local, "depths", None)
+        if depths is None:
+            depths = self._local.depths = {}
+        depths[name] = depths.get(name, 0) + step
+        return depths[name]
+
+    def enter_stage(self, name: str):
+        if name == self.cprofile_stage and self._depth(name, 1) == 1:
+            if self._cprofile is None:
+                self._cprofile = cProfile.Profile()
+            self._cprofile.enable()
+        elif name == self.tracemalloc_stage and self._depth(name, 1) == 1:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+
+    def exit_stage(self, name: str):
+        if name == self.cprofile_stage and self._depth(name, -1) == 0:
+            self._cprofile.disable()
+        elif name == self.tracemalloc_stage and self._depth(name, -1) == 0:
+            current = tracemalloc.get_traced_memory()[0]
+            if current > self._tracemalloc_max:
+                # snapshots are slow, take one only when the stage holds more
+                # memory than ever before
+                self._tracemalloc_max = current
+                stats = tracemalloc.take_snapshot().statistics("lineno")
+                self._tracemalloc_top = [str(stat) for stat in stats[:20]]
+
+    def merge(self, spans: Dict[str, Dict[str, float]]):
+        """
+        Add the spans recorded in a worker process under the current span
+        """
+        prefix = "/".join(self.stack())
+        for path, entry in spans.items():
+            path = f"{prefix}/{path}" if prefix else path
+            with self._lock:
+                total = self.spans.setdefault(path, {"calls": 0, "seconds": 0.0})
+                for key, value in entry.items():
+                    total[key] = total.get(key, 0) + value
+
+    def drain(self) -> Dict[str, Dict[str, float]]:
+        """
+        Take the spans recorded so far, to be merged in the parent process
+        """
+        with self._lock:
+            spans, self.spans = self.spans, {}
+        return spans
+
+    def report(self) -> dict:
+        report = {
+            "spans": {
+                path: dict(entry, seconds=round(entry["seconds"], 6))
+                for path, entry in sorted(self.spans.items())
+            }
+        }
+        if self._cprofile is not None:
+            out = io.StringIO()
+            stats = pstats.Stats(self._cprofile, stream=out)
+            stats.sort_stats("cumulative").print_stats(30)
+            report["cprofile"] = {
+                "stage": self.cprofile_stage,
+                "stats": out.getvalue().strip().splitlines(),
+            }
+        if self.tracemalloc_stage and tracemalloc.is_tracing():
+            report["tracemalloc"] = {
+                "stage": self.tracemalloc_stage,
+                "largest_bytes": self._tracemalloc_max,
+                "peak_bytes": tracemalloc.get_traced_memory()[1],
+                "top": self._tracemalloc_top,
+            }
+        return report
+
+    def log_report(self):
+        log = logging.getLogger(__name__)
+        for path, entry in self.report()["spans"].items():
+            counters = ", ".join(
+                f"{k}: {v}" for k, v in entry.items() if k not in ("calls", "seconds")
+            )
+            log.info(
+                f"Profile {path} - calls: {entry['calls']}, "
+                f"time: {_human_readable_time(entry['seconds'])}"
+                + (f", {counters}" if counters else "")
+            )
+
+    def save(self, path: str):
+        with open(path, "w") as f:
+            json.dump(self.report(), f, indent=2)
+
+
+def enable_profiling(
+    cprofile_stage: str = None, tracemalloc_stage: str = None
+) -> Profiler:
+    """
+    Start recording spans in this process
+    """
+    global _profiler
+    _profiler = Profiler(cprofile_stage, tracemalloc_stage)
+    return _profiler
+
+
+def disable_profiling():
+    global _profiler
+    if _profiler and tracemalloc.is_tracing():
+        tracemalloc.stop()
+    _profiler = None
+
+
+def get_profiler() -> Optional[Profiler]:
+    return _profiler
+
+
+def init_worker_profiler(settings: Optional[Tuple[Optional[str], Optional[str]]]):
+    """
+    Initializer of worker processes, which record their own spans when the
+    parent does (a forked worker would otherwise inherit the parent's spans)
+    """
+    global _profiler
+    _profiler = Profiler(*settings) if settings else None
+
+
+def profiler_settings() -> Optional[Tuple[Optional[str], Optional[str]]]:
+    return _profiler.settings() if _profiler else None
+
+
+def current_spans() -> List[str]:
+    """
+    Names of the spans open in this thread, to continue them in a worker thread
+    """
+    return list(_profiler.stack()) if _profiler else []
+
+
+def continue_spans(names: List[str]):
+    """
+    Initializer of worker threads, nesting their spans in those of the parent
+    """
+    if _profiler:
+        _profiler.stack()[:] = names
+
+
+def span(name: str, **counters: int):
+    """
+    Time a stage as ``with span("render", items=1): ...``, a no-op unless
+    profiling is enabled
+    """
+    if _profiler is None:
+        return _NULL_SPAN
+    return Span(_profiler, name, counters)
+
+
+def profiled(name: str) -> Callable[[Callable], Callable]:
+    """
+    Decorator recording every call of a function as a span
+    """
+
+    def decorator(func: Callable) -> Callable:
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if _profiler is None:
+                return func(*args, **kwargs)
+            with Span(_profiler, name, {}):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def profile_calls(func: Callable, name: str) -> Callable:
+    """
+    Wrap a function in a span when profiling is enabled, or return it unchanged
+    """
+    if _profiler is None:
+        return func
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        with Span(_profiler, name, {}):
+            return func(*args, **kwargs)
+
+    return wrapper
+
+
+def profile_iter(items: Iterable, name: str) -> Iterator:
+    """
+    Time how long each item of an iterable takes to produce, counting the items
+    """
+    if _profiler is None:
+        return iter(items)
+    return _profile_iter(_profiler, iter(items), name)
+
+
+def _profile_iter(profiler: Profiler, items: Iterator, name: str) -> Iterator:
+    while True:
+        start = time.perf_counter()
+        try:
+            item = next(items)
+        except StopIteration:
+            return
+        path = "/".join(profiler.stack() + [name])
+        profiler.record(path, time.perf_counter() - start, {"items": 1})
+        yield item